@@ -0,0 +1,59 @@
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import pipeline
+from llm_client import set_backend, set_cache_mode
+
+# Compares building scenes in a new Python process per scene with building them in one process:
+#   python bench_pipeline.py --scenes 5
+# The fake LLM backend answers without latency and the LLM cache is off, so the times are the
+# overhead of the pipeline itself. A new process pays for starting Python, importing the scene
+# building modules and loading the embeddings for every scene, the warm process only once.
+script_dir = os.path.dirname(os.path.abspath(__file__))
+PROMPTS = ["A cozy reading corner.", "A small kitchen with a dining table.", "A home office.", "A living room with a sofa.", "A bedroom."]
+IMPORT_ONLY = "import pipeline; pipeline._place_objects()"
+SCENE = "import sys, pipeline; pipeline.set_backend('fake'); pipeline.set_cache_mode('off'); pipeline.scene(sys.argv[1], sys.argv[2], False)"
+
+
+def run_python(code, *args, env=None):
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-c", code, *args], check=True, cwd=script_dir, env=env, stdout=subprocess.DEVNULL)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the start-up and per-scene overhead of the pipeline.")
+    parser.add_argument("--scenes", help="Number of scenes built in each mode.", type=int, default=5)
+    args = parser.parse_args()
+    env = {**os.environ, "REASON3D_FAKE_LATENCY": "0", "REASON3D_FAKE_EMBED_LATENCY": "0", "REASON3D_FAKE_JITTER": "0"}
+    os.environ.update(env)
+    prompts = [PROMPTS[i % len(PROMPTS)] for i in range(args.scenes)]
+
+    with tempfile.TemporaryDirectory() as output_dir:
+        startup = min(run_python(IMPORT_ONLY, env=env) for _ in range(3))
+        cold = [run_python(SCENE, prompt, os.path.join(output_dir, f"cold_{i}"), env=env) for i, prompt in enumerate(prompts)]
+
+        set_backend("fake")
+        set_cache_mode("off")
+        start = time.perf_counter()
+        pipeline.scene(prompts[0], os.path.join(output_dir, "load"), False)
+        first = time.perf_counter() - start
+        warm = []
+        for i, prompt in enumerate(prompts):
+            start = time.perf_counter()
+            pipeline.scene(prompt, os.path.join(output_dir, f"warm_{i}"), False)
+            warm.append(time.perf_counter() - start)
+
+    cold_mean, warm_mean = sum(cold) / len(cold), sum(warm) / len(warm)
+    print(f"{'':<34} {'seconds':>8}")
+    print(f"{'python start and imports':<34} {startup:>8.3f}")
+    print(f"{'first scene in the process':<34} {first:>8.3f}")
+    print(f"{'scene in a new process (mean)':<34} {cold_mean:>8.3f}")
+    print(f"{'scene in a warm process (mean)':<34} {warm_mean:>8.3f}")
+    print(f"Overhead per scene of a new process: {cold_mean - warm_mean:.3f}s ({cold_mean / warm_mean:.1f}x)")
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,37 @@
-from google import genai
 import numpy as np
 import json
-from sklearn.metrics.pairwise import cosine_similarity
 from preprocessing.CreateEmbeddings import  get_embedding
 from utils import Attributes, get_attr_from_guid
-from config import API_KEY
-# Set your API key
-api_key = API_KEY
-client = genai.Client(api_key=api_key)
+from llm_client import generate
+from tracing import span, traced
 
 
+class EmbeddingIndex:
+    """
+    The prefab embeddings as normalized matrices, so the similarities to all prefabs are
+    computed at once. Built once and shared between scenes.
+    """
+    def __init__(self, embeddings_data):
+        self.prefab_names = list(embeddings_data)
+        self.guids = [data["guid"] for data in embeddings_data.values()]
+        self.matrices = [self._normalize(np.array([data[key] for data in embeddings_data.values()], dtype=np.float32))
+                         for key in ["embedding_phys", "embedding_func", "embedding_cont"]]
+
+    @staticmethod
+    def _normalize(vectors):
+        norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+        return vectors / np.where(norms == 0, 1, norms)
+
+    def similarities(self, phys, func, cont):
+        """
+        Mean cosine similarity of the physical, functional and contextual embeddings to every prefab.
+        """
+        if not self.prefab_names:
+            return np.zeros(0)
+        return sum(matrix @ self._normalize(np.asarray(vector, dtype=np.float32)) for matrix, vector in zip(self.matrices, [phys, func, cont])) / 3
+
+
+@traced("retrieve.object_list")
 def get_scene_objects(scene_description, num_obj):
     text_prompt = f"Given the following scene description: {scene_description}"
     prompt = f"""
@@ -42,16 +64,13 @@ def get_scene_objects(scene_description, num_obj):
         "required": ["objects"]
     }
 
-    response = client.models.generate_content(model="gemini-2.5-flash", contents=prompt, config={
-        'response_mime_type': 'application/json',
-        'response_schema': response_schema
-        },
-    )
+    response = generate("gemini-2.5-flash", prompt, response_schema)
 
-    return json.loads(response.text)
+    return json.loads(response)
 
 
-def find_assets_for_scene(scene_description, embeddings_data, top_n):
+@traced("retrieve")
+def find_assets_for_scene(scene_description, embeddings_data, top_n, embedding_index=None):
     """
     Generate 10 descriptions of assets required for the scene and return best matches.
 
@@ -59,12 +78,15 @@ def find_assets_for_scene(scene_description, embeddings_data, top_n):
         scene_description: Description of the scene
         embeddings_data: Dictionary containing prefab embeddings
         top_n: Number of objects to return
+        embedding_index: Optional EmbeddingIndex of embeddings_data, built if not given
 
     Returns:
         List of top matching prefabs
     """
     #Get objects needed for scene
     scene_objects = get_scene_objects(scene_description, top_n)
+    if embedding_index is None:
+        embedding_index = EmbeddingIndex(embeddings_data)
 
     # Calculate similarity with each prefab
 
@@ -74,19 +96,14 @@ def find_assets_for_scene(scene_description, embeddings_data, top_n):
         similarities = []
         name = asset.get("name")
         phys_desc, func_desc, cont_desc = asset.get("Physical properties"), asset.get("Functional properties"), asset.get("Contextual properties")
-        object_phys_embedding, object_func_embedding, object_cont_embedding = get_embedding(f"{name}: {phys_desc}"), get_embedding(f"{name}: {func_desc}"), get_embedding(f"{name}: {cont_desc}")
-        for prefab_name, data in embeddings_data.items():
-            prefab_embedding_phys = np.array(data["embedding_phys"])
-            prefab_embedding_func = np.array(data["embedding_func"])
-            prefab_embedding_cont = np.array(data["embedding_cont"])
-
-            # Calculate cosine similarity
-            similarity = (cosine_similarity([object_phys_embedding], [prefab_embedding_phys])[0][0]/3 + cosine_similarity([object_func_embedding],[prefab_embedding_func])[0][0]/3
-                          + cosine_similarity([object_cont_embedding], [prefab_embedding_cont])[0][0]/3)
-
+        with span("retrieve.embeddings"):
+            object_phys_embedding, object_func_embedding, object_cont_embedding = get_embedding(f"{name}: {phys_desc}"), get_embedding(f"{name}: {func_desc}"), get_embedding(f"{name}: {cont_desc}")
+        # Calculate cosine similarity
+        scores = embedding_index.similarities(object_phys_embedding, object_func_embedding, object_cont_embedding)
+        for prefab_name, guid, similarity in zip(embedding_index.prefab_names, embedding_index.guids, scores.tolist()):
             similarities.append({
                 "prefab_name": prefab_name,
-                "guid": data["guid"],
+                "guid": guid,
                 "quantity": asset.get("quantity"),
                 "similarity": similarity
             })
@@ -107,6 +124,7 @@ def find_assets_for_scene(scene_description, embeddings_data, top_n):
             print(f"Object not found. No matches exist for '{name}' in your database.")
     return chosen_assets
 
+@traced("retrieve.pick_best_choice")
 def pick_best_choice(target_object, top5):
     prompt = """
     You are given a description of a target object and a list of five objects with their descriptions. Your task is to tell me which one of the five objects in the list matches the description of the target object best. 
@@ -114,11 +132,5 @@ def pick_best_choice(target_object, top5):
     If you think that no object in the list can be can be used as a substitution for the target object, please output a 0.
     """
 
-    response = client.models.generate_content(
-        model="gemini-2.0-flash", contents=[prompt, str(target_object), str(top5)],
-        config={
-            'response_mime_type': 'application/json',
-            'response_schema': int
-        },
-    )
-    return int(response.text)
\ No newline at end of file
+    response = generate("gemini-2.0-flash", [prompt, str(target_object), str(top5)], int)
+    return int(response)
\ No newline at end of file
@@ -2,30 +2,48 @@
 import json
 from collections import Counter
 import argparse
-from google import genai
 import subprocess
 import os
 import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 from Object_retriever import find_assets_for_scene
-from utils import get_attr_from_guid, get_rotated_bounding_box, boxes_intersect, calculate_pivot_placement
+from utils import get_attr_from_guid, get_rotated_bounding_box
 from utils import Attributes
-from config import API_KEY, ROTATION_DATA, EMBEDDINGS
-# Set your API key
-api_key = API_KEY
-client = genai.Client(api_key=api_key)
-model = "gemini-2.5-flash"
-def get_constraints(scene_description, object_list):
+from patterns import PATTERN_TYPES, generate_pattern
+from constraints import constraint_schema, validate_constraints, constraint_order, describe_constraints, constraints_involving
+from scoring import best_candidate
+from hierarchy import place_hierarchical
+import scene_cache
+from preview import render_previews
+from rendering.render_queue import submit_job, wait_for_job
+from rendering.convert_for_blender import write_layout
+from rendering import scene_graph
+from rendering.placement_stream import PlacementStream
+from config import EMBEDDINGS, BLENDER_FILE, RENDERS, PREVIEWS, TRACES
+from llm_client import generate, set_cache_mode, set_backend, print_cache_stats, CACHE_MODES
+from tracing import span, traced, annotate, flush, merge_traces, print_summary, TRACE_DIR_ENV
+default_model = "gemini-2.5-flash" # Used when no model is passed to the placement functions
+STREAM_FILE = "placement_stream.jsonl" # Placement events, written next to placed_objects.json
+PLAN_FILE = "placement_plan.json" # Constraints and placement order, written next to placed_objects.json
+@traced("constraints")
+def get_constraints(scene_description, object_list, structured=False):
     prompt = ("You are given a scene description and a list of objects that are part of that scene. Your task is to give me positional and rotational constraints regarding the objects. If the scene description is vague and doesn't contain any positional and rotational information, I "
               "need you to add this information to create a scene that makes sense. Especially important is where the objects are placed upon or if they are against a wall and if there should be space between them. There should be a constraint for each object about this. E.g. the object is standing on the ground. The object is on the table. "
               "The object is against the north wall. etc. You are only allowed to use objects from the list to write constraints. Refrain from absolute measurements like 6 feet and so on. Only output the constraints. It may be a long list. Under no circumstances should you contradict constraints from the scene description. "
               "Start by extracting the constraints that are already part of the scene description and then add the other constraints.")
 
-    response = client.models.generate_content(
-        model="gemini-2.5-flash", contents=[prompt, str(scene_description), str(object_list)]
-    )
+    if structured:
+        prompt += (" Express every constraint as a relation between objects of the list: on_top_of, against_wall, next_to, facing or between. "
+                   "The subject is the object the constraint is about. Use object for the reference object and additionally second_object for between. For against_wall give the wall instead.")
+        response = generate("gemini-2.5-flash", [prompt, str(scene_description), str(object_list)], constraint_schema(object_list))
+        return validate_constraints(json.loads(response)["constraints"], object_list)
 
-    return response.text
+    response = generate("gemini-2.5-flash", [prompt, str(scene_description), str(object_list)])
+
+    return response
 def rescale_prefabs(objs):
     objs = get_attr_from_guid(Attributes.SIZE, objs, [])
     objs = get_attr_from_guid(Attributes.CENTER, objs, [])
@@ -36,21 +54,20 @@ def rescale_prefabs(objs):
         obj["boundsSize"] = [round(v*scale_factor, 3) for k, v in obj["boundsSize"].items()] # Size adjusted for scaling
     return objs # guid, name, size, boundsSize, boundsCenter, scale_factor
 
+@traced("order")
 def get_order(constraints, objects):
     prompt = ("You are given a list of constraints on objects about their placements and rotations. You also get the list containing all the objects. Your goal is to sort the list such that "
               "placing the objects one by one is easiest. For example, if you have a constraint: The cup is on the table. You want to place the table before the cup."
               "IMPORTANT: Under no circumstances should you add or remove any objects from the list.")
 
-    response = client.models.generate_content(
-        model="gemini-2.5-flash", contents=[prompt, str(constraints), str(objects)],
-        config={
-            'response_mime_type': 'application/json',
-            'response_schema': list[str]
-        },
-    )
+    response = generate("gemini-2.5-flash", [prompt, str(constraints), str(objects)], list[str])
 
-    return json.loads(response.text)
-def place_objects(scene_description, object_name, object_size, placed_objects, constraints):
+    return json.loads(response)
+@traced("place_object")
+def place_objects(scene_description, object_name, object_size, placed_objects, constraints, structured_constraints=None, model=None,
+                  num_candidates=1, candidate_mode="parallel", max_parallel=4):
+    # num_candidates placements are sampled, as "parallel" requests (at most max_parallel at a
+    # time) or as one request for an "array" of candidates, and the best one is kept
     system_instructions = "You are an expert AI assistant specializing in 3D object placement for the Unity game engine. Your task is to determine the correct position and rotation for a new object based on a scene description and a list of existing objects. This task requires a lot of complex reasoning and some math."
     prompt = f"""
     CRITICAL CONTEXT: UNITY'S 3D SPACE:
@@ -97,23 +114,98 @@ def place_objects(scene_description, object_name, object_size, placed_objects, c
         "required": ["center", "rotation"]
     }
 
-    global model
-
-    response = client.models.generate_content(
-        model=model, contents=[prompt],
-        config={
-            'response_mime_type': 'application/json',
-            'response_schema': response_schema,
-            'system_instruction': system_instructions
-        },
-    )
-
-    obj = json.loads(response.text)
-    obj["name"] = object_name
-    obj["size"] = object_size
-    obj["size_after_rotation"] = get_rotated_bounding_box(object_size, obj["rotation"])
-    return obj
-def update_object(scene_description, object_name, placed_objects, constraints, intersection_object):
+    model = model or default_model
+    annotate(object=object_name)
+
+    def request(contents, schema, candidate=None):
+        # Sampled candidates are cached separately, so a cached run still gets different candidates
+        return json.loads(generate(model, contents, schema, system_instructions, candidate))
+
+    if num_candidates <= 1:
+        candidates = [request([prompt], response_schema)]
+    elif candidate_mode == "array":
+        array_prompt = f"Give {num_candidates} different candidate placements that all satisfy the rules above."
+        candidates = request([prompt, array_prompt], {"type": "array", "items": response_schema})[:num_candidates] or [request([prompt], response_schema)]
+    else:
+        with ThreadPoolExecutor(max_workers=min(num_candidates, max_parallel)) as executor:
+            candidates = list(executor.map(lambda i: request([prompt], response_schema, i), range(num_candidates)))
+
+    for obj in candidates:
+        obj["name"] = object_name
+        obj["size"] = object_size
+        obj["size_after_rotation"] = get_rotated_bounding_box(object_size, obj["rotation"])
+    if len(candidates) == 1:
+        return candidates[0]
+    # Keep the candidate with the least overlap, floating and floor penetration
+    best, scores = best_candidate(candidates, placed_objects, structured_constraints)
+    print(f"Placed {object_name} with candidate {best + 1} of {len(candidates)} (scores: {[round(a, 3) for a in scores]})")
+    return candidates[best]
+@traced("place_pattern")
+def place_pattern(scene_description, object_names, object_size, placed_objects, constraints, model=None):
+    system_instructions = "You are an expert AI assistant specializing in 3D object placement for the Unity game engine. Your task is to determine how a group of identical objects is arranged, based on a scene description and a list of existing objects. This task requires a lot of complex reasoning and some math."
+    prompt = f"""
+    CRITICAL CONTEXT: UNITY'S 3D SPACE:
+    You MUST adhere to these rules at all times. All calculations and outputs must conform to Unity's coordinate system.
+
+    Coordinate System: Left-Hand System (LHS).
+    +X axis: Right
+    +Y axis: Up
+    +Z axis: Forward
+    Default Object Orientation: An object with zero rotation (0, 0, 0) faces the positive Z-axis (0, 0, 1) (+Z).
+    Rotation Rule: Rotations are Euler angles (X, Y, Z) in degrees.
+    A positive rotation of 90 degrees around the Y-axis rotates an object from the Forward direction (Z+) towards the Right direction (X+).
+    A negative rotation of 90 degrees around the Y-axis rotates an object from the Forward direction (Z+) towards the Left direction (X-).
+    The floor is at Y = 0.
+    The center of the room is at X = Z = 0
+
+    YOUR TASK:
+    1.  Analyze the Scene: Read the scene_description and the already_placed_objects list.
+    2.  Choose a Pattern: The scene contains {len(object_names)} identical copies of an object with a bounding box size of {object_size}: {object_names}. Choose the layout primitive that arranges them naturally:
+        row: The copies stand side by side along the pattern axis, all with the same rotation.
+        grid: The copies form rows along the pattern axis with the given number of columns, all with the same rotation.
+        ring: The copies surround the center at the given radius, facing the center. Use this e.g. for chairs around a round table.
+        pairs: The copies form two mirrored rows at the given distance on both sides of the pattern axis, facing each other. Use this e.g. for chairs on both sides of a long table.
+    3.  Determine the Parameters:
+        center: The center of the pattern. For ring and pairs this is the center of the object the copies surround. The Y value is the height of the center of each copy.
+        axis_rotation: The rotation around the Y-axis in degrees of the pattern axis. With 0 the pattern axis runs along the X-axis. For a ring this is the angle of the first copy.
+        rotation: For row and grid, the rotation around the Y-axis in degrees of every copy. For ring and pairs, an offset to the direction facing the center (0 means facing the center).
+        spacing: The free space between neighbouring copies.
+        columns: The number of columns of a grid. Use 1 for the other patterns.
+        radius: For ring, the distance from the center to every copy. For pairs, the distance from the pattern axis to each row. Use 0 for the other patterns.
+    4.  Adhere to Constraints: Ensure the placement satisfies all layout rules from the scene_description and the constraints list. But ALWAYS prioritize the scene_description, when there are contradictions.
+    5.  Output JSON: Generate a single, clean JSON object with the pattern and its parameters.
+    INPUT DATA:
+    Scene Description: {scene_description}
+    Constraints: {constraints}
+    Already Placed Objects: {placed_objects}
+    Each object in the list has a name, center, size, size_after_rotation and rotation.
+    The size_after_rotation field is the original size of the bounding box with the applied rotation. This is to save you the trouble of doing the math yourself.
+
+    """
+    response_schema = {
+        "type": "object",
+            "properties": {
+                "pattern": {"type": "string", "enum": PATTERN_TYPES},
+                "center": {"type": "array",
+                           "description": "The center of the pattern as a 3d vector.",
+                           "items": {"type": "number"}
+                           },
+                "axis_rotation": {"type": "number", "description": "The rotation of the pattern axis around the Y-axis in degrees."},
+                "rotation": {"type": "number", "description": "The rotation of the copies around the Y-axis in degrees."},
+                "spacing": {"type": "number", "description": "The free space between neighbouring copies."},
+                "columns": {"type": "integer", "description": "The number of columns of a grid."},
+                "radius": {"type": "number", "description": "The radius of a ring or the distance of each row of pairs to the pattern axis."}
+            },
+        "required": ["pattern", "center", "axis_rotation", "rotation", "spacing", "columns", "radius"]
+    }
+
+    model = model or default_model
+
+    response = generate(model, [prompt], response_schema, system_instructions)
+
+    return generate_pattern(object_names, object_size, json.loads(response))
+@traced("refine_object")
+def update_object(scene_description, object_name, placed_objects, constraints, intersection_object, model=None):
     system_instructions = "You are an expert AI assistant specializing in 3D object placement for the Unity game engine. Your task is to determine the correct position and rotation for a single object in the scene, based on a scene description and a list of existing objects. This task requires a lot of complex reasoning and some math."
     intersection_prompt = "The objects bounding box is intersecting other objects bounding boxes. Analyze these intersections in the list and ask yourself, if that makes sense."
     intersection_data = f"Intersecting objects list: {intersection_object}. All objects in this list have a non negligible intersecting bounding box with the {object_name}, whether this makes sense or not, is your task to figure out."
@@ -159,48 +251,123 @@ def update_object(scene_description, object_name, placed_objects, constraints, i
             },
         "required": ["center", "rotation"]
     }
-    global model
-    response = client.models.generate_content(
-        model=model, contents=[prompt, str(constraints) ,str(placed_objects)],
-        config={
-            'response_mime_type': 'application/json',
-            'response_schema': response_schema,
-            'system_instruction': system_instructions
-        },
-    )
-    obj = json.loads(response.text)
+    model = model or default_model
+    response = generate(model, [prompt], response_schema, system_instructions)
+    obj = json.loads(response)
     return obj
 
-def place_objects_from_list(scene_description, obj_list, skip_refinement=False):
-    with open(ROTATION_DATA, 'r') as file:
-        rotation_data = json.load(file)
+def group_instances(objs):
+    # Move all instances of a duplicated object to the position of its first instance
+    groups = {}
+    for obj in objs:
+        groups.setdefault(obj.get("group", obj["name"]), []).append(obj)
+    return [obj for group in groups.values() for obj in group]
+
+def place_sequence(scene_description, objs, constraints, constraint_list=None, pattern_placement=False, pattern_names=None, model=None, on_place=None,
+                   place_object=place_objects):
+    # Place the objects one after another, pattern_names collects the objects placed by a pattern.
+    # on_place is called with every placed object as soon as it is placed. place_object places a
+    # single object, e.g. place_objects with the candidate options applied.
+    placed_objects = []
+    pattern_names = set() if pattern_names is None else pattern_names
+    for i, obj in enumerate(objs):
+        if obj["name"] in pattern_names: continue
+        group = [o for o in objs[i:] if "group" in obj and o.get("group") == obj["group"]]
+        if pattern_placement and len(group) > 1:
+            # One call for the whole group, the instance transforms are generated locally
+            names = [o["name"] for o in group]
+            new_objects = place_pattern(scene_description, names, obj["size"], placed_objects, constraints, model)
+            pattern_names.update(names)
+        else:
+            new_objects = [place_object(scene_description, obj["name"], obj["size"], placed_objects, constraints, constraint_list, model)]
+        placed_objects += new_objects
+        if on_place:
+            for placed in new_objects:
+                on_place(placed)
+    return placed_objects
+
+def placement_event(scene, row):
+    # Everything a consumer of the placement stream needs to show the object
+    record = scene[row:row + 1]
+    event = {field: record[field][0].tolist() for field in ["name", "guid", "center", "rotation", "size", "size_after_rotation", "pivot"]}
+    event["blender"] = scene_graph.to_blender(record)[0]
+    return event
+
+def place_objects_from_list(scene_description, obj_list, skip_refinement=False, pattern_placement=False, structured_constraints=False, hierarchical=False, embeddings_data=None,
+                            output_dir=None, model=None, plan=None, num_candidates=1, candidate_mode="parallel", max_parallel=4):
+    # Without an output folder, the placed objects are written next to this script. A plan with the
+    # constraints and order of a similar earlier scene is used if it has the same objects.
+    pre_rotations = scene_graph.asset_tables()[1]
     sizes = obj_list
 
     names = [obj["name"] for obj in sizes]
 
-    constraints = get_constraints(scene_description, names)
+    reuse_plan = plan is not None and sorted(plan["names"]) == sorted(names)
+    if reuse_plan:
+        print("Reusing the constraints and order of a similar cached scene.")
+    constraints = plan["constraints"] if reuse_plan else get_constraints(scene_description, names, structured_constraints)
+    new_plan = {"names": names, "constraints": constraints}
     objs = rescale_prefabs(sizes)
     obj_mod = []
     for obj in objs:
         new_obj = {"size" if k == "boundsSize" else k: v for k, v in obj.items()}
-        rotation = [a["rotation"] for a in rotation_data if a["guid"] == obj["guid"]] # [[0,0,0]] or [] depending on, if rotation was fixed
-        if len(rotation) > 0:
-            swap = False if (rotation[0][1]/90)%2 == 0 else True
+        rotation = pre_rotations.get(obj["guid"]) # [0,0,0] or None depending on, if rotation was fixed
+        if rotation is not None:
+            swap = False if (rotation[1]/90)%2 == 0 else True
             if swap:
                 new_obj["size"][0], new_obj["size"][-1] = new_obj["size"][-1], new_obj["size"][0]
         obj_mod.append(new_obj)
     objs = obj_mod
     # name, guid, size, scale_factor, boundsCenter
-    order = get_order(constraints,names)
+    constraint_list = None
+    if structured_constraints:
+        # The order follows from the constraint graph, the prompts get the constraints as text
+        constraint_list = constraints
+        order = constraint_order(names, constraints)
+        constraints = describe_constraints(constraints)
+    else:
+        order = plan["order"] if reuse_plan else get_order(constraints,names)
+    new_plan["order"] = order
     objs.sort(key=lambda _obj: order.index(_obj["name"]))
+    if pattern_placement:
+        objs = group_instances(objs)
     #########
     # Place objects one by one
     ########
-    placed_objects = []
+    pattern_names = set()
+    membership = None
+    script_dir = os.path.dirname(os.path.abspath(__file__)) if output_dir is None else output_dir
+    os.makedirs(script_dir, exist_ok=True)
+    with open(os.path.join(script_dir, PLAN_FILE), 'w') as file:
+        json.dump(new_plan, file, indent=4)
+    # Every object is recorded in the scene and streamed as soon as its transform is known
+    stream = PlacementStream(os.path.join(script_dir, STREAM_FILE))
+    scene = scene_graph.new_scene(objs)
+    rows = {obj["name"]: i for i, obj in enumerate(objs)}
 
-    for obj in objs:
-        placed_objects.append(place_objects(scene_description, obj["name"], obj["size"], placed_objects, constraints))
+    def emit(kind, placed):
+        row = rows[placed["name"]]
+        scene_graph.set_transform(scene, row, placed["center"], placed["rotation"], placed["size_after_rotation"])
+        stream.emit(kind, **placement_event(scene, row))
+
+    place_object = partial(place_objects, num_candidates=num_candidates, candidate_mode=candidate_mode, max_parallel=max_parallel)
+
+    def layout_group(description, group_objs, group_constraints, on_place=None):
+        return place_sequence(description, group_objs, group_constraints, constraint_list, pattern_placement, pattern_names, model, on_place, place_object)
+
+    with span("placement", objects=len(objs)):
+        if hierarchical:
+            # The groups are laid out in their own coordinates, so the objects are only final at the end
+            placed_objects, membership = place_hierarchical(scene_description, objs, constraint_list, layout_group, partial(place_object, model=model), embeddings_data, max_parallel)
+            index = {obj["name"]: i for i, obj in enumerate(placed_objects)}
+            objs.sort(key=lambda _obj: index[_obj["name"]])
+            for placed in placed_objects:
+                emit("placed", placed)
+        else:
+            placed_objects = layout_group(scene_description, objs, constraints, partial(emit, "placed"))
     # name, size, center, rotation, size_after_rotation
+    scene = scene[[rows[placed["name"]] for placed in placed_objects]]
+    rows = {placed["name"]: i for i, placed in enumerate(placed_objects)}
 
     # for obj_data, obj_transform in zip(objs, placed_objects):
     #     rots = [a["rotation"] for a in rotation_data if a["guid"] == obj_data["guid"]]
@@ -209,35 +376,51 @@ def place_objects_from_list(scene_description, obj_list, skip_refinement=False):
     #     else: new_rotation = obj_transform["rotation"]
     #     output0.append({"guid": obj_data["guid"], "center": calculate_pivot_placement(obj_transform["center"], new_rotation, [a for a in obj_data["boundsCenter"]]),
     #                    "rotation": new_rotation, "scale_factor": obj_data["scale_factor"]})
-    script_dir = os.path.dirname(os.path.abspath(__file__))
+    preview_dir = PREVIEWS if output_dir is None else os.path.join(output_dir, "previews")
 
     # Build absolute path to placed_objects.json in the same directory
     json_path = os.path.join(script_dir, "placed_objects.json")
     json_data_path = os.path.join(script_dir, "placed_objects_data.json")
     if skip_refinement:
+        stream.close(objects=len(placed_objects))
         # Write JSON
         with open(json_path, 'w') as file:
             json.dump(placed_objects, file, indent=4)
         with open(json_data_path, 'w') as file:
             json.dump(objs, file, indent=4)
-        return
+        scene_graph.save(scene, os.path.join(script_dir, scene_graph.SCENE_FILE))
+        render_previews(placed_objects, preview_dir)
+        return scene
 
     #########################
     # Refinement step
     #########################
 
-    for obj in placed_objects:
-        intersections = []
-        for _obj in placed_objects:
-            if _obj["name"] == obj["name"]: continue
-            if boxes_intersect(obj["center"], obj["size_after_rotation"], _obj["center"], _obj["size_after_rotation"]):
-                intersections.append(_obj["name"])
-        if not intersections: continue
-        new_values = update_object(scene_description, obj["name"], placed_objects, constraints, intersections)
+    with span("refinement") as attributes:
+        refined = 0
+        for row, obj in enumerate(placed_objects):
+            if obj["name"] in pattern_names: continue # Pattern instances are generated without overlaps, refining them one by one would break the pattern
+            intersections = scene["name"][scene_graph.intersections(scene, row)[0]].tolist()
+            if not intersections: continue
+            refined += 1
+            context = placed_objects
+            if membership is not None:
+                # Only show the object's own group and the objects it intersects
+                context = [o for o in placed_objects if membership[o["name"]] == membership[obj["name"]] or o["name"] in intersections]
+            object_constraints = constraints
+            if constraint_list is not None:
+                # Only the constraints of the object and the objects it intersects
+                object_constraints = describe_constraints(constraints_involving(constraint_list, [obj["name"]] + intersections))
+            new_values = update_object(scene_description, obj["name"], context, object_constraints, intersections, model)
 
-        obj["center"] = new_values["center"]
-        obj["rotation"] = new_values["rotation"]
-        obj["size_after_rotation"] = get_rotated_bounding_box(obj["size"], new_values["rotation"])
+            scene_graph.set_transform(scene, row, new_values["center"], new_values["rotation"])
+            obj["center"] = new_values["center"]
+            obj["rotation"] = new_values["rotation"]
+            obj["size_after_rotation"] = scene["size_after_rotation"][row].tolist()
+            stream.emit("refined", **placement_event(scene, row))
+        attributes["refined"] = refined
+    stream.close(objects=len(placed_objects))
+    print(f"Refinement needed for {refined} of {len(placed_objects)} objects.")
 
     # for obj_data, obj_transform in zip(objs, placed_objects):
     #     rots = [a["rotation"] for a in rotation_data if a["guid"] == obj_data["guid"]]
@@ -250,23 +433,88 @@ def place_objects_from_list(scene_description, obj_list, skip_refinement=False):
         json.dump(placed_objects, file, indent=4)
     with open(json_data_path, 'w') as file:
         json.dump(objs, file, indent=4)
+    scene_graph.save(scene, os.path.join(script_dir, scene_graph.SCENE_FILE))
+    render_previews(placed_objects, preview_dir)
 
-    return
-def main():
-    parser = argparse.ArgumentParser(description="Build scene.")
-    parser.add_argument("--prompt", help="The input prompt.", required=True)
-    parser.add_argument("--no-refinement", help="Skip the refinement step.", action="store_true")
-    parser.add_argument("--num-objects", help="Override the number of different objects to use.", default="")
-    parser.add_argument("--model", help="The gemini model used.", default="gemini-2.5-flash")
-    args = parser.parse_args()
-    skip_refinement = args.no_refinement
-    global model
-    model = args.model
-    with open(EMBEDDINGS, 'r') as file:
-        embeddings_data = json.load(file)
+    return scene
+def scene_files(output_dir, tiers):
+    # The outputs of a scene by the name they are cached under, and its renders
+    scene_dir = os.path.dirname(os.path.abspath(__file__)) if output_dir is None else output_dir
+    files = {name: os.path.join(scene_dir, name) for name in ["placed_objects.json", "placed_objects_data.json", scene_graph.SCENE_FILE, PLAN_FILE]}
+    files["raw_blender.json"] = BLENDER_FILE if output_dir is None else os.path.join(output_dir, "raw_blender.json")
+    files["previews"] = PREVIEWS if output_dir is None else os.path.join(output_dir, "previews")
+    renders = {f"{tier}_render.png": os.path.join(RENDERS if output_dir is None else output_dir, f"{tier}_render.png") for tier in tiers}
+    return files, renders
+def build_scene(args, embeddings_data, output_dir=None, embedding_index=None, render=True):
+    """
+    Build the scene of args.prompt, convert it for Blender and render it.
+
+    Args:
+        args: The parsed arguments of get_parser.
+        embeddings_data: Dictionary containing prefab embeddings.
+        output_dir: Folder for all outputs of the scene. By default they go to build_scene and the results folder.
+        embedding_index: Optional EmbeddingIndex of embeddings_data, shared between scenes.
+        render: Whether to render the scene.
 
+    Returns:
+        Path of the converted layout.
+    """
+    files, renders = scene_files(output_dir, [t for t in args.render_tiers.split(",") if t])
+    layout_path = files["raw_blender.json"]
+    render_path = os.path.join(RENDERS if output_dir is None else output_dir, "final_render.png")
+    script_path = os.path.abspath(os.path.join(os.path.dirname(__file__), "../rendering/render_layout.py"))
+    cached = scene_cache.lookup(args) if args.scene_cache != "off" else None
+    if cached:
+        with span("scene_cache.restore"):
+            restored = scene_cache.restore(cached, {**files, **renders})
+        print(f"Scene restored from the cache ({cached}).")
+        if not render or all(name in restored for name in renders):
+            return layout_path
+        # Cached without the requested renders
+        with open(layout_path, 'r') as file:
+            layout = json.load(file)
+        render_scene(args, layout, layout_path, render_path, script_path)
+        scene_cache.store(args, {**files, **renders})
+        return layout_path
+    plan = scene_cache.near_hit(args) if args.scene_cache == "semantic" else None
+
+    blender = None
+    if render and args.stream and not args.render_worker:
+        # Blender starts right away and imports every object as soon as it is placed
+        stream_path = os.path.join(os.path.dirname(files["placed_objects.json"]), STREAM_FILE)
+        if os.path.exists(stream_path):
+            os.remove(stream_path)
+        blender = subprocess.Popen(["blender", "--background", "--python", script_path, "--", "--tiers", args.render_tiers, "--stream", stream_path, "--output", render_path])
+    try:
+        layout = place_scene(args, embeddings_data, output_dir, embedding_index, layout_path, plan)
+    except BaseException:
+        if blender:
+            blender.kill()
+        raise
+    if blender:
+        with span("blender"):
+            if blender.wait() != 0:
+                raise subprocess.CalledProcessError(blender.returncode, blender.args)
+    elif render:
+        render_scene(args, layout, layout_path, render_path, script_path)
+    if args.scene_cache != "off":
+        with span("scene_cache.store"):
+            scene_cache.store(args, {**files, **(renders if render else {})})
+    return layout_path
+def render_scene(args, layout, layout_path, render_path, script_path):
+    if args.render_worker:
+        # Hand the layout to the running render worker instead of starting Blender
+        with span("render_worker"):
+            job_id = submit_job(layout, render_path, tiers=args.render_tiers.split(","))
+            print(f"Rendered in {wait_for_job(job_id)['result']['seconds']}s by the render worker.")
+        return
+    with span("blender"):
+        subprocess.run(["blender", "--background", "--python", script_path, "--", "--tiers", args.render_tiers, "--layout", layout_path, "--output", render_path], check=True)
+def place_scene(args, embeddings_data, output_dir, embedding_index, layout_path, plan=None):
+    # Retrieve the assets, place them and convert the placed scene for Blender
+    skip_refinement = args.no_refinement
     prompt = args.prompt
-    retrieved_objs = find_assets_for_scene(prompt, embeddings_data,args.num_objects)
+    retrieved_objs = find_assets_for_scene(prompt, embeddings_data,args.num_objects, embedding_index)
     retrieved_objs = get_attr_from_guid(Attributes.NAME, retrieved_objs, [])
     scene_guids = sum([[data["guid"] for a in range(data["quantity"])] for data in retrieved_objs if data["guid"] != 0], [])
     counter = Counter(scene_guids)
@@ -276,12 +524,57 @@ def main():
         if o["guid"] in seen: continue
         seen.append(o["guid"])
         for i in range(counter[o["guid"]]):
-            input_objects.append({"guid": o["guid"], "name": o["name"]+str(i+1) if i>0 else o["name"]})
+            input_objects.append({"guid": o["guid"], "name": o["name"]+str(i+1) if i>0 else o["name"], "group": o["guid"]})
 
-    place_objects_from_list(prompt, input_objects, skip_refinement)
-    script_path = os.path.abspath(os.path.join(os.path.dirname(__file__), "../rendering/convert_for_blender.py"))
-    subprocess.run(["python", script_path], check=True)
-    script_path = os.path.abspath(os.path.join(os.path.dirname(__file__), "../rendering/render_layout.py"))
-    subprocess.run(["blender", "--background", "--python", script_path], check=True)
+    scene = place_objects_from_list(prompt, input_objects, skip_refinement, args.pattern_placement, args.structured_constraints or args.hierarchical,
+                                                        args.hierarchical, embeddings_data, output_dir, args.model, plan,
+                                                        args.candidates, args.candidate_mode, args.max_parallel)
+    with span("convert_for_blender"):
+        return write_layout(scene, layout_path)
+def get_parser():
+    parser = argparse.ArgumentParser(description="Build scene.")
+    parser.add_argument("--prompt", help="The input prompt.", required=True)
+    parser.add_argument("--no-refinement", help="Skip the refinement step.", action="store_true")
+    parser.add_argument("--num-objects", help="Override the number of different objects to use.", default="")
+    parser.add_argument("--model", help="The gemini model used.", default="gemini-2.5-flash")
+    parser.add_argument("--candidates", help="Number of candidate placements sampled per object.", type=int, default=1)
+    parser.add_argument("--candidate-mode", help="Request the candidates in parallel or as an array in a single call.", choices=["parallel", "array"], default="parallel")
+    parser.add_argument("--max-parallel", help="Maximum number of concurrent candidate requests.", type=int, default=4)
+    parser.add_argument("--structured-constraints", help="Use typed constraints and compute the placement order locally.", action="store_true")
+    parser.add_argument("--hierarchical", help="Lay out functional groups of objects separately and place them as rigid units. Implies --structured-constraints.", action="store_true")
+    parser.add_argument("--render-tiers", help="Comma separated render tiers: preview (Workbench), draft (fast Cycles) and final.", default="final")
+    parser.add_argument("--render-worker", help="Render with the running render worker instead of a new Blender process.", action="store_true")
+    parser.add_argument("--stream", help="Start Blender before the placement and import every object as soon as it is placed.", action="store_true")
+    parser.add_argument("--pattern-placement", help="Place duplicated objects with a single layout primitive.", action="store_true")
+    parser.add_argument("--scene-cache", help="Reuse cached scenes with the same prompt and settings (exact), additionally reuse the constraints and order of similar prompts (semantic), or don't cache (off).",
+                        choices=scene_cache.CACHE_MODES, default="off")
+    parser.add_argument("--llm-cache", help="Use and store cached LLM responses (readwrite), only use them (replay) or don't cache (off).", choices=CACHE_MODES, default=None)
+    parser.add_argument("--fake-llm", help="Use the offline fake LLM backend instead of the Gemini API.", action="store_true")
+    parser.add_argument("--trace", help="Save a trace of all stages, including the subprocesses and Blender, to results/traces.", action="store_true")
+    return parser
+def main():
+    args = get_parser().parse_args()
+    global default_model
+    default_model = args.model
+    if args.llm_cache:
+        set_cache_mode(args.llm_cache)
+    if args.fake_llm:
+        set_backend("fake")
+    if args.trace:
+        # Subprocesses and Blender write their spans to the same folder
+        os.environ[TRACE_DIR_ENV] = os.path.join(TRACES, time.strftime("%Y%m%d-%H%M%S"))
+    with span("scene"):
+        with span("load_embeddings"):
+            with open(EMBEDDINGS, 'r') as file:
+                embeddings_data = json.load(file)
+        build_scene(args, embeddings_data)
+    print_cache_stats()
+    if args.trace:
+        flush()
+        trace_dir = os.environ[TRACE_DIR_ENV]
+        print_summary(merge_traces(trace_dir, os.path.join(trace_dir, "trace.json")))
+        print(f"Trace saved to {os.path.join(trace_dir, 'trace.json')}")
+    else:
+        print_summary()
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,163 @@
+import argparse
+import json
+import os
+import re
+import sys
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor, as_completed
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+import PlaceObjects
+import scene_cache
+from Object_retriever import EmbeddingIndex
+from config import EMBEDDINGS, RESULTS
+from llm_client import set_cache_mode, set_backend, print_cache_stats, CACHE_MODES
+from tracing import span, print_summary
+
+# Builds the scenes of a JSONL prompt file in one process:
+#   python build_scene/batch.py --prompts prompts.jsonl --workers 4
+# Every line holds a prompt and optionally an id and the options of PlaceObjects.py by their
+# argument name, e.g. {"id": "kitchen", "prompt": "...", "num_objects": 8, "model": "gemini-2.5-flash", "no_refinement": true}.
+# The scenes share the loaded embeddings and metadata, and every scene writes its outputs to
+# its own folder. Finished scenes are recorded in journal.jsonl, so an interrupted batch
+# continues where it stopped when started again.
+ITEM_OPTIONS = ["prompt", "num_objects", "model", "no_refinement", "pattern_placement", "structured_constraints", "hierarchical", "candidates", "candidate_mode"]
+
+
+def load_prompts(path):
+    items = []
+    with open(path, 'r') as file:
+        for i, line in enumerate(file):
+            if not line.strip(): continue
+            item = json.loads(line)
+            if "refinement" in item:
+                item["no_refinement"] = not item.pop("refinement")
+            unknown = set(item) - set(ITEM_OPTIONS) - {"id"}
+            if unknown:
+                raise ValueError(f"Line {i + 1} of {path}: unknown options {sorted(unknown)}, expected {ITEM_OPTIONS}.")
+            # The id names the output folder of the scene
+            item["id"] = re.sub(r"[^\w.-]", "_", str(item.get("id", f"scene_{i:04d}")))
+            items.append(item)
+    ids = [item["id"] for item in items]
+    duplicates = sorted({i for i in ids if ids.count(i) > 1})
+    if duplicates:
+        raise ValueError(f"Duplicate ids in {path}: {duplicates}")
+    return items
+
+
+def read_journal(path):
+    """
+    Ids of the scenes that were finished in earlier runs.
+    """
+    done = set()
+    if os.path.isfile(path):
+        with open(path, 'r') as file:
+            for line in file:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue # Line cut off by an interrupted run
+                if entry.get("status") == "done":
+                    done.add(entry["id"])
+    return done
+
+
+class Journal:
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def write(self, entry):
+        with self._lock, open(self.path, 'a') as file:
+            file.write(json.dumps(entry) + "\n")
+
+
+def run_item(item, defaults, embeddings_data, embedding_index, output_dir, render):
+    args = argparse.Namespace(**{**vars(defaults), **{k: v for k, v in item.items() if k != "id"}})
+    scene_dir = os.path.join(output_dir, item["id"])
+    os.makedirs(scene_dir, exist_ok=True)
+    with open(os.path.join(scene_dir, "prompt.json"), 'w') as file:
+        json.dump(item, file, indent=4)
+    with span("batch.scene", scene=item["id"]):
+        return PlaceObjects.build_scene(args, embeddings_data, scene_dir, embedding_index, render)
+
+
+def run_batch(items, defaults, output_dir, workers=4, render=False):
+    """
+    Build the scenes of all items that are not finished yet.
+
+    Args:
+        items: Prompts with their options, as returned by load_prompts.
+        defaults: Parsed PlaceObjects arguments used for the options an item doesn't set.
+        output_dir: Folder with one subfolder per scene and the journal.
+        workers: Number of scenes built at the same time.
+        render: Whether to render every scene.
+
+    Returns:
+        Number of scenes built and failed in this run.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    journal = Journal(os.path.join(output_dir, "journal.jsonl"))
+    done = read_journal(journal.path)
+    todo = [item for item in items if item["id"] not in done]
+    print(f"{len(done)} of {len(items)} scenes already done, {len(todo)} to build.")
+    if not todo:
+        return 0, 0
+
+    with span("batch.load_embeddings"):
+        with open(EMBEDDINGS, 'r') as file:
+            embeddings_data = json.load(file)
+        embedding_index = EmbeddingIndex(embeddings_data)
+
+    start = time.time()
+    built, failed = 0, 0
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(run_item, item, defaults, embeddings_data, embedding_index, output_dir, render): item for item in todo}
+        for future in as_completed(futures):
+            item = futures[future]
+            entry = {"id": item["id"], "finished": time.strftime("%Y-%m-%d %H:%M:%S")}
+            try:
+                entry.update(status="done", layout=future.result())
+                built += 1
+            except Exception as e:
+                traceback.print_exception(e)
+                entry.update(status="failed", error=f"{e.__class__.__name__}: {e}")
+                failed += 1
+            journal.write(entry)
+            rate = built / (time.time() - start) * 3600
+            print(f"[{built + failed}/{len(todo)}] {item['id']}: {entry['status']} ({rate:.1f} scenes/hour)")
+
+    hours = (time.time() - start) / 3600
+    print(f"Built {built} scenes in {hours * 60:.1f} minutes ({built / hours:.1f} scenes/hour), {failed} failed.")
+    return built, failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the scenes of a JSONL prompt file.")
+    parser.add_argument("--prompts", help="JSONL file with one prompt and its options per line.", required=True)
+    parser.add_argument("--output", help="The output folder with one folder per scene.", default=os.path.join(RESULTS, "batch"))
+    parser.add_argument("--workers", help="Number of scenes built at the same time.", type=int, default=4)
+    parser.add_argument("--render", help="Render every scene with a new Blender process, or with the render worker with --render-worker.", action="store_true")
+    parser.add_argument("--render-worker", help="Render with the running render worker.", action="store_true")
+    parser.add_argument("--render-tiers", help="Comma separated render tiers.", default="final")
+    parser.add_argument("--candidates", help="Number of candidate placements sampled per object, for items that don't set it.", type=int, default=1)
+    parser.add_argument("--scene-cache", help="Reuse cached scenes (exact), also reuse the constraints and order of similar prompts (semantic), or don't cache (off).", choices=scene_cache.CACHE_MODES, default="off")
+    parser.add_argument("--llm-cache", help="Use and store cached LLM responses (readwrite), only use them (replay) or don't cache (off).", choices=CACHE_MODES, default=None)
+    parser.add_argument("--fake-llm", help="Use the offline fake LLM backend instead of the Gemini API.", action="store_true")
+    args = parser.parse_args()
+    if args.llm_cache:
+        set_cache_mode(args.llm_cache)
+    if args.fake_llm:
+        set_backend("fake")
+
+    # Options not set by an item take the defaults of PlaceObjects.py
+    defaults = PlaceObjects.get_parser().parse_args(["--prompt", "", "--render-tiers", args.render_tiers, "--scene-cache", args.scene_cache, "--candidates", str(args.candidates)]
+                                                    + (["--render-worker"] if args.render_worker else []))
+    items = load_prompts(args.prompts)
+    run_batch(items, defaults, args.output, args.workers, args.render or args.render_worker)
+    print_cache_stats()
+    print_summary()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+import heapq
+
+# Relations and the fields naming other objects they refer to
+RELATIONS = {
+    "on_top_of": ["object"],
+    "against_wall": [],
+    "next_to": ["object"],
+    "facing": ["object"],
+    "between": ["object", "second_object"],
+}
+# Walls of the room in Unity's coordinate system
+WALLS = {"north": (2, 1), "south": (2, -1), "east": (0, 1), "west": (0, -1)}
+
+
+def constraint_schema(object_names):
+    """
+    Response schema for a structured constraint list over the given objects.
+    """
+    return {
+        "type": "object",
+        "properties": {
+            "constraints": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        "relation": {"type": "string", "enum": list(RELATIONS)},
+                        "subject": {"type": "string", "enum": list(object_names), "description": "The object the constraint is about."},
+                        "object": {"type": "string", "enum": list(object_names), "description": "The reference object. Not used for against_wall."},
+                        "second_object": {"type": "string", "enum": list(object_names), "description": "The second reference object. Only used for between."},
+                        "wall": {"type": "string", "enum": list(WALLS), "description": "The wall. Only used for against_wall."}
+                    },
+                    "required": ["relation", "subject"]
+                }
+            }
+        },
+        "required": ["constraints"]
+    }
+
+
+def validate_constraints(constraints, object_names):
+    """
+    Remove all constraints that don't refer to objects of the scene.
+
+    Args:
+        constraints: List of constraints with relation, subject and the fields required by the relation.
+        object_names: Names of all objects in the scene.
+
+    Returns:
+        List of valid constraints without duplicates.
+    """
+    names = set(object_names)
+    valid = []
+    for constraint in constraints:
+        relation = constraint.get("relation")
+        if relation not in RELATIONS or constraint.get("subject") not in names:
+            continue
+        refs = [constraint.get(field) for field in RELATIONS[relation]]
+        if any(ref not in names or ref == constraint["subject"] for ref in refs) or len(set(refs)) < len(refs):
+            continue
+        clean = {"relation": relation, "subject": constraint["subject"]}
+        clean.update({field: ref for field, ref in zip(RELATIONS[relation], refs)})
+        if relation == "against_wall" and constraint.get("wall") in WALLS:
+            clean["wall"] = constraint["wall"]
+        if clean not in valid:
+            valid.append(clean)
+    return valid
+
+
+def _cycle_start(remaining, dependencies, index):
+    # Follow the dependencies from the first remaining object until one repeats, it lies on a cycle
+    path = []
+    name = min(remaining, key=index.get)
+    while name not in path:
+        path.append(name)
+        name = min(dependencies[name], key=index.get)
+    return min(path[path.index(name):], key=index.get)
+
+
+def constraint_order(object_names, constraints):
+    """
+    Sort the objects such that every object is placed after the objects its constraints refer to.
+
+    Ties are broken by the position in object_names. Cycles are broken by placing the
+    first object of the cycle.
+
+    Args:
+        object_names: Names of all objects in the scene.
+        constraints: Validated list of constraints.
+
+    Returns:
+        List containing every name of object_names exactly once.
+    """
+    index = {name: i for i, name in enumerate(object_names)}
+    dependencies = {name: set() for name in object_names}
+    dependents = {name: set() for name in object_names}
+    for constraint in constraints:
+        for field in RELATIONS[constraint["relation"]]:
+            dependencies[constraint["subject"]].add(constraint[field])
+            dependents[constraint[field]].add(constraint["subject"])
+
+    ready = [index[name] for name in object_names if not dependencies[name]]
+    heapq.heapify(ready)
+    remaining = set(object_names)
+    order = []
+    while remaining:
+        if not ready:
+            heapq.heappush(ready, index[_cycle_start(remaining, dependencies, index)])
+        name = object_names[heapq.heappop(ready)]
+        if name not in remaining:
+            continue
+        remaining.discard(name)
+        order.append(name)
+        for dependent in dependents[name]:
+            dependencies[dependent].discard(name)
+            if not dependencies[dependent] and dependent in remaining:
+                heapq.heappush(ready, index[dependent])
+    return order
+
+
+def describe_constraints(constraints):
+    """
+    Turn a structured constraint list into the text used in the placement prompts.
+    """
+    lines = []
+    for c in constraints:
+        if c["relation"] == "on_top_of":
+            lines.append(f"The {c['subject']} is on top of the {c['object']}.")
+        elif c["relation"] == "against_wall":
+            lines.append(f"The {c['subject']} is against the {c['wall']} wall." if "wall" in c else f"The {c['subject']} is against a wall.")
+        elif c["relation"] == "next_to":
+            lines.append(f"The {c['subject']} is next to the {c['object']}.")
+        elif c["relation"] == "facing":
+            lines.append(f"The {c['subject']} is facing the {c['object']}.")
+        elif c["relation"] == "between":
+            lines.append(f"The {c['subject']} is between the {c['object']} and the {c['second_object']}.")
+    return "\n".join(lines)
+
+
+def constraints_involving(constraints, names):
+    """
+    The constraints whose subject or reference objects are among names, so a prompt about a few
+    objects doesn't carry the constraints of the whole scene.
+    """
+    names = set(names)
+    return [c for c in constraints if any(c.get(field) in names for field in ["subject"] + RELATIONS[c["relation"]])]
@@ -0,0 +1,176 @@
+import math
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from constraints import describe_constraints, constraints_involving
+from utils import get_rotated_bounding_box
+
+MAX_GROUP_SIZE = 12 # Larger groups are split, so that the prompt of every group stays small
+SIMILARITY_THRESHOLD = 0.75 # Minimum embedding similarity for joining an object to a group
+
+
+def _embedding(embeddings_data, guid):
+    for data in embeddings_data.values():
+        if data["guid"] == guid:
+            vec = np.array(data["embedding_func"]) + np.array(data["embedding_cont"])
+            return vec / np.linalg.norm(vec)
+    return None
+
+
+def group_objects(objs, constraint_list=None, embeddings_data=None, max_group_size=MAX_GROUP_SIZE):
+    """
+    Cluster the objects of a scene into functional groups.
+
+    Objects connected by a relation of the constraint graph (other than against_wall) and
+    instances of the same asset form a group. Remaining single objects join the group with
+    the most similar functional and contextual embedding.
+
+    Args:
+        objs: Objects in placement order with name, guid and optionally group.
+        constraint_list: Optional structured constraints.
+        embeddings_data: Optional dictionary of prefab embeddings.
+        max_group_size: Maximum number of objects per group.
+
+    Returns:
+        List of groups, each a list of objects in placement order.
+    """
+    parent = {obj["name"]: obj["name"] for obj in objs}
+
+    def find(name):
+        while parent[name] != name:
+            parent[name] = parent[parent[name]]
+            name = parent[name]
+        return name
+
+    def union(a, b):
+        parent[find(b)] = find(a)
+
+    for c in constraint_list or []:
+        for field in ("object", "second_object"):
+            if field in c: union(c[field], c["subject"])
+    first_instance = {}
+    for obj in objs:
+        union(first_instance.setdefault(obj.get("group", obj["name"]), obj["name"]), obj["name"])
+
+    clusters = {}
+    for obj in objs:
+        clusters.setdefault(find(obj["name"]), []).append(obj)
+    groups = list(clusters.values())
+
+    if embeddings_data:
+        vectors = {obj["guid"]: _embedding(embeddings_data, obj["guid"]) for obj in objs}
+        singles = [g for g in groups if len(g) == 1 and vectors[g[0]["guid"]] is not None]
+        for single in singles:
+            vec = vectors[single[0]["guid"]]
+            best, best_similarity = None, SIMILARITY_THRESHOLD
+            for group in groups:
+                if group is single or not group or len(group) >= max_group_size: continue
+                members = [vectors[o["guid"]] for o in group if vectors[o["guid"]] is not None]
+                if not members: continue
+                similarity = float(np.mean(members, axis=0) @ vec)
+                if similarity > best_similarity:
+                    best, best_similarity = group, similarity
+            if best is not None:
+                best.append(single.pop())
+        groups = [g for g in groups if g]
+
+    # Split large groups and restore the placement order inside every group
+    index = {obj["name"]: i for i, obj in enumerate(objs)}
+    result = []
+    for group in sorted(groups, key=lambda g: min(index[o["name"]] for o in g)):
+        group.sort(key=lambda o: index[o["name"]])
+        result += [group[i:i + max_group_size] for i in range(0, len(group), max_group_size)]
+    return result
+
+
+def group_bounds(placed_objects):
+    """
+    Center and size of the axis-aligned box around a list of placed objects.
+    """
+    mins = np.min([np.array(o["center"]) - np.array(o["size_after_rotation"]) / 2 for o in placed_objects], axis=0)
+    maxs = np.max([np.array(o["center"]) + np.array(o["size_after_rotation"]) / 2 for o in placed_objects], axis=0)
+    return (mins + maxs) / 2, maxs - mins
+
+
+def transform_group(placed_objects, local_center, center, yaw):
+    """
+    Move a group laid out in its local frame to its placement in the scene as a rigid unit.
+
+    Args:
+        placed_objects: Objects of the group in the local frame.
+        local_center: Center of the group's bounding box in the local frame.
+        center: Center of the group's bounding box in the scene.
+        yaw: Rotation of the group around the Y-axis in degrees.
+
+    Returns:
+        The objects of the group in the scene frame.
+    """
+    c, s = math.cos(math.radians(yaw)), math.sin(math.radians(yaw))
+    lift = center[1] - local_center[1]
+    placed = []
+    for obj in placed_objects:
+        x, z = obj["center"][0] - local_center[0], obj["center"][2] - local_center[2]
+        rotation = [obj["rotation"][0], obj["rotation"][1] + yaw, obj["rotation"][2]]
+        placed.append({**obj,
+                       "center": [round(float(center[0] + c * x + s * z), 3), round(float(obj["center"][1] + lift), 3), round(float(center[2] - s * x + c * z), 3)],
+                       "rotation": rotation,
+                       "size_after_rotation": get_rotated_bounding_box(obj["size"], rotation)})
+    return placed
+
+
+def place_hierarchical(scene_description, objs, constraint_list, layout_group, place_unit, embeddings_data=None, max_parallel=4):
+    """
+    Place a large scene group by group.
+
+    Every group is laid out in its own local frame around X = Z = 0, the groups are laid out
+    in parallel. Afterwards the groups are placed in the scene as rigid units.
+
+    Args:
+        scene_description: The scene description.
+        objs: Objects in placement order.
+        constraint_list: Structured constraints.
+        layout_group: Function (description, objs, constraints) returning the placed objects of a group.
+        place_unit: Function (description, name, size, placed_objects, constraints) placing a single unit.
+        embeddings_data: Optional dictionary of prefab embeddings used for grouping.
+        max_parallel: Maximum number of groups laid out concurrently.
+
+    Returns:
+        Tuple of the placed objects and a dictionary mapping each object name to its group name.
+    """
+    constraint_list = constraint_list or []
+    groups = group_objects(objs, constraint_list, embeddings_data)
+    group_names = [f"{group[0]['name']} group" for group in groups]
+    membership = {obj["name"]: group_name for group, group_name in zip(groups, group_names) for obj in group}
+    print(f"Placing {len(objs)} objects in {len(groups)} groups.")
+
+    def layout(group):
+        members = {obj["name"] for obj in group}
+        inner = [c for c in constraint_list if c["relation"] != "against_wall" and c["subject"] in members and all(c.get(f, c["subject"]) in members for f in ("object", "second_object"))]
+        description = (f"{scene_description}\nYou are only arranging a part of the scene, consisting of the objects {sorted(members)}. "
+                       "Arrange them as a compact group around X = Z = 0, the group will be moved to its place in the scene afterwards.")
+        return layout_group(description, group, describe_constraints(inner))
+
+    with ThreadPoolExecutor(max_workers=max_parallel) as executor:
+        local_layouts = list(executor.map(layout, groups))
+
+    # Constraints between groups, written in terms of the groups
+    outer = []
+    for c in constraint_list:
+        refs = [c[f] for f in ("object", "second_object") if f in c]
+        if c["relation"] == "against_wall" or any(membership[r] != membership[c["subject"]] for r in refs):
+            outer.append({**c, **{f: membership[c[f]] for f in ("object", "second_object") if f in c}, "subject": membership[c["subject"]]})
+    contents = {name: [o["name"] for o in group] for name, group in zip(group_names, groups)}
+
+    def unit_constraints(group_name):
+        # Only the constraints of this unit and the contents of the units they refer to
+        relevant = constraints_involving(outer, [group_name])
+        related = sorted({c[f] for c in relevant for f in ("subject", "object", "second_object") if f in c} | {group_name})
+        return "\n".join([describe_constraints(relevant)] + [f"The {name} contains: {contents[name]}." for name in related])
+
+    placed_units, placed_objects = [], []
+    for group_name, local in zip(group_names, local_layouts):
+        local_center, local_size = group_bounds(local)
+        size = [round(float(a), 3) for a in local_size]
+        unit = place_unit(scene_description, group_name, size, placed_units, unit_constraints(group_name))
+        placed_units.append(unit)
+        placed_objects += transform_group(local, local_center, unit["center"], unit["rotation"][1])
+    return placed_objects, membership
@@ -0,0 +1,141 @@
+import math
+from utils import get_rotated_bounding_box, boxes_intersect
+
+PATTERN_TYPES = ["row", "grid", "ring", "pairs"]
+
+
+def _right(yaw_degrees):
+    # Local +X axis after a rotation around Y (LHS, positive turns Z+ towards X+)
+    yaw = math.radians(yaw_degrees)
+    return math.cos(yaw), -math.sin(yaw)
+
+
+def _forward(yaw_degrees):
+    # Local +Z axis after a rotation around Y
+    yaw = math.radians(yaw_degrees)
+    return math.sin(yaw), math.cos(yaw)
+
+
+def footprint_extent(size, yaw_degrees, direction):
+    """
+    Length of an object's footprint projected onto a direction in the XZ plane.
+
+    Args:
+        size: Bounding box size (width, height, depth) of the object.
+        yaw_degrees: Rotation of the object around the Y-axis.
+        direction: Unit vector (x, z) in the XZ plane.
+
+    Returns:
+        The extent of the rotated footprint along the direction.
+    """
+    right, forward = _right(yaw_degrees), _forward(yaw_degrees)
+    return (size[0] * abs(direction[0] * right[0] + direction[1] * right[1])
+            + size[2] * abs(direction[0] * forward[0] + direction[1] * forward[1]))
+
+
+def _row_offsets(count, pitch):
+    return [(i - (count - 1) / 2) * pitch for i in range(count)]
+
+
+def _layout_row(n, size, params):
+    axis = _right(params["axis_rotation"])
+    yaw = params["rotation"]
+    pitch = footprint_extent(size, yaw, axis) + params["spacing"]
+    return [((axis[0] * o, axis[1] * o), yaw) for o in _row_offsets(n, pitch)]
+
+
+def _layout_grid(n, size, params):
+    axis, depth_axis = _right(params["axis_rotation"]), _forward(params["axis_rotation"])
+    yaw = params["rotation"]
+    columns = min(max(int(params["columns"]), 1), n)
+    rows = math.ceil(n / columns)
+    pitch = footprint_extent(size, yaw, axis) + params["spacing"]
+    depth_pitch = footprint_extent(size, yaw, depth_axis) + params["spacing"]
+    layout = []
+    for r, b in enumerate(_row_offsets(rows, depth_pitch)):
+        in_row = min(columns, n - r * columns)
+        for a in _row_offsets(in_row, pitch):
+            layout.append(((axis[0] * a + depth_axis[0] * b, axis[1] * a + depth_axis[1] * b), yaw))
+    return layout
+
+
+def _layout_ring(n, size, params):
+    # Instances face the center; the rotation parameter is an offset to that direction
+    radius = params["radius"]
+    if n > 1:
+        diameter = math.hypot(size[0], size[2]) + params["spacing"]
+        radius = max(radius, diameter / (2 * math.sin(math.pi / n)))
+    layout = []
+    for i in range(n):
+        angle = params["axis_rotation"] + 360 * i / n
+        direction = _forward(angle)
+        layout.append(((direction[0] * radius, direction[1] * radius), angle + 180 + params["rotation"]))
+    return layout
+
+
+def _layout_pairs(n, size, params):
+    # Two mirrored rows on both sides of the pattern axis, facing each other
+    axis, side_axis = _right(params["axis_rotation"]), _forward(params["axis_rotation"])
+    per_side = math.ceil(n / 2)
+    layout = []
+    for side in (1, -1):
+        yaw = params["axis_rotation"] + (180 if side == 1 else 0) + params["rotation"]
+        pitch = footprint_extent(size, yaw, axis) + params["spacing"]
+        radius = max(params["radius"], (footprint_extent(size, yaw, side_axis) + params["spacing"]) / 2)
+        for o in _row_offsets(per_side, pitch):
+            layout.append(((axis[0] * o + side * side_axis[0] * radius, axis[1] * o + side * side_axis[1] * radius), yaw))
+    # Alternate sides so an odd count stays balanced
+    return [layout[i // 2 + (per_side if i % 2 else 0)] for i in range(n)]
+
+
+LAYOUTS = {"row": _layout_row, "grid": _layout_grid, "ring": _layout_ring, "pairs": _layout_pairs}
+
+
+def _any_intersection(instances):
+    for i, a in enumerate(instances):
+        for b in instances[i + 1:]:
+            if boxes_intersect(a["center"], a["size_after_rotation"], b["center"], b["size_after_rotation"]):
+                return True
+    return False
+
+
+def generate_pattern(names, size, params, max_iterations=50):
+    """
+    Generate the transforms of all instances of a duplicated object from a layout primitive.
+
+    Args:
+        names: Names of the instances, one per generated transform.
+        size: Bounding box size of a single instance.
+        params: Pattern parameters as returned by the LLM (pattern, center, axis_rotation,
+                rotation, spacing, columns, radius).
+        max_iterations: Maximum number of spreading steps used to resolve overlaps.
+
+    Returns:
+        List of placed objects with name, center, rotation, size and size_after_rotation.
+        The instances are guaranteed not to intersect each other.
+    """
+    params = dict(params)
+    params["spacing"] = max(float(params.get("spacing", 0)), 0.0)
+    params.setdefault("columns", 1)
+    params.setdefault("radius", 0)
+    pattern = params["pattern"] if params.get("pattern") in LAYOUTS else "row"
+    layout = LAYOUTS[pattern](len(names), size, params)
+    center = params["center"]
+
+    spread = 1.0
+    for _ in range(max_iterations):
+        instances = []
+        for name, ((dx, dz), yaw) in zip(names, layout):
+            rotation = [0, round(yaw, 3), 0]
+            instances.append({
+                "center": [round(center[0] + dx * spread, 3), center[1], round(center[2] + dz * spread, 3)],
+                "rotation": rotation,
+                "name": name,
+                "size": size,
+                "size_after_rotation": get_rotated_bounding_box(size, rotation)
+            })
+        # Widen the pattern until no two instance boxes overlap
+        if not _any_intersection(instances):
+            break
+        spread *= 1.1
+    return instances
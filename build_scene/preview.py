@@ -0,0 +1,171 @@
+import argparse
+import colorsys
+import json
+import os
+import sys
+import time
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from config import PREVIEWS
+from rendering.placement_stream import follow, current_objects
+
+# Quick Blender-free previews of a layout: a top-down view of the rotated footprints and a front
+# elevation seen from the south. Objects whose boxes intersect are marked red where they overlap.
+IMAGE_SIZE = 512 # Size of the longer side of the images in pixels
+MARGIN = 0.1 # Space around the layout relative to its extent
+INTERSECTION_TOLERANCE = 0.1 # Same tolerance as utils.boxes_intersect
+BACKGROUND = (245, 245, 245)
+OVERLAP_COLOR = (220, 30, 30)
+FONT = ImageFont.load_default_imagefont() # Bitmap font, much faster to draw than the TrueType default
+
+
+def _colors(n):
+    # Evenly spread hues, so neighbouring objects are easy to tell apart
+    return np.array([colorsys.hsv_to_rgb((i * 0.618) % 1, 0.45, 0.9) for i in range(n)]) * 255
+
+
+def _intersections(centers, sizes):
+    # Pairwise box intersection like utils.boxes_intersect, shape (N, N)
+    mins, maxs = centers - sizes / 2, centers + sizes / 2
+    overlap = (maxs[:, None] >= mins[None] + INTERSECTION_TOLERANCE) & (maxs[None] >= mins[:, None] + INTERSECTION_TOLERANCE)
+    return np.all(overlap, axis=-1) & ~np.eye(len(centers), dtype=bool)
+
+
+def _grid(lo, hi):
+    # Pixel centers covering the rectangle lo..hi in world units, rows go from top to bottom
+    scale = IMAGE_SIZE / max(hi - lo)
+    width, height = np.maximum(np.ceil((hi - lo) * scale).astype(int), 1)
+    u = lo[0] + (np.arange(width) + 0.5) / scale
+    v = hi[1] - (np.arange(height) + 0.5) / scale
+    return u, v, scale
+
+
+def _window(u, v, lo, hi):
+    # Pixel rows and columns of the image that can lie inside the world rectangle lo..hi
+    cols = slice(np.searchsorted(u, lo[0]), np.searchsorted(u, hi[0], side="right"))
+    rows = slice(np.searchsorted(-v, -hi[1]), np.searchsorted(-v, -lo[1], side="right"))
+    return rows, cols
+
+
+def _rasterize(u, v, mask, boxes, colors, order, intersections):
+    """
+    Paint the objects and mark the overlaps of intersecting objects.
+
+    Args:
+        u, v: Pixel centers of the columns and rows.
+        mask: Function (i, u, v) returning the pixels of the window u x v covered by object i.
+        boxes: Array of shape (N, 2, 2) with the bounding rectangle of every object in the image plane.
+        colors, order: Color per object and drawing order.
+        intersections: Pairwise intersection matrix of the objects.
+    """
+    image = np.empty((len(v), len(u), 3))
+    image[:] = BACKGROUND
+    # Only the pixels in the bounding rectangle of an object are tested
+    for i in order:
+        rows, cols = _window(u, v, *boxes[i])
+        image[rows, cols][mask(i, u[cols], v[rows])] = colors[i]
+    for i, j in zip(*np.nonzero(np.triu(intersections))):
+        lo, hi = np.maximum(boxes[i, 0], boxes[j, 0]), np.minimum(boxes[i, 1], boxes[j, 1])
+        if np.any(lo > hi): continue
+        rows, cols = _window(u, v, lo, hi)
+        image[rows, cols][mask(i, u[cols], v[rows]) & mask(j, u[cols], v[rows])] = OVERLAP_COLOR
+    return Image.fromarray(image.astype(np.uint8))
+
+
+def _outline(draw, corners, color=(60, 60, 60)):
+    draw.polygon([tuple(p) for p in corners], outline=color)
+
+
+def render_previews(placed_objects, output_dir=PREVIEWS):
+    """
+    Rasterize a top-down view and a front elevation of the placed objects.
+
+    Args:
+        placed_objects: List of placed objects with name, center, rotation, size and size_after_rotation.
+        output_dir: Folder for top_view.png and front_view.png.
+
+    Returns:
+        Tuple of the paths of the top view and the front view.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    top_path, front_path = os.path.join(output_dir, "top_view.png"), os.path.join(output_dir, "front_view.png")
+    if not placed_objects:
+        for path in (top_path, front_path):
+            Image.new("RGB", (IMAGE_SIZE, IMAGE_SIZE), BACKGROUND).save(path)
+        return top_path, front_path
+
+    centers = np.array([obj["center"] for obj in placed_objects], dtype=float)
+    sizes = np.array([obj["size"] for obj in placed_objects], dtype=float)
+    rotated = np.array([obj["size_after_rotation"] for obj in placed_objects], dtype=float)
+    yaw = np.radians([obj["rotation"][1] for obj in placed_objects])
+    colors = _colors(len(placed_objects))
+    intersections = _intersections(centers, rotated)
+    mins, maxs = (centers - rotated / 2).min(axis=0), (centers + rotated / 2).max(axis=0)
+    margin = MARGIN * max(maxs - mins)
+
+    # Top view, X to the right and Z (north) up. A pixel lies in a footprint if its offset to the
+    # center, rotated back by the yaw, lies inside the unrotated size.
+    x, z, scale = _grid(mins[[0, 2]] - margin, maxs[[0, 2]] + margin)
+    c, s = np.cos(yaw), np.sin(yaw)
+
+    def footprint(i, u, v):
+        dx, dz = u[None, :] - centers[i, 0], v[:, None] - centers[i, 2]
+        return (np.abs(c[i] * dx - s[i] * dz) <= sizes[i, 0] / 2) & (np.abs(s[i] * dx + c[i] * dz) <= sizes[i, 2] / 2)
+
+    boxes = np.stack([centers[:, [0, 2]] - rotated[:, [0, 2]] / 2, centers[:, [0, 2]] + rotated[:, [0, 2]] / 2], axis=1)
+    # Higher objects are drawn on top of the objects they stand on
+    top = _rasterize(x, z, footprint, boxes, colors, np.argsort(centers[:, 1] + rotated[:, 1] / 2), intersections)
+    draw = ImageDraw.Draw(top)
+    to_pixel = lambda px, pz: ((px - x[0]) * scale, (z[0] - pz) * scale)
+    for i, obj in enumerate(placed_objects):
+        corners = np.array([[-1, -1], [1, -1], [1, 1], [-1, 1]]) * sizes[i, [0, 2]] / 2
+        # Inverse of the rotation used for the masks
+        world = corners @ np.array([[c[i], -s[i]], [s[i], c[i]]]) + centers[i, [0, 2]]
+        _outline(draw, [to_pixel(*p) for p in world])
+        # The facing direction, +Z turned towards +X by the yaw
+        front = centers[i, [0, 2]] + np.array([s[i], c[i]]) * sizes[i, 2] / 2
+        draw.line([to_pixel(*centers[i, [0, 2]]), to_pixel(*front)], fill=(60, 60, 60))
+        height = centers[i, 1] + rotated[i, 1] / 2
+        draw.text(to_pixel(*centers[i, [0, 2]]), f"{obj['name']}\nh={height:.2f}", fill=(0, 0, 0), font=FONT, anchor="mm", align="center")
+    top.save(top_path, compress_level=1)
+
+    # Front elevation seen from the south, X to the right and Y up. Objects further north are drawn first.
+    x, y, scale = _grid(mins[[0, 1]] - margin, maxs[[0, 1]] + margin)
+    boxes = np.stack([centers[:, [0, 1]] - rotated[:, [0, 1]] / 2, centers[:, [0, 1]] + rotated[:, [0, 1]] / 2], axis=1)
+    # The window of an object is its whole box
+    silhouette = lambda i, u, v: np.ones((len(v), len(u)), dtype=bool)
+    front = _rasterize(x, y, silhouette, boxes, colors, np.argsort(-centers[:, 2]), intersections)
+    draw = ImageDraw.Draw(front)
+    to_pixel = lambda px, py: ((px - x[0]) * scale, (y[0] - py) * scale)
+    draw.line([to_pixel(x[0], 0), to_pixel(x[-1], 0)], fill=(0, 0, 0))
+    for i, obj in enumerate(placed_objects):
+        lo, hi = centers[i] - rotated[i] / 2, centers[i] + rotated[i] / 2
+        _outline(draw, [to_pixel(lo[0], lo[1]), to_pixel(hi[0], lo[1]), to_pixel(hi[0], hi[1]), to_pixel(lo[0], hi[1])])
+        draw.text(to_pixel(centers[i, 0], hi[1]), f"{obj['name']} {hi[1]:.2f}", fill=(0, 0, 0), font=FONT, anchor="md")
+    front.save(front_path, compress_level=1)
+    return top_path, front_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Render top-down and front previews of a layout without Blender.")
+    parser.add_argument("--placed", help="The placed objects.", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "placed_objects.json"))
+    parser.add_argument("--output", help="The output folder.", default=PREVIEWS)
+    parser.add_argument("--stream", help="Redraw the previews for every event of this placement stream until the placement is done.", default=None)
+    args = parser.parse_args()
+    if args.stream:
+        events = []
+        for event in follow(args.stream):
+            events.append(event)
+            if event["type"] == "done": break
+            render_previews(current_objects(events), args.output)
+            print(f"{event['time']:.2f}s: {event['type']} {event['name']}")
+        return
+    with open(args.placed, 'r') as file:
+        placed_objects = json.load(file)
+    start = time.perf_counter()
+    paths = render_previews(placed_objects, args.output)
+    print(f"Previews saved to {', '.join(paths)} in {(time.perf_counter() - start) * 1000:.0f}ms.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,207 @@
+import argparse
+import hashlib
+import json
+import os
+import re
+import shutil
+import sqlite3
+import sys
+import threading
+import time
+import numpy as np
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from config import SCENE_CACHE, SCENE_CACHE_MAX_MB, SCENE_CACHE_SIMILARITY, EMBEDDINGS, DESCRIPTIONS, OBJ_DATA, ROTATION_DATA, ASSET_LIBRARY_INDEX
+from llm_client import embed
+
+# Cache of whole scenes: the placement, the converted layout, the previews and the renders of a
+# scene, keyed by the normalized prompt, the settings that change the result and a fingerprint of
+# the asset library. A repeated prompt is answered from the cache without LLM calls or rendering.
+# In semantic mode, a new prompt close to a cached one reuses the constraints and the placement
+# order of the cached scene, if the retrieval picks the same objects.
+# Modes: off, exact, semantic.
+CACHE_MODES = ["off", "exact", "semantic"]
+SETTINGS = ["model", "num_objects", "no_refinement", "pattern_placement", "structured_constraints", "hierarchical", "candidates", "candidate_mode"]
+EMBEDDING_MODEL = "text-embedding-004"
+LIBRARY_FILES = [EMBEDDINGS, DESCRIPTIONS, OBJ_DATA, ROTATION_DATA, ASSET_LIBRARY_INDEX]
+
+_lock = threading.Lock()
+
+
+def normalize_prompt(prompt):
+    return re.sub(r"\s+", " ", prompt.strip().lower()).rstrip(".!")
+
+
+def library_fingerprint():
+    """
+    Changes whenever an asset is added or its metadata, rotation or library entry changes.
+    """
+    digest = hashlib.sha256()
+    for path in LIBRARY_FILES:
+        if os.path.isfile(path):
+            stat = os.stat(path)
+            digest.update(f"{path}:{stat.st_size}:{stat.st_mtime_ns}".encode())
+    return digest.hexdigest()[:16]
+
+
+def settings_key(args):
+    # Everything except the prompt that determines the scene
+    settings = {name: getattr(args, name, None) for name in SETTINGS}
+    settings["num_objects"] = str(settings["num_objects"])
+    settings["library"] = library_fingerprint()
+    return hashlib.sha256(json.dumps(settings, sort_keys=True).encode()).hexdigest()
+
+
+def scene_key(args):
+    return hashlib.sha256(f"{settings_key(args)}:{normalize_prompt(args.prompt)}".encode()).hexdigest()
+
+
+def _connect():
+    os.makedirs(SCENE_CACHE, exist_ok=True)
+    connection = sqlite3.connect(os.path.join(SCENE_CACHE, "index.sqlite"), timeout=30)
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("CREATE TABLE IF NOT EXISTS scenes (key TEXT PRIMARY KEY, settings TEXT, prompt TEXT, embedding TEXT, "
+                       "created REAL, last_used REAL, size INTEGER)")
+    return connection
+
+
+def _dir(key):
+    return os.path.join(SCENE_CACHE, key[:2], key)
+
+
+def lookup(args):
+    """
+    Returns:
+        The folder of the cached scene, or None.
+    """
+    key = scene_key(args)
+    with _connect() as connection:
+        row = connection.execute("SELECT key FROM scenes WHERE key = ?", (key,)).fetchone()
+        if row is not None:
+            connection.execute("UPDATE scenes SET last_used = ? WHERE key = ?", (time.time(), key))
+    connection.close()
+    if row is None or not os.path.isdir(_dir(key)):
+        return None
+    return _dir(key)
+
+
+def _prompt_embedding(prompt):
+    vector = np.array(embed(EMBEDDING_MODEL, normalize_prompt(prompt)), dtype=np.float32)
+    return vector / (np.linalg.norm(vector) or 1)
+
+
+def near_hit(args, threshold=SCENE_CACHE_SIMILARITY):
+    """
+    The constraints and placement order of the cached scene with the most similar prompt and the
+    same settings, if its similarity is at least threshold.
+
+    Returns:
+        The plan with names, constraints and order, or None.
+    """
+    with _connect() as connection:
+        rows = connection.execute("SELECT key, prompt, embedding FROM scenes WHERE settings = ? AND embedding IS NOT NULL", (settings_key(args),)).fetchall()
+    connection.close()
+    if not rows:
+        return None
+    query = _prompt_embedding(args.prompt)
+    similarities = np.array([json.loads(row[2]) for row in rows], dtype=np.float32) @ query
+    best = int(np.argmax(similarities))
+    plan_path = os.path.join(_dir(rows[best][0]), "placement_plan.json")
+    if similarities[best] < threshold or not os.path.isfile(plan_path):
+        return None
+    print(f"Similar cached scene ({similarities[best]:.3f}): {rows[best][1]}")
+    with open(plan_path, 'r') as file:
+        return json.load(file)
+
+
+def store(args, files):
+    """
+    Copy the files of a finished scene to the cache.
+
+    Args:
+        args: The arguments the scene was built with.
+        files: Files to cache, by the name they are restored as. Folders are copied as a whole.
+    """
+    key = scene_key(args)
+    target = _dir(key)
+    tmp = f"{target}.{os.getpid()}.{threading.get_ident()}.tmp"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    for name, path in files.items():
+        if os.path.isdir(path):
+            shutil.copytree(path, os.path.join(tmp, name))
+        elif os.path.isfile(path):
+            shutil.copy2(path, os.path.join(tmp, name))
+    size = sum(os.path.getsize(os.path.join(root, f)) for root, _, names in os.walk(tmp) for f in names)
+    with _lock:
+        shutil.rmtree(target, ignore_errors=True)
+        os.replace(tmp, target)
+    now = time.time()
+    # The prompt embedding is only needed for near hits, exact mode works without network access
+    embedding = json.dumps(_prompt_embedding(args.prompt).tolist()) if getattr(args, "scene_cache", None) == "semantic" else None
+    with _connect() as connection:
+        connection.execute("INSERT OR REPLACE INTO scenes VALUES (?, ?, ?, ?, ?, ?, ?)",
+                           (key, settings_key(args), args.prompt, embedding, now, now, size))
+    connection.close()
+    evict()
+    return target
+
+
+def restore(cached_dir, files):
+    """
+    Copy the cached files to the paths of files (name -> path) they were stored from.
+
+    Returns:
+        The names of the restored files.
+    """
+    restored = []
+    for name, path in files.items():
+        source = os.path.join(cached_dir, name)
+        if not os.path.exists(source): continue
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        if os.path.isdir(source):
+            shutil.copytree(source, path, dirs_exist_ok=True)
+        else:
+            shutil.copy2(source, path)
+        restored.append(name)
+    return restored
+
+
+def evict(max_mb=SCENE_CACHE_MAX_MB):
+    """
+    Remove the least recently used scenes until the cache holds at most max_mb.
+
+    Returns:
+        Number of removed scenes.
+    """
+    with _connect() as connection:
+        total = connection.execute("SELECT COALESCE(SUM(size), 0) FROM scenes").fetchone()[0]
+        excess = total - max_mb * 1024 * 1024
+        keys, freed = [], 0
+        if excess > 0:
+            for key, size in connection.execute("SELECT key, size FROM scenes ORDER BY last_used"):
+                if freed >= excess: break
+                keys.append(key)
+                freed += size
+            connection.executemany("DELETE FROM scenes WHERE key = ?", [(key,) for key in keys])
+    connection.close()
+    for key in keys:
+        shutil.rmtree(_dir(key), ignore_errors=True)
+    return len(keys)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect and maintain the scene cache.")
+    parser.add_argument("--evict", help="Shrink the cache to its maximum size.", action="store_true")
+    parser.add_argument("--clear", help="Remove all cached scenes.", action="store_true")
+    args = parser.parse_args()
+    if args.clear:
+        print(f"Removed {evict(max_mb=0)} scenes.")
+    elif args.evict:
+        print(f"Removed {evict()} scenes.")
+    with _connect() as connection:
+        count, size = connection.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM scenes").fetchone()
+    connection.close()
+    print(f"{count} cached scenes, {size / 1024 / 1024:.2f} MB in {SCENE_CACHE}")
+
+if __name__ == "__main__":
+    main()
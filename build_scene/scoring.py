@@ -0,0 +1,184 @@
+import numpy as np
+from constraints import WALLS
+
+# Weights of the single measures in the total score (lower is better)
+WEIGHTS = {
+    "overlap": 10.0,
+    "floating": 1.0,
+    "below_floor": 5.0,
+    "out_of_bounds": 1.0,
+    "violations": 0.5,
+}
+SUPPORT_TOLERANCE = 0.05 # How far an object may sink into its support
+NEXT_TO_DISTANCE = 0.5 # Maximum gap between objects that are next to each other
+WALL_DISTANCE = 0.3 # Maximum gap between an object and the wall it stands against
+FACING_ANGLE = 45 # Maximum angle in degrees between the facing direction and the target
+
+
+def layout_arrays(placed_objects):
+    """
+    Convert a list of placed objects into the arrays used by score_layouts.
+
+    Returns:
+        Tuple of centers, sizes (size_after_rotation) and rotations, each of shape (N, 3).
+    """
+    centers = np.array([obj["center"] for obj in placed_objects], dtype=float).reshape(-1, 3)
+    sizes = np.array([obj["size_after_rotation"] for obj in placed_objects], dtype=float).reshape(-1, 3)
+    rotations = np.array([obj["rotation"] for obj in placed_objects], dtype=float).reshape(-1, 3)
+    return centers, sizes, rotations
+
+
+def encode_constraints(constraints, names):
+    """
+    Convert structured constraints into index arrays per relation.
+
+    Args:
+        constraints: Validated structured constraints.
+        names: Names of the objects in the order of the layout arrays.
+
+    Returns:
+        Dictionary mapping each relation to an integer array with one row per constraint
+        (subject, object, second_object) or (subject, wall axis, wall side) for against_wall.
+    """
+    index = {name: i for i, name in enumerate(names)}
+    rows = {"on_top_of": [], "against_wall": [], "next_to": [], "facing": [], "between": []}
+    for c in constraints:
+        if c["subject"] not in index: continue
+        if c["relation"] == "against_wall":
+            if "wall" in c: rows["against_wall"].append([index[c["subject"]], *WALLS[c["wall"]]])
+        elif all(c.get(f, c["subject"]) in index for f in ("object", "second_object")):
+            rows[c["relation"]].append([index[c["subject"]], index[c["object"]], index[c.get("second_object", c["object"])]])
+    return {k: np.array(v, dtype=int).reshape(-1, 3) for k, v in rows.items()}
+
+
+def _constraint_violations(centers, mins, maxs, rotations, relations, bounds_min, bounds_max):
+    violations = np.zeros(centers.shape[0])
+
+    s, o = relations["on_top_of"][:, 0], relations["on_top_of"][:, 1]
+    if len(s):
+        resting = np.abs(mins[:, s, 1] - maxs[:, o, 1]) <= SUPPORT_TOLERANCE * 2
+        above = np.all((mins[:, s][..., [0, 2]] < maxs[:, o][..., [0, 2]]) & (maxs[:, s][..., [0, 2]] > mins[:, o][..., [0, 2]]), axis=-1)
+        violations += np.sum(~(resting & above), axis=1)
+
+    s, o = relations["next_to"][:, 0], relations["next_to"][:, 1]
+    if len(s):
+        gap = np.maximum(mins[:, o] - maxs[:, s], mins[:, s] - maxs[:, o])[..., [0, 2]].max(axis=-1)
+        violations += np.sum(gap > NEXT_TO_DISTANCE, axis=1)
+
+    s, axis, side = relations["against_wall"].T
+    if len(s):
+        distance = np.where(side > 0, bounds_max[:, axis] - maxs[:, s, axis], mins[:, s, axis] - bounds_min[:, axis])
+        violations += np.sum(distance > WALL_DISTANCE, axis=1)
+
+    s, o = relations["facing"][:, 0], relations["facing"][:, 1]
+    if len(s) and rotations is not None:
+        yaw = np.radians(rotations[:, s, 1])
+        direction = centers[:, o][..., [0, 2]] - centers[:, s][..., [0, 2]]
+        distance = np.linalg.norm(direction, axis=-1)
+        cos = (np.sin(yaw) * direction[..., 0] + np.cos(yaw) * direction[..., 1]) / np.maximum(distance, 1e-9)
+        violations += np.sum(cos < np.cos(np.radians(FACING_ANGLE)), axis=1)
+
+    s, o, o2 = relations["between"].T
+    if len(s):
+        a, b, p = centers[:, o][..., [0, 2]], centers[:, o2][..., [0, 2]], centers[:, s][..., [0, 2]]
+        ab = b - a
+        t = np.sum((p - a) * ab, axis=-1) / np.maximum(np.sum(ab * ab, axis=-1), 1e-9)
+        distance = np.linalg.norm(p - (a + t[..., None] * ab), axis=-1)
+        tolerance = np.linalg.norm((maxs - mins)[:, s][..., [0, 2]], axis=-1) / 2 + NEXT_TO_DISTANCE
+        violations += np.sum((t < 0) | (t > 1) | (distance > tolerance), axis=1)
+
+    return violations
+
+
+def score_layouts(centers, sizes, rotations=None, relations=None, bounds=None):
+    """
+    Score a batch of layouts in a single vectorized pass.
+
+    Args:
+        centers: Array of shape (L, N, 3) with the centers of the N objects in each of the L layouts.
+        sizes: Array of shape (L, N, 3) or (N, 3) with the rotated bounding box sizes.
+        rotations: Optional array of shape (L, N, 3) with the rotations in degrees, only needed for facing constraints.
+        relations: Optional encoded constraints from encode_constraints.
+        bounds: Optional pair (min, max) of 3d vectors of the room. Without bounds, walls are
+                taken from the extent of each layout and out_of_bounds is zero.
+
+    Returns:
+        Dictionary of arrays of shape (L,): overlap (total overlap volume), floating (total gap
+        to the nearest support below), below_floor (total penetration of the floor), out_of_bounds
+        (total extent outside the room), violations (number of violated constraints) and score.
+    """
+    centers = np.asarray(centers, dtype=float)
+    sizes = np.broadcast_to(np.asarray(sizes, dtype=float), centers.shape)
+    mins, maxs = centers - sizes / 2, centers + sizes / 2
+    n = centers.shape[1]
+    not_self = ~np.eye(n, dtype=bool)
+
+    # Pairwise intersection extents, shape (L, N, N, 3)
+    extent = np.minimum(maxs[:, :, None], maxs[:, None]) - np.maximum(mins[:, :, None], mins[:, None])
+    extent = np.clip(extent, 0, None)
+    overlap = np.sum(np.prod(extent, axis=-1) * not_self, axis=(1, 2)) / 2
+
+    # The support of an object is the highest top below its bottom among the objects sharing its footprint
+    bottoms, tops = mins[..., 1], maxs[..., 1]
+    shares_footprint = (extent[..., 0] > 0) & (extent[..., 2] > 0) & not_self
+    below = shares_footprint & (tops[:, None, :] <= bottoms[:, :, None] + SUPPORT_TOLERANCE)
+    support = np.max(np.where(below, tops[:, None, :], 0.0), axis=2, initial=0.0)
+    floating = np.sum(np.clip(bottoms - support, 0, None), axis=1)
+
+    below_floor = np.sum(np.clip(-bottoms, 0, None), axis=1)
+
+    if bounds is not None:
+        bounds_min = np.broadcast_to(np.asarray(bounds[0], dtype=float), (centers.shape[0], 3))
+        bounds_max = np.broadcast_to(np.asarray(bounds[1], dtype=float), (centers.shape[0], 3))
+        out_of_bounds = np.sum(np.clip(bounds_min[:, None] - mins, 0, None) + np.clip(maxs - bounds_max[:, None], 0, None), axis=(1, 2))
+    else:
+        bounds_min, bounds_max = mins.min(axis=1), maxs.max(axis=1)
+        out_of_bounds = np.zeros(centers.shape[0])
+
+    if relations is not None:
+        violations = _constraint_violations(centers, mins, maxs, rotations, relations, bounds_min, bounds_max)
+    else:
+        violations = np.zeros(centers.shape[0])
+
+    result = {"overlap": overlap, "floating": floating, "below_floor": below_floor,
+              "out_of_bounds": out_of_bounds, "violations": violations}
+    result["score"] = sum(WEIGHTS[k] * v for k, v in result.items())
+    return result
+
+
+def score_layout(placed_objects, constraints=None, bounds=None):
+    """
+    Score a single layout of placed objects.
+
+    Args:
+        placed_objects: List of placed objects with name, center, rotation and size_after_rotation.
+        constraints: Optional structured constraints.
+        bounds: Optional pair (min, max) of 3d vectors of the room.
+
+    Returns:
+        Dictionary with the measures of score_layouts as floats.
+    """
+    centers, sizes, rotations = layout_arrays(placed_objects)
+    relations = encode_constraints(constraints, [obj["name"] for obj in placed_objects]) if constraints else None
+    result = score_layouts(centers[None], sizes[None], rotations[None], relations, bounds)
+    return {k: float(v[0]) for k, v in result.items()}
+
+
+def best_candidate(candidates, placed_objects, constraints=None):
+    """
+    Pick the candidate placement of a new object that fits best into the already placed objects.
+
+    Args:
+        candidates: Candidate placements of the same object with name, center, rotation and size_after_rotation.
+        placed_objects: The already placed objects.
+        constraints: Optional structured constraints.
+
+    Returns:
+        Tuple of the index of the best candidate and the scores of all candidates.
+    """
+    layouts = [layout_arrays(placed_objects + [candidate]) for candidate in candidates]
+    centers, sizes, rotations = (np.stack(a) for a in zip(*layouts))
+    names = [obj["name"] for obj in placed_objects] + [candidates[0]["name"]]
+    relations = encode_constraints(constraints, names) if constraints else None
+    scores = score_layouts(centers, sizes, rotations, relations)["score"]
+    return int(np.argmin(scores)), scores.tolist()
@@ -0,0 +1,301 @@
+import argparse
+import json
+import os
+import queue
+import re
+import signal
+import subprocess
+import sys
+import threading
+import time
+import traceback
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+import PlaceObjects
+import scene_cache
+from batch import ITEM_OPTIONS
+from Object_retriever import EmbeddingIndex, find_assets_for_scene
+from utils import Attributes, get_attr_from_guid, load_json
+from rendering.render_queue import submit_job, wait_for_job
+from config import EMBEDDINGS, DESCRIPTIONS, OBJ_DATA, ROTATION_DATA, RESULTS
+from llm_client import get_client, set_cache_mode, set_backend, CACHE_MODES
+from tracing import span, flush
+
+# Local scene generation service, which keeps the embeddings, the asset metadata and the LLM
+# client loaded between requests:
+#   python build_scene/service.py --port 8765
+# Jobs are submitted with POST /retrieve, /place or /render and a JSON body, which returns the
+# job id (202), 400 with the error for invalid options, or 503 with a Retry-After header while
+# the queue is full. GET /jobs/<id> returns the status and the result of a job, GET /health the
+# state of the service. POST /shutdown, Ctrl+C or SIGTERM stop accepting jobs, finish the queued
+# ones and exit.
+JOB_KINDS = ["retrieve", "place", "render"]
+RENDER_OPTIONS = ["job", "layout", "tiers"]
+DEFAULT_PORT = 8765
+QUEUE_SIZE = 16 # Jobs waiting at most, further requests are rejected until the queue drains
+MAX_FINISHED_JOBS = 1000 # Finished jobs kept for status polling
+
+
+class SceneService:
+    def __init__(self, workers=2, queue_size=QUEUE_SIZE, output_dir=os.path.join(RESULTS, "service"), render_worker=False, scene_cache_mode="off"):
+        self.output_dir = output_dir
+        self.render_worker = render_worker
+        self.jobs = {}
+        self.accepting = True
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._lock = threading.Lock()
+        with span("service.warm_up"):
+            # Everything a request needs is loaded once
+            with open(EMBEDDINGS, 'r') as file:
+                self.embeddings_data = json.load(file)
+            self.embedding_index = EmbeddingIndex(self.embeddings_data)
+            for path in [DESCRIPTIONS, OBJ_DATA, ROTATION_DATA]:
+                load_json(path)
+            get_client()
+        self.defaults = PlaceObjects.get_parser().parse_args(["--prompt", "", "--scene-cache", scene_cache_mode])
+        self._parser = PlaceObjects.get_parser()
+        self._parser.error = _reject # Invalid options are reported to the client instead of exiting
+        self._workers = [threading.Thread(target=self._work, daemon=True) for _ in range(workers)]
+        for worker in self._workers:
+            worker.start()
+
+    def submit(self, kind, request):
+        """
+        Validate and queue a job.
+
+        Returns:
+            The job, or None if the queue is full or the service is shutting down.
+
+        Raises:
+            ValueError: If the request is invalid.
+        """
+        if kind not in JOB_KINDS:
+            raise ValueError(f"Unknown job kind {kind}, expected one of {JOB_KINDS}.")
+        args = self._render_request(request) if kind == "render" else self._args(request)
+        job = {"id": uuid.uuid4().hex[:12], "kind": kind, "status": "queued", "request": request, "args": args, "submitted": time.time()}
+        with self._lock:
+            if not self.accepting:
+                return None
+            try:
+                self._queue.put_nowait(job)
+            except queue.Full:
+                return None
+            self.jobs[job["id"]] = job
+        return job
+
+    def status(self, job_id):
+        with self._lock:
+            job = self.jobs.get(job_id)
+            return None if job is None else {k: v for k, v in job.items() if k not in ("request", "args")}
+
+    def health(self):
+        with self._lock:
+            counts = {}
+            for job in self.jobs.values():
+                counts[job["status"]] = counts.get(job["status"], 0) + 1
+        return {"accepting": self.accepting, "queued": self._queue.qsize(), "capacity": self._queue.maxsize, "jobs": counts}
+
+    def _work(self):
+        while True:
+            job = self._queue.get()
+            if job is None:
+                self._queue.task_done()
+                return
+            self._update(job, status="running", started=time.time())
+            try:
+                with span(f"service.{job['kind']}"):
+                    result = getattr(self, job["kind"])(job)
+                self._update(job, status="done", result=result, finished=time.time())
+            except Exception as e:
+                traceback.print_exc()
+                self._update(job, status="failed", error=f"{e.__class__.__name__}: {e}", finished=time.time())
+            print(f"{job['kind']} job {job['id']}: {job['status']} in {job['finished'] - job['started']:.1f}s")
+            # The spans of the job are written if tracing is on, and dropped from memory
+            flush(clear=True)
+            self._forget_old_jobs()
+            self._queue.task_done()
+
+    def _update(self, job, **values):
+        # Under the lock, so status requests never see a job while it changes
+        with self._lock:
+            job.update(values)
+
+    def _forget_old_jobs(self):
+        with self._lock:
+            finished = [job for job in self.jobs.values() if "finished" in job]
+            for job in sorted(finished, key=lambda j: j["finished"])[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+                del self.jobs[job["id"]]
+
+    def _args(self, request):
+        # Parsed like the command line of PlaceObjects.py, so options get the same checks and types
+        if not isinstance(request, dict):
+            raise ValueError("The request must be a JSON object.")
+        unknown = set(request) - set(ITEM_OPTIONS)
+        if unknown:
+            raise ValueError(f"Unknown options {sorted(unknown)}, expected {ITEM_OPTIONS}.")
+        if not request.get("prompt"):
+            raise ValueError("The request needs a prompt.")
+        argv = []
+        for key, value in request.items():
+            flag = "--" + key.replace("_", "-")
+            if value is True:
+                argv.append(flag)
+            elif value is not False:
+                argv += [flag, str(value)]
+        return self._parser.parse_args(argv, argparse.Namespace(**vars(self.defaults)))
+
+    def _render_request(self, request):
+        if not isinstance(request, dict):
+            raise ValueError("The request must be a JSON object.")
+        unknown = set(request) - set(RENDER_OPTIONS)
+        if unknown:
+            raise ValueError(f"Unknown options {sorted(unknown)}, expected {RENDER_OPTIONS}.")
+        if "job" in request:
+            source = self.status(request["job"])
+            if source is None or source["kind"] != "place":
+                raise ValueError(f"Job {request['job']} is not a place job.")
+        elif not isinstance(request.get("layout"), list):
+            raise ValueError("The request needs a job or a layout.")
+        return None
+
+    def retrieve(self, job):
+        args = job["args"]
+        objects = find_assets_for_scene(args.prompt, self.embeddings_data, args.num_objects, self.embedding_index)
+        return get_attr_from_guid(Attributes.NAME, objects, [])
+
+    def place(self, job):
+        job_dir = os.path.join(self.output_dir, job["id"])
+        layout_path = PlaceObjects.build_scene(job["args"], self.embeddings_data, job_dir, self.embedding_index, render=False)
+        with open(os.path.join(job_dir, "placed_objects.json"), 'r') as file:
+            placed_objects = json.load(file)
+        return {"layout": layout_path, "placed_objects": placed_objects, "previews": os.path.join(job_dir, "previews")}
+
+    def render(self, job):
+        # Renders the layout of a finished place job, or a layout given in the request
+        request = job["request"]
+        if "job" in request:
+            source = self.status(request["job"])
+            if source is None or source["kind"] != "place" or source["status"] != "done":
+                raise ValueError(f"Job {request['job']} is not a finished place job.")
+            with open(source["result"]["layout"], 'r') as file:
+                layout = json.load(file)
+        else:
+            layout = request["layout"]
+        tiers = request.get("tiers", "final")
+        job_dir = os.path.join(self.output_dir, job["id"])
+        os.makedirs(job_dir, exist_ok=True)
+        output = os.path.join(job_dir, "final_render.png")
+        if self.render_worker:
+            result = wait_for_job(submit_job(layout, output, tiers=tiers.split(",")))
+            return {"output": output, "seconds": result["result"]["seconds"]}
+        layout_path = os.path.join(job_dir, "raw_blender.json")
+        with open(layout_path, 'w') as file:
+            json.dump(layout, file, indent=4)
+        script_path = os.path.abspath(os.path.join(os.path.dirname(__file__), "../rendering/render_layout.py"))
+        start = time.time()
+        subprocess.run(["blender", "--background", "--python", script_path, "--", "--tiers", tiers, "--layout", layout_path, "--output", output],
+                       check=True, stdout=subprocess.DEVNULL, cwd=os.path.dirname(os.path.dirname(script_path)))
+        return {"output": output, "seconds": round(time.time() - start, 3)}
+
+    def shutdown(self):
+        """
+        Stop accepting jobs and wait until the queued jobs are finished.
+        """
+        with self._lock:
+            self.accepting = False
+        for _ in self._workers:
+            self._queue.put(None)
+        for worker in self._workers:
+            worker.join()
+
+
+def _reject(message):
+    raise ValueError(message)
+
+
+class Handler(BaseHTTPRequestHandler):
+    service = None
+    server_version = "Reason3D"
+
+    def _reply(self, code, data, headers=None):
+        body = json.dumps(data).encode()
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        match = re.fullmatch(r"/jobs/(\w+)", self.path)
+        if self.path == "/health":
+            self._reply(200, self.service.health())
+        elif match and self.service.status(match.group(1)) is not None:
+            self._reply(200, self.service.status(match.group(1)))
+        else:
+            self._reply(404, {"error": f"Not found: {self.path}"})
+
+    def do_POST(self):
+        kind = self.path.strip("/")
+        if kind == "shutdown":
+            self._reply(202, {"status": "shutting down"})
+            threading.Thread(target=stop, args=(self.server,), daemon=True).start()
+            return
+        if kind not in JOB_KINDS:
+            self._reply(404, {"error": f"Not found: {self.path}"})
+            return
+        try:
+            request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        except json.JSONDecodeError as e:
+            self._reply(400, {"error": f"Invalid JSON: {e}"})
+            return
+        try:
+            job = self.service.submit(kind, request)
+        except ValueError as e:
+            self._reply(400, {"error": str(e)})
+            return
+        if job is None:
+            self._reply(503, {"error": "The queue is full or the service is shutting down."}, {"Retry-After": "5"})
+        else:
+            self._reply(202, {"id": job["id"], "status": job["status"]}, {"Location": f"/jobs/{job['id']}"})
+
+    def log_message(self, format, *args):
+        pass # Jobs are logged by the service
+
+
+def stop(server):
+    # Finish the queued jobs while status requests are still answered, then stop the server
+    print("Shutting down after the queued jobs...")
+    Handler.service.shutdown()
+    server.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the scene generation service.")
+    parser.add_argument("--host", help="The address to listen on.", default="127.0.0.1")
+    parser.add_argument("--port", help="The port to listen on.", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--workers", help="Number of jobs processed at the same time.", type=int, default=2)
+    parser.add_argument("--queue-size", help="Maximum number of waiting jobs.", type=int, default=QUEUE_SIZE)
+    parser.add_argument("--render-worker", help="Render with the running render worker instead of a new Blender process per job.", action="store_true")
+    parser.add_argument("--scene-cache", help="Reuse cached scenes (exact), also reuse the constraints and order of similar prompts (semantic), or don't cache (off).", choices=scene_cache.CACHE_MODES, default="off")
+    parser.add_argument("--llm-cache", help="Use and store cached LLM responses (readwrite), only use them (replay) or don't cache (off).", choices=CACHE_MODES, default=None)
+    parser.add_argument("--fake-llm", help="Use the offline fake LLM backend instead of the Gemini API.", action="store_true")
+    args = parser.parse_args()
+    if args.llm_cache:
+        set_cache_mode(args.llm_cache)
+    if args.fake_llm:
+        set_backend("fake")
+
+    Handler.service = SceneService(args.workers, args.queue_size, render_worker=args.render_worker, scene_cache_mode=args.scene_cache)
+    server = ThreadingHTTPServer((args.host, args.port), Handler)
+    for signum in [signal.SIGINT, signal.SIGTERM]:
+        signal.signal(signum, lambda *_: threading.Thread(target=stop, args=(server,), daemon=True).start())
+    print(f"Serving on http://{args.host}:{args.port}")
+    server.serve_forever()
+    server.server_close()
+    print("Service stopped.")
+
+if __name__ == "__main__":
+    main()
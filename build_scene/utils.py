@@ -1,8 +1,12 @@
 from enum import Enum
 import json
 import math
+import os
+import threading
 import numpy as np
 from config import DESCRIPTIONS, OBJ_DATA
+_json_cache = {}
+_json_lock = threading.Lock()
 class Attributes(Enum):
     FULL_DESCRIPTION = "Full description"
     PHYSICAL_PROPERTIES = "physical_properties"
@@ -11,13 +15,25 @@ class Attributes(Enum):
     CENTER = "boundsCenter"
     SIZE = "boundsSize"
     NAME = "name"
+def load_json(path):
+    """
+    Load a JSON file once and return the same data until the file changes.
+    The data is shared, so callers must not modify it.
+    """
+    mtime = os.path.getmtime(path)
+    with _json_lock:
+        cached = _json_cache.get(path)
+        if cached is None or cached[0] != mtime:
+            with open(path, 'r') as file:
+                cached = _json_cache[path] = (mtime, json.load(file))
+        return cached[1]
+
 def get_attr_from_guid(attr, objs, rm_keys):
 
     # Load correct data
     if attr in [Attributes.CENTER, Attributes.SIZE]:
         attr = attr.value
-        with open(OBJ_DATA, 'r') as file:
-            bounds_data = json.load(file)["prefabs"]
+        bounds_data = load_json(OBJ_DATA)["prefabs"]
 
         for obj in objs:
             for data in bounds_data:
@@ -26,8 +42,7 @@ def get_attr_from_guid(attr, objs, rm_keys):
                 del obj[key]
 
     else:
-        with open(DESCRIPTIONS, 'r') as file:
-            descriptions_data = json.load(file)
+        descriptions_data = load_json(DESCRIPTIONS)
         attr = attr.value
         for obj in objs:
             for k, data in descriptions_data.items():
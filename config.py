@@ -5,6 +5,7 @@ API_KEY = ""
 # Paths
 git_root = os.path.dirname(os.path.abspath(__file__))
 ASSETS = os.path.expanduser("~/reason_assets/") # PATH to your folder with 3d objects (.fbx, .obj, .glb, .blend)
+LODS = os.path.join(ASSETS, "lod") # Decimated asset proxies for previews
 IMAGES = os.path.expanduser("~/reason_images/") # PATH where to save all images from the preprocessing
 DESCRIPTIONS = os.path.join(git_root, "data/descriptions.json") # PATH to object descriptions
 EMBEDDINGS = os.path.join(git_root, "data/embeddings.json") # PATH to description embeddings
@@ -14,3 +15,24 @@ RESULTS = os.path.join(git_root, "results") # PATH to the results folder
 OUTPUT = os.path.join(RESULTS, "raw_outputs") # Raw pipeline output
 BLENDER_FILE = os.path.join(RESULTS, "raw_blender.json") # Converted for blender
 RENDERS = os.path.join(RESULTS, "final_renders") # Final renders
+PREVIEWS = os.path.join(RESULTS, "previews") # Blender-free layout previews
+LLM_CACHE = os.path.join(RESULTS, "llm_cache.sqlite") # Cached LLM responses
+TRACES = os.path.join(RESULTS, "traces") # Traces of runs with --trace
+LLM_CACHE_MAX_AGE_DAYS = 30 # Cached responses older than this are not used
+LLM_CACHE_MAX_MB = 500 # Least recently used responses are removed above this size
+RATE_LIMIT_DB = os.path.join(RESULTS, "rate_limit.sqlite") # Token buckets shared by all processes
+# Requests (rpm) and tokens (tpm) per minute of every model, set them to the quota of your tier.
+# None disables a limit. Models not listed use "default".
+RATE_LIMITS = {
+    "gemini-2.5-flash": {"rpm": 10, "tpm": 250000},
+    "gemini-2.0-flash": {"rpm": 15, "tpm": 1000000},
+    "text-embedding-004": {"rpm": 100, "tpm": None},
+    "default": {"rpm": 10, "tpm": 250000},
+}
+LLM_MAX_RETRIES = 6 # Retries of a rate limited or failed request before giving up
+RENDER_QUEUE = os.path.join(RESULTS, "render_queue") # Job queue of the persistent render worker
+SCENE_CACHE = os.path.join(RESULTS, "scene_cache") # Finished scenes with their renders
+SCENE_CACHE_MAX_MB = 2000 # Least recently used scenes are removed above this size
+SCENE_CACHE_SIMILARITY = 0.95 # Minimum prompt similarity to reuse the constraints and order of a cached scene
+ASSET_LIBRARY = os.path.join(git_root, "data/asset_library.blend") # Render-ready assets built during preprocessing
+ASSET_LIBRARY_INDEX = os.path.join(git_root, "data/asset_library.json") # uid -> datablock index of the asset library
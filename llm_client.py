@@ -0,0 +1,264 @@
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from config import API_KEY, LLM_CACHE, LLM_CACHE_MAX_AGE_DAYS, LLM_CACHE_MAX_MB
+from tracing import span, annotate
+import rate_limit
+
+# Shared access to Gemini for all modules. Responses are cached on disk, keyed on everything that
+# determines them, so re-running a scene after a crash or re-rendering it needs no LLM calls.
+# Cache modes:
+#   readwrite: Use cached responses and store new ones (default).
+#   replay: Only use cached responses, a miss raises CacheMiss. Useful for reproducing a run.
+#   off: Always call the API.
+# The mode can be set with set_cache_mode or the REASON3D_LLM_CACHE environment variable, which
+# also reaches the preprocessing scripts started as subprocesses. In the same way, the backend
+# can be switched from the Gemini API to the offline fake in llm_fake.py (REASON3D_LLM_BACKEND).
+# Requests that miss the cache go through rate_limit.py, which keeps them within the quotas of
+# their model and retries them on rate limit errors.
+CACHE_MODES = ["readwrite", "replay", "off"]
+BACKENDS = ["gemini", "fake"]
+EVICTION_INTERVAL = 100 # Writes between two eviction passes
+
+_client = None
+_lock = threading.Lock()
+_cache_mode = os.environ.get("REASON3D_LLM_CACHE", "readwrite")
+_backend = os.environ.get("REASON3D_LLM_BACKEND", "gemini")
+_stats = {"hits": 0, "misses": 0, "writes": 0}
+
+
+class CacheMiss(Exception):
+    """
+    Raised in replay mode for a request that is not in the cache.
+    """
+
+
+def get_client():
+    # Created on first use, so importing a module doesn't need an API key
+    global _client
+    with _lock:
+        if _client is None and _backend == "fake":
+            from llm_fake import FakeClient
+            _client = FakeClient()
+        elif _client is None:
+            from google import genai
+            _client = genai.Client(api_key=API_KEY)
+        return _client
+
+
+def set_backend(backend):
+    """
+    Switch between the Gemini API and the offline fake. The choice is passed on to subprocesses.
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown backend {backend}, expected one of {BACKENDS}.")
+    global _backend, _client
+    with _lock:
+        _backend, _client = backend, None
+    os.environ["REASON3D_LLM_BACKEND"] = backend
+
+
+def set_cache_mode(mode):
+    if mode not in CACHE_MODES:
+        raise ValueError(f"Unknown cache mode {mode}, expected one of {CACHE_MODES}.")
+    global _cache_mode
+    _cache_mode = mode
+
+
+def _hash_part(digest, part):
+    # Images are hashed by their pixels, everything else by a canonical text form
+    if hasattr(part, "tobytes") and hasattr(part, "mode"):
+        digest.update(f"image:{part.mode}:{part.size}".encode())
+        digest.update(part.tobytes())
+    elif isinstance(part, (list, tuple)):
+        digest.update(b"[")
+        for item in part:
+            _hash_part(digest, item)
+            digest.update(b",")
+        digest.update(b"]")
+    elif isinstance(part, dict):
+        digest.update(json.dumps(part, sort_keys=True, default=repr).encode())
+    else:
+        digest.update(f"{type(part).__name__}:{part}".encode())
+
+
+def cache_key(kind, model, contents, response_schema=None, system_instruction=None, salt=None):
+    """
+    Key of a request: the model, system instruction, a hash of the contents including image
+    bytes and the response schema. The salt separates requests that are meant to give
+    different answers, e.g. several sampled candidates.
+    """
+    digest = hashlib.sha256()
+    # Responses of the fake backend are kept apart from the real ones
+    for part in [_backend, kind, model, system_instruction, contents, response_schema, salt]:
+        _hash_part(digest, part)
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def _connect():
+    os.makedirs(os.path.dirname(LLM_CACHE), exist_ok=True)
+    connection = sqlite3.connect(LLM_CACHE, timeout=30)
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, model TEXT, response TEXT, "
+                       "created REAL, last_used REAL, size INTEGER)")
+    return connection
+
+
+def _lookup(key):
+    with _connect() as connection:
+        row = connection.execute("SELECT response FROM responses WHERE key = ? AND created > ?",
+                                 (key, time.time() - LLM_CACHE_MAX_AGE_DAYS * 86400)).fetchone()
+        if row is not None:
+            connection.execute("UPDATE responses SET last_used = ? WHERE key = ?", (time.time(), key))
+    connection.close()
+    return None if row is None else row[0]
+
+
+def _store(key, model, response):
+    now = time.time()
+    with _connect() as connection:
+        connection.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)", (key, model, response, now, now, len(response)))
+    connection.close()
+    with _lock:
+        _stats["writes"] += 1
+        evict_now = _stats["writes"] % EVICTION_INTERVAL == 1
+    if evict_now:
+        evict()
+
+
+def evict(max_age_days=LLM_CACHE_MAX_AGE_DAYS, max_mb=LLM_CACHE_MAX_MB):
+    """
+    Remove responses older than max_age_days, then the least recently used responses until the
+    cache holds at most max_mb.
+
+    Returns:
+        Number of removed responses.
+    """
+    with _connect() as connection:
+        removed = connection.execute("DELETE FROM responses WHERE created < ?", (time.time() - max_age_days * 86400,)).rowcount
+        total = connection.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        excess = total - max_mb * 1024 * 1024
+        if excess > 0:
+            keys, freed = [], 0
+            for key, size in connection.execute("SELECT key, size FROM responses ORDER BY last_used"):
+                if freed >= excess: break
+                keys.append((key,))
+                freed += size
+            connection.executemany("DELETE FROM responses WHERE key = ?", keys)
+            removed += len(keys)
+    connection.close()
+    return removed
+
+
+def _cached(key, model, call):
+    if _cache_mode != "off":
+        response = _lookup(key)
+        if response is not None:
+            with _lock:
+                _stats["hits"] += 1
+            annotate(cache_hits=1)
+            return response
+        if _cache_mode == "replay":
+            raise CacheMiss(f"No cached response for request {key[:12]} to {model}.")
+    with _lock:
+        _stats["misses"] += 1
+    annotate(cache_misses=1)
+    response = call()
+    if _cache_mode == "readwrite":
+        _store(key, model, response)
+    return response
+
+
+def generate(model, contents, response_schema=None, system_instruction=None, cache_salt=None):
+    """
+    Generate a response with Gemini, or return the cached response of the same request.
+
+    Args:
+        model: The gemini model.
+        contents: Text or list of texts and PIL images.
+        response_schema: Optional JSON response schema (dict or type), the response is JSON then.
+        system_instruction: Optional system instruction.
+        cache_salt: Optional value to cache several answers to the same request separately.
+
+    Returns:
+        The text of the response.
+    """
+    config = {}
+    if response_schema is not None:
+        config["response_mime_type"] = "application/json"
+        config["response_schema"] = response_schema
+    if system_instruction is not None:
+        config["system_instruction"] = system_instruction
+    key = cache_key("generate", model, contents, response_schema, system_instruction, cache_salt)
+
+    def call():
+        estimate = rate_limit.estimate_tokens(contents)
+        request = lambda: get_client().models.generate_content(model=model, contents=contents, config=config or None)
+        # The fake has no quota, but its errors are still retried
+        response = rate_limit.call(model, request, estimate, limited=_backend != "fake")
+        usage = getattr(response, "usage_metadata", None)
+        if usage is not None:
+            annotate(prompt_tokens=usage.prompt_token_count or 0, response_tokens=usage.candidates_token_count or 0)
+            if _backend != "fake":
+                rate_limit.settle(model, estimate, (usage.prompt_token_count or 0) + (usage.candidates_token_count or 0))
+        return response.text
+
+    with span("llm.generate", model=model, cache_hits=0, cache_misses=0):
+        return _cached(key, model, call)
+
+
+def embed(model, text):
+    """
+    Embed a text, or return the cached embedding.
+
+    Returns:
+        List of floats.
+    """
+    key = cache_key("embed", model, text)
+    request = lambda: get_client().models.embed_content(model=model, contents=text)
+    call = lambda: json.dumps(rate_limit.call(model, request, rate_limit.estimate_tokens(text), limited=_backend != "fake").embeddings[0].values)
+    with span("llm.embed", model=model, cache_hits=0, cache_misses=0):
+        return json.loads(_cached(key, model, call))
+
+
+def cache_stats():
+    """
+    Hits and misses of this process and the size of the cache on disk.
+    """
+    with _lock:
+        stats = dict(_stats)
+    requests = stats["hits"] + stats["misses"]
+    stats["hit_rate"] = round(stats["hits"] / requests, 3) if requests else None
+    if os.path.isfile(LLM_CACHE):
+        with _connect() as connection:
+            stats["entries"], size = connection.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        connection.close()
+        stats["size_mb"] = round(size / 1024 / 1024, 2)
+    return stats
+
+
+def print_cache_stats():
+    stats = cache_stats()
+    if stats["hit_rate"] is not None:
+        print(f"LLM cache: {stats['hits']} hits, {stats['misses']} misses (hit rate {stats['hit_rate']:.0%}).")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect and maintain the LLM response cache.")
+    parser.add_argument("--evict", help="Remove expired responses and shrink the cache to its maximum size.", action="store_true")
+    parser.add_argument("--clear", help="Remove all cached responses.", action="store_true")
+    args = parser.parse_args()
+    if args.clear:
+        print(f"Removed {evict(max_age_days=0, max_mb=0)} responses.")
+    elif args.evict:
+        print(f"Removed {evict()} responses.")
+    stats = cache_stats()
+    print(f"{stats.get('entries', 0)} cached responses, {stats.get('size_mb', 0)} MB in {LLM_CACHE}")
+
+if __name__ == "__main__":
+    main()
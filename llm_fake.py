@@ -0,0 +1,196 @@
+import ast
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+import time
+from types import SimpleNamespace
+from config import DESCRIPTIONS
+
+# Offline stand-in for the Gemini client, used by llm_client with the "fake" backend. Responses
+# follow the requested schema and are plausible enough for the pipeline to run end to end:
+# object lists name assets of the library, orders keep the given objects, placements stand on
+# the floor inside the room. Latency, jitter and rate limit errors can be configured through
+# environment variables, so the timing of a run resembles a run against the API.
+LATENCY = float(os.environ.get("REASON3D_FAKE_LATENCY", 0.8)) # Mean seconds per generate request
+EMBED_LATENCY = float(os.environ.get("REASON3D_FAKE_EMBED_LATENCY", 0.1)) # Mean seconds per embedding
+JITTER = float(os.environ.get("REASON3D_FAKE_JITTER", 0.3)) # Standard deviation relative to the mean
+ERROR_RATE = float(os.environ.get("REASON3D_FAKE_ERROR_RATE", 0.0)) # Probability of a 429 error
+EMBEDDING_SIZE = 768
+ROOM_SIZE = 6.0
+FALLBACK_NAMES = ["table", "chair", "sofa", "lamp", "bookshelf", "bed", "plant", "desk", "cabinet", "rug"]
+
+
+class FakeRateLimitError(Exception):
+    """
+    Emulates the 429 error of the API.
+    """
+    code = 429
+    status = "RESOURCE_EXHAUSTED"
+
+    def __init__(self, retry_after=1.0):
+        super().__init__(f"429 RESOURCE_EXHAUSTED. Fake rate limit, retry in {retry_after}s.")
+        self.retry_after = retry_after
+
+
+class FakeModels:
+    def __init__(self, latency=LATENCY, embed_latency=EMBED_LATENCY, jitter=JITTER, error_rate=ERROR_RATE):
+        self.latency, self.embed_latency, self.jitter, self.error_rate = latency, embed_latency, jitter, error_rate
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._names = None
+
+    def _rng(self, *parts):
+        # Deterministic per request, repeated requests get the next answer of their sequence
+        key = hashlib.sha256(repr(parts).encode()).hexdigest()
+        with self._lock:
+            count = self._calls[key] = self._calls.get(key, -1) + 1
+        return random.Random(f"{key}:{count}")
+
+    def _wait(self, rng, mean):
+        if rng.random() < self.error_rate:
+            time.sleep(mean * 0.1)
+            raise FakeRateLimitError(round(rng.uniform(0.5, 2.0), 1))
+        time.sleep(max(0.0, rng.gauss(mean, mean * self.jitter)))
+
+    def asset_names(self):
+        if self._names is None:
+            names = []
+            if os.path.isfile(DESCRIPTIONS):
+                with open(DESCRIPTIONS, 'r') as file:
+                    names = sorted({data["name"] for data in json.load(file).values() if data.get("name")})
+            self._names = names or FALLBACK_NAMES
+        return self._names
+
+    def generate_content(self, model, contents, config=None):
+        config = config or {}
+        parts = contents if isinstance(contents, list) else [contents]
+        texts = [part for part in parts if isinstance(part, str)]
+        rng = self._rng(model, texts, config.get("system_instruction"), repr(config.get("response_schema")))
+        self._wait(rng, self.latency)
+        schema = config.get("response_schema")
+        text = self.constraint_text(texts, rng) if schema is None else json.dumps(self.respond(schema, "\n".join(texts), texts, rng))
+        # Roughly four characters per token, images count as 258 tokens like in the API
+        usage = SimpleNamespace(prompt_token_count=sum(len(t) for t in texts) // 4 + 258 * (len(parts) - len(texts)),
+                                candidates_token_count=len(text) // 4)
+        return SimpleNamespace(text=text, usage_metadata=usage)
+
+    def embed_content(self, model, contents):
+        self._wait(self._rng(model, contents), self.embed_latency)
+        return SimpleNamespace(embeddings=[SimpleNamespace(values=embed_text(contents))])
+
+    def constraint_text(self, texts, rng):
+        objects = _literal(texts[-1], [])
+        lines = [f"The {name} is standing on the ground." for name in objects]
+        if len(objects) > 1:
+            lines.append(f"The {objects[1]} is next to the {objects[0]}.")
+        return "\n".join(lines)
+
+    def respond(self, schema, prompt, texts, rng):
+        if schema is int:
+            # Index of the best match in pick_best_choice
+            return 1
+        if schema == list[str]:
+            # get_order: the objects unchanged, in the given order
+            return _literal(texts[-1], [])
+        properties = schema.get("properties", {}) if isinstance(schema, dict) else {}
+        if "objects" in properties:
+            return self.scene_objects(prompt, properties["objects"], rng)
+        if "Physical properties" in properties:
+            # CreateDescriptions names the object after the hint in the prompt
+            name = re.sub(r"[_\d]+", " ", _search(r"hint, if it is helpful: (.*)\.", prompt, "object")).strip().lower()
+            return {"Physical properties": f"A {name}.", "Functional properties": f"Used as a {name}.",
+                    "Contextual properties": f"Found where a {name} is needed.", "name": name}
+        if "constraints" in properties:
+            # A chain of objects along the walls, every object next to the previous one
+            names = properties["constraints"]["items"]["properties"]["subject"]["enum"]
+            walls = properties["constraints"]["items"]["properties"]["wall"]["enum"]
+            constraints = [{"relation": "against_wall", "subject": names[0], "wall": rng.choice(walls)}] if names else []
+            constraints += [{"relation": "next_to", "subject": b, "object": a} for a, b in zip(names, names[1:])]
+            return {"constraints": constraints}
+        if "pattern" in properties:
+            return {**self.placement(prompt, rng), "pattern": rng.choice(properties["pattern"]["enum"]),
+                    "axis_rotation": rng.choice([0, 90]), "rotation": 0, "spacing": 0.3, "columns": 2, "radius": 1.0}
+        if {"center", "rotation"} <= set(properties):
+            return self.placement(prompt, rng)
+        if schema.get("type") == "array" and {"center", "rotation"} <= set(schema.get("items", {}).get("properties", {})):
+            count = int(_search(r"Give (\d+) different candidate", prompt, 3))
+            return [self.placement(prompt, rng) for _ in range(count)]
+        return synthesize(schema, rng)
+
+    def scene_objects(self, prompt, schema, rng):
+        count = int(_search(r"Identify (\d+) objects", prompt, 5) or 5)
+        names = rng.sample(self.asset_names(), min(count, len(self.asset_names())))
+        objects = []
+        for name in names:
+            obj = synthesize(schema["items"], rng)
+            obj.update({"name": name, "quantity": rng.choice([1, 1, 1, 2, 4]),
+                        "Physical properties": f"A {name}.", "Functional properties": f"Used as a {name}.",
+                        "Contextual properties": f"Found where a {name} is needed."})
+            objects.append(obj)
+        return {"objects": objects}
+
+    def placement(self, prompt, rng):
+        size = _literal(_search(r"bounding box size of (\[[^\]]*\])", prompt, "[1, 1, 1]"), [1, 1, 1])
+        half = ROOM_SIZE / 2
+        return {"center": [round(rng.uniform(-half, half), 2), round(size[1] / 2, 3), round(rng.uniform(-half, half), 2)],
+                "rotation": [0, rng.choice([0, 90, 180, -90]), 0]}
+
+
+def _search(pattern, text, default):
+    match = re.search(pattern, text)
+    return match.group(1) if match else default
+
+
+def _literal(text, default):
+    try:
+        return ast.literal_eval(text)
+    except (ValueError, SyntaxError):
+        return default
+
+
+def synthesize(schema, rng, name=""):
+    """
+    Random value that is valid for a JSON schema.
+    """
+    if not isinstance(schema, dict):
+        return ""
+    kind = schema.get("type")
+    if "enum" in schema:
+        return rng.choice(schema["enum"])
+    if kind == "object":
+        properties = schema.get("properties", {})
+        required = set(schema.get("required", properties))
+        return {key: synthesize(value, rng, key) for key, value in properties.items() if key in required or rng.random() < 0.5}
+    if kind == "array":
+        return [synthesize(schema.get("items", {}), rng, name) for _ in range(rng.randint(1, 4))]
+    if kind == "integer":
+        return 2 if name == "columns" else rng.randint(1, 4)
+    if kind == "number":
+        return round(rng.uniform(0.2, 1.5), 2)
+    if kind == "boolean":
+        return rng.random() < 0.5
+    return f"{name or 'text'} {rng.randint(0, 999)}"
+
+
+def embed_text(text, size=EMBEDDING_SIZE):
+    """
+    Hashed bag of words, texts sharing words get similar embeddings.
+    """
+    vector = [0.0] * size
+    for word in re.findall(r"[a-z]+", text.lower()):
+        digest = hashlib.md5(word.encode()).digest()
+        vector[int.from_bytes(digest[:4], "little") % size] += 1.0 if digest[4] & 1 else -1.0
+    norm = sum(v * v for v in vector) ** 0.5 or 1.0
+    return [v / norm for v in vector]
+
+
+class FakeClient:
+    """
+    Drop-in replacement for genai.Client with the models.generate_content and
+    models.embed_content methods used in this repository.
+    """
+    def __init__(self, **settings):
+        self.models = FakeModels(**settings)
@@ -0,0 +1,163 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from config import OBJ_DATA, DESCRIPTIONS, EMBEDDINGS, ROTATION_DATA, TRACES
+from tracing import span, flush, merge_traces, print_summary, TRACE_DIR_ENV
+from llm_client import set_backend, set_cache_mode, CACHE_MODES
+
+# Runs the stages of the pipeline as functions in one process, with their inputs and outputs
+# passed explicitly. Only the Blender stages are started as processes. The modules of a stage
+# are imported when it first runs, so a scene doesn't import the preprocessing and vice versa.
+#   python pipeline.py preprocess
+#   python pipeline.py scene --prompt "A cozy reading corner." --no-render
+script_dir = os.path.dirname(os.path.abspath(__file__))
+
+_scene_state = {} # Embeddings and retrieval index, loaded once for all scenes of a process
+
+
+def run_blender(stage, script, *args):
+    with span(f"pipeline.{stage}"):
+        subprocess.run(["blender", "--background", "--python", os.path.join(script_dir, script), "--", *args], check=True, cwd=script_dir)
+
+
+def build_lods():
+    run_blender("lods", "preprocessing/build_lods.py")
+
+
+def render_thumbnails(lod=0):
+    run_blender("thumbnails", "preprocessing/image_render.py", "--lod", str(lod))
+
+
+def describe_assets(obj_data=OBJ_DATA, descriptions=DESCRIPTIONS):
+    from preprocessing.CreateDescriptions import process_prefabs
+    with span("pipeline.descriptions"):
+        return process_prefabs(obj_data, descriptions)
+
+
+def embed_assets(descriptions=DESCRIPTIONS, embeddings=EMBEDDINGS):
+    from preprocessing.CreateEmbeddings import embed_descriptions
+    with span("pipeline.embeddings"):
+        embed_descriptions(descriptions, embeddings)
+    _scene_state.clear() # Scenes built afterwards use the new embeddings
+
+
+def fix_rotations(obj_data=OBJ_DATA, rotations=ROTATION_DATA):
+    from preprocessing.fixRotation import fix_rotations
+    with span("pipeline.rotation"):
+        return fix_rotations(obj_data, rotations)
+
+
+def build_asset_library():
+    run_blender("library", "preprocessing/build_asset_library.py")
+
+
+def preprocess(skip_lod=False, thumbnail_lod=0, skip_rotation=False, skip_library=False):
+    """
+    Prepare the assets for scene building: proxies, thumbnails, descriptions, embeddings,
+    rotations and the asset library.
+    """
+    # Decimated proxies for previews, built first so the thumbnails can use them
+    if not skip_lod:
+        build_lods()
+    render_thumbnails(thumbnail_lod)
+    describe_assets()
+    embed_assets()
+    if not skip_rotation:
+        fix_rotations()
+    # Render-ready asset library, built last because it needs the rotation data
+    if not skip_library:
+        build_asset_library()
+
+
+def _place_objects():
+    # The scene building modules import each other as top-level modules
+    sys.path.append(os.path.join(script_dir, "build_scene"))
+    import PlaceObjects
+    return PlaceObjects
+
+
+def scene(prompt, output_dir=None, render=True, **options):
+    """
+    Build and render a scene in this process.
+
+    Args:
+        prompt: The input prompt.
+        output_dir: Folder for the outputs of the scene, see PlaceObjects.build_scene.
+        render: Whether to render the scene.
+        options: Options of PlaceObjects.py by their argument name, e.g. num_objects=8. llm_cache
+            and fake_llm switch the LLM client of the whole process, as in PlaceObjects.py.
+
+    Returns:
+        Path of the converted layout.
+    """
+    PlaceObjects = _place_objects()
+    if not _scene_state:
+        from Object_retriever import EmbeddingIndex
+        with span("pipeline.load_embeddings"):
+            with open(EMBEDDINGS, 'r') as file:
+                _scene_state["embeddings"] = json.load(file)
+            _scene_state["index"] = EmbeddingIndex(_scene_state["embeddings"])
+    args = PlaceObjects.get_parser().parse_args(["--prompt", prompt])
+    for key, value in options.items():
+        if key == "trace":
+            raise ValueError("Tracing applies to the whole process, use pipeline.py --trace or set REASON3D_TRACE_DIR.")
+        if not hasattr(args, key):
+            raise ValueError(f"Unknown option {key}.")
+        setattr(args, key, value)
+    if args.llm_cache:
+        set_cache_mode(args.llm_cache)
+    if args.fake_llm:
+        set_backend("fake")
+    with span("pipeline.scene"):
+        return PlaceObjects.build_scene(args, _scene_state["embeddings"], output_dir, _scene_state["index"], render)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the pipeline in a single process.")
+    parser.add_argument("--fake-llm", help="Use the offline fake LLM backend instead of the Gemini API.", action="store_true")
+    parser.add_argument("--trace", help="Save a trace of all stages to results/traces.", action="store_true")
+    parser.add_argument("--llm-cache", help="Use and store cached LLM responses (readwrite), only use them (replay) or don't cache (off).", choices=CACHE_MODES, default=None)
+    commands = parser.add_subparsers(dest="command", required=True)
+    prep = commands.add_parser("preprocess", help="Preprocess the assets.")
+    prep.add_argument("--skip-rotation", help="Skip the rotation alignment step.", action="store_true")
+    prep.add_argument("--skip-library", help="Skip building the render-ready asset library.", action="store_true")
+    prep.add_argument("--skip-lod", help="Skip building the decimated asset proxies.", action="store_true")
+    prep.add_argument("--thumbnail-lod", help="Render the thumbnails from the proxies of this level (0 = original).", type=int, default=0)
+    build = commands.add_parser("scene", help="Build a scene.")
+    build.add_argument("--prompt", help="The input prompt. Repeat it to build several scenes.", action="append", required=True)
+    build.add_argument("--output", help="Output folder, every scene gets a numbered subfolder if given.", default=None)
+    build.add_argument("--no-render", help="Only build the scenes.", action="store_true")
+    build.add_argument("--no-refinement", help="Skip the refinement step.", action="store_true")
+    build.add_argument("--num-objects", help="Override the number of different objects to use.", default="")
+    build.add_argument("--model", help="The gemini model used.", default="gemini-2.5-flash")
+    build.add_argument("--candidates", help="Number of candidate placements sampled per object.", type=int, default=1)
+    args = parser.parse_args()
+    if args.fake_llm:
+        set_backend("fake")
+    if args.llm_cache:
+        set_cache_mode(args.llm_cache)
+    if args.trace:
+        os.environ[TRACE_DIR_ENV] = os.path.join(TRACES, time.strftime("%Y%m%d-%H%M%S") + "-pipeline")
+
+    if args.command == "preprocess":
+        preprocess(args.skip_lod, args.thumbnail_lod, args.skip_rotation, args.skip_library)
+        print("Preprocessing done.")
+    else:
+        for i, prompt in enumerate(args.prompt):
+            output_dir = None if args.output is None else os.path.join(args.output, f"scene_{i:04d}")
+            layout = scene(prompt, output_dir, not args.no_render, no_refinement=args.no_refinement, num_objects=args.num_objects, model=args.model,
+                           candidates=args.candidates)
+            print(f"Scene {i + 1} of {len(args.prompt)} built: {layout}")
+
+    if args.trace:
+        flush()
+        trace_dir = os.environ[TRACE_DIR_ENV]
+        print_summary(merge_traces(trace_dir, os.path.join(trace_dir, "trace.json")))
+    else:
+        print_summary()
+
+if __name__ == "__main__":
+    main()
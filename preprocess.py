@@ -1,23 +1,35 @@
-import subprocess
 import argparse
 import os
+import time
+from config import TRACES
+from tracing import flush, merge_traces, print_summary, TRACE_DIR_ENV
+from pipeline import preprocess
+
 def main():
     parser = argparse.ArgumentParser(description="Preprocess objects")
     parser.add_argument("--skip-rotation", help="Skip the rotation alignment step.", action="store_true")
+    parser.add_argument("--skip-library", help="Skip building the render-ready asset library.", action="store_true")
+    parser.add_argument("--skip-lod", help="Skip building the decimated asset proxies.", action="store_true")
+    parser.add_argument("--thumbnail-lod", help="Render the thumbnails from the proxies of this level (0 = original).", type=int, default=0)
+    parser.add_argument("--fake-llm", help="Use the offline fake LLM backend instead of the Gemini API.", action="store_true")
+    parser.add_argument("--trace", help="Save a trace of all steps to results/traces.", action="store_true")
     args = parser.parse_args()
-    # Resolve absolute paths based on the current file
-    script_dir = os.path.dirname(os.path.abspath(__file__))
-
-    # Blender script
-    blender_script = os.path.join(script_dir, "preprocessing", "image_render.py")
-    subprocess.run(["blender", "--background", "--python", blender_script], check=True)
+    if args.fake_llm:
+        from llm_client import set_backend
+        set_backend("fake")
+    if args.trace:
+        os.environ[TRACE_DIR_ENV] = os.path.join(TRACES, time.strftime("%Y%m%d-%H%M%S") + "-preprocess")
 
-    # Python preprocessing scripts
-    subprocess.run(["python", os.path.join(script_dir, "preprocessing", "CreateDescriptions.py")], check=True)
-    subprocess.run(["python", os.path.join(script_dir, "preprocessing", "CreateEmbeddings.py")], check=True)
+    # Only the Blender steps run as separate processes, see pipeline.py
+    preprocess(args.skip_lod, args.thumbnail_lod, args.skip_rotation, args.skip_library)
 
-    # Optional rotation script
-    if not args.skip_rotation:
-        subprocess.run(["python", os.path.join(script_dir, "preprocessing", "fixRotation.py")], check=True)
+    print("Preprocessing done.")
+    if args.trace:
+        flush()
+        trace_dir = os.environ[TRACE_DIR_ENV]
+        print_summary(merge_traces(trace_dir, os.path.join(trace_dir, "trace.json")))
+    else:
+        print_summary()
 
-    print("Preprocessing done.")
\ No newline at end of file
+if __name__ == "__main__":
+    main()
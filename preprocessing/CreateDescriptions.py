@@ -1,15 +1,14 @@
-from google import genai
 import PIL.Image
 import os
 import json
 import sys
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
-from config import OBJ_DATA, DESCRIPTIONS, API_KEY
-# Set your API key
-api_key = API_KEY
-client = genai.Client(api_key=api_key)
+from config import OBJ_DATA, DESCRIPTIONS
+from llm_client import generate
+from tracing import traced
 
 
+@traced("describe")
 def get_structured_description(image_path1, image_path2,  name):
     """
     Get a structured description of an object from two images using Gemini.
@@ -51,29 +50,22 @@ def get_structured_description(image_path1, image_path2,  name):
 
     }
 
-    response = client.models.generate_content(
-        model="gemini-2.0-flash", contents=[image1, image2, prompt], config={
-            'response_mime_type': 'application/json',
-            'response_schema': response_schema
-        },
-    )
-    return json.loads(response.text)
+    response = generate("gemini-2.0-flash", [image1, image2, prompt], response_schema)
+    return json.loads(response)
 
 
-def process_prefabs(json_file_path):
+def process_prefabs(json_file_path, output_file_path=DESCRIPTIONS):
     """
     Process all prefabs in the JSON file and generate structured descriptions for each
     
     Args:
         json_file_path: Path to the prefab_data.json file
+        output_file_path: Path of the descriptions file, existing descriptions are kept
         
     Returns:
         Dictionary with prefab structured descriptions
     """
 
-    # Set default output path if not provided
-    output_file_path = DESCRIPTIONS
-
     # Load prefab data
     with open(json_file_path, 'r') as file:
         prefab_data = json.load(file)
@@ -1,15 +1,11 @@
-from google import genai
 import numpy as np
 import json
 import os
-import time
 import sys
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
-from config import DESCRIPTIONS, EMBEDDINGS, API_KEY
-
-# Set your API key
-api_key = API_KEY
-client = genai.Client(api_key=api_key)
+from config import DESCRIPTIONS, EMBEDDINGS
+from llm_client import embed
+from tracing import span
 
 
 def get_embedding(text):
@@ -23,10 +19,8 @@ def get_embedding(text):
         Embedding array
     """
     # Using Gemini's embedding model
-    result = client.models.embed_content(model='text-embedding-004', contents=text)
-
     # Return the embedding values as a numpy array
-    return np.array(result.embeddings[0].values)
+    return np.array(embed('text-embedding-004', text))
 
 
 def embed_descriptions(descriptions_file, embedding_file_path):
@@ -66,9 +60,10 @@ def embed_descriptions(descriptions_file, embedding_file_path):
                 continue
 
             print(f"Generating embedding for: {prefab_name}")
-            embedding_phys = get_embedding(phys).tolist()  # Convert to list for JSON serialization
-            embedding_func = get_embedding(func).tolist()
-            embedding_cont = get_embedding(cont).tolist()
+            with span("embed_asset"):
+                embedding_phys = get_embedding(phys).tolist()  # Convert to list for JSON serialization
+                embedding_func = get_embedding(func).tolist()
+                embedding_cont = get_embedding(cont).tolist()
 
             # Store embedding with other data
             embeddings_data[prefab_name] = {
@@ -81,8 +76,6 @@ def embed_descriptions(descriptions_file, embedding_file_path):
         except Exception as e:
             print(f"Error processing {prefab_name}: {str(e)}")
 
-        time.sleep(0.8)
-
     # Save embeddings to a file
     with open(embedding_file_path, 'w') as file:
         json.dump(embeddings_data, file, indent=4)
@@ -0,0 +1,52 @@
+import bpy
+import os
+import json
+import sys
+sys.path.append(os.path.abspath('.'))
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "rendering"))
+import render_layout
+from config import ASSETS, ROTATION_DATA, ASSET_LIBRARY, ASSET_LIBRARY_INDEX
+
+# Converts every asset once into a joined, origin-centred and pre-rotated mesh and stores all
+# of them in a single .blend library. render_layout.py appends them from there instead of
+# running the format importers for every scene.
+EXTENSIONS = [".glb", ".fbx", ".obj", ".blend"]
+
+
+def build_library():
+    with open(ROTATION_DATA, 'r') as file:
+        rotation_data = json.load(file)
+    pre_rotations = {a["name"]: a["rotation"] for a in rotation_data}
+
+    # The importers only pick the first file per uid, like render_layout.find_asset_file
+    uids = sorted({os.path.splitext(file)[0] for file in os.listdir(ASSETS) if os.path.splitext(file)[1].lower() in EXTENSIONS})
+    index = {}
+    library_objects = set()
+    for uid in uids:
+        file_path = render_layout.find_asset_file(uid)
+        if not file_path: continue
+        render_layout.clear_scene()
+        loaded = render_layout.import_asset(file_path)
+        if loaded is None:
+            print(f"⚠️ Skipped: No mesh found in {file_path}")
+            continue
+        pre_rotation = pre_rotations.get(uid, [0, 0, 0])
+        render_layout.normalize_asset(loaded, {"pre_rotation": pre_rotation})
+        loaded.location = (0, 0, 0)
+        loaded.name = uid
+        loaded.data.name = uid
+        loaded["pre_rotation"] = pre_rotation
+        # Keep the asset in memory but out of the scene, so the next import starts from an empty scene
+        for collection in list(loaded.users_collection):
+            collection.objects.unlink(loaded)
+        library_objects.add(loaded)
+        index[uid] = {"object": loaded.name, "pre_rotation": pre_rotation, "source": file_path, "mtime": os.path.getmtime(file_path)}
+        print(f"✓ Added {uid}")
+
+    bpy.data.libraries.write(ASSET_LIBRARY, library_objects, fake_user=True)
+    with open(ASSET_LIBRARY_INDEX, 'w') as file:
+        json.dump(index, file, indent=4)
+    print(f"✅ Asset library with {len(index)} assets saved to {ASSET_LIBRARY}")
+
+if __name__ == "__main__":
+    build_library()
@@ -0,0 +1,76 @@
+import bpy
+import os
+import json
+import sys
+import numpy as np
+sys.path.append(os.path.abspath('.'))
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "rendering"))
+import render_layout
+from config import ASSETS, LODS
+
+# Builds decimated proxies of every asset for previews. The proxies keep the coordinates of the
+# joined source meshes, so they can replace the originals anywhere an asset file is imported.
+# Proxies newer than their source file are kept.
+EXTENSIONS = [".glb", ".fbx", ".obj", ".blend"]
+LOD_RATIOS = {1: 0.1, 2: 0.01} # LOD level -> fraction of the faces of the original
+MIN_FACES = 200 # Small assets are not decimated below this face count
+
+
+def decimate(obj, ratio):
+    # Apply a collapse decimation through the evaluated mesh, without operators
+    modifier = obj.modifiers.new("Decimate", 'DECIMATE')
+    modifier.decimate_type = 'COLLAPSE'
+    modifier.ratio = ratio
+    evaluated = obj.evaluated_get(bpy.context.evaluated_depsgraph_get())
+    mesh = bpy.data.meshes.new_from_object(evaluated)
+    obj.modifiers.remove(modifier)
+    proxy = bpy.data.objects.new(f"{obj.name}_proxy", mesh)
+    bpy.context.collection.objects.link(proxy)
+    return proxy
+
+
+def export_proxy(proxy, path):
+    for obj in bpy.context.scene.objects:
+        obj.select_set(obj == proxy)
+    bpy.ops.export_scene.gltf(filepath=path, export_format='GLB', use_selection=True)
+
+
+def build_lods():
+    os.makedirs(LODS, exist_ok=True)
+    index_path = os.path.join(LODS, "lod_index.json")
+    index = {}
+    if os.path.isfile(index_path):
+        with open(index_path, 'r') as file:
+            index = json.load(file)
+
+    uids = sorted({os.path.splitext(file)[0] for file in os.listdir(ASSETS) if os.path.splitext(file)[1].lower() in EXTENSIONS})
+    for uid in uids:
+        file_path = render_layout.find_asset_file(uid)
+        if not file_path: continue
+        paths = {lod: render_layout.lod_file(uid, lod) for lod in LOD_RATIOS}
+        if uid in index and all(os.path.isfile(p) and os.path.getmtime(p) >= os.path.getmtime(file_path) for p in paths.values()):
+            continue
+        render_layout.reset_scene()
+        loaded = render_layout.import_asset(file_path)
+        if loaded is None:
+            print(f"⚠️ Skipped: No mesh found in {file_path}")
+            continue
+        faces = len(loaded.data.polygons)
+        # Bounds of the original, so thumbnails rendered from a proxy still report exact bounds
+        coords = np.empty(len(loaded.data.vertices) * 3)
+        loaded.data.vertices.foreach_get("co", coords)
+        coords = coords.reshape(-1, 3)
+        index[uid] = {"source": file_path, "faces": {0: faces}, "bounds_min": coords.min(axis=0).tolist(), "bounds_max": coords.max(axis=0).tolist()}
+        for lod, ratio in LOD_RATIOS.items():
+            proxy = decimate(loaded, min(1.0, max(ratio, MIN_FACES / max(faces, 1))))
+            export_proxy(proxy, paths[lod])
+            index[uid]["faces"][lod] = len(proxy.data.polygons)
+            bpy.data.objects.remove(proxy, do_unlink=True)
+        print(f"✓ {uid}: {' / '.join(str(f) for f in index[uid]['faces'].values())} faces")
+
+    with open(index_path, 'w') as file:
+        json.dump(index, file, indent=4)
+    print(f"✅ LOD proxies of {len(index)} assets saved to {LODS}")
+
+if __name__ == "__main__":
+    build_lods()
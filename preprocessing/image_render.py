@@ -3,9 +3,11 @@ import os
 import json
 import mathutils
 import uuid
+import argparse
 import sys
 sys.path.append(os.path.abspath('.'))
-from config import ASSETS, OBJ_DATA, IMAGES
+from config import ASSETS, OBJ_DATA, IMAGES, LODS
+import tracing
 
 # === CONFIGURATION ===
 TARGET_FOLDER = ASSETS      # 🔹 Folder with .blend, .fbx, .obj, .glb, .gltf
@@ -115,8 +117,12 @@ def render_thumbnail(obj, angle_name, camera_offset):
     return bpy.context.scene.render.filepath
 
 # === PREFAB PROCESSOR ===
-def process_prefabs():
+def process_prefabs(lod=0):
     os.makedirs(SAVE_PATH, exist_ok=True)
+    lod_index = {}
+    if lod > 0 and os.path.isfile(os.path.join(LODS, "lod_index.json")):
+        with open(os.path.join(LODS, "lod_index.json"), 'r') as f:
+            lod_index = json.load(f)
     prefab_data_list = []
 
     for file in os.listdir(TARGET_FOLDER):
@@ -126,7 +132,10 @@ def process_prefabs():
         print(f"📦 Processing {file}")
         clear_scene()
         full_path = os.path.join(TARGET_FOLDER, file)
-        import_model(full_path)
+        uid = os.path.splitext(file)[0]
+        proxy_path = os.path.join(LODS, f"{uid}_lod{lod}.glb")
+        use_proxy = lod > 0 and os.path.isfile(proxy_path) and uid in lod_index
+        import_model(proxy_path if use_proxy else full_path)
 
         mesh_objs = [obj for obj in bpy.context.scene.objects if obj.type == 'MESH']
         if not mesh_objs:
@@ -155,6 +164,10 @@ def process_prefabs():
         image6 = render_thumbnail(prefab_root, "(0,0,1)", mathutils.Vector((0, -1, 0)))
         # Get bounds
         center, size = get_bounds(prefab_root)
+        if use_proxy:
+            # Decimation can shrink the bounds slightly, the original bounds are kept in the LOD index
+            bounds_min, bounds_max = mathutils.Vector(lod_index[uid]["bounds_min"]), mathutils.Vector(lod_index[uid]["bounds_max"])
+            center, size = (bounds_min + bounds_max) / 2, bounds_max - bounds_min
 
         # Store metadata
         prefab = PrefabData(
@@ -178,4 +191,10 @@ if __name__ == "__main__":
     bg.inputs[0].default_value = (1, 1, 1, 1)  # White light
     bg.inputs[1].default_value = 0.7  # Strength
 
-    process_prefabs()
+    # Blender passes the script arguments after "--"
+    argv = sys.argv[sys.argv.index("--") + 1:] if "--" in sys.argv else []
+    parser = argparse.ArgumentParser(description="Render the thumbnails and bounds of all assets.")
+    parser.add_argument("--lod", help="Render the thumbnails from the decimated proxies of this level (0 = original).", type=int, default=0)
+    with tracing.span("thumbnails"):
+        process_prefabs(parser.parse_args(argv).lod)
+    tracing.flush()
@@ -0,0 +1,172 @@
+import os
+import random
+import re
+import sqlite3
+import time
+from config import RATE_LIMITS, RATE_LIMIT_DB, LLM_MAX_RETRIES
+from tracing import annotate
+
+# Rate governor for the LLM requests, shared by all threads and processes of a machine through a
+# token bucket per model and quota in SQLite. Every request takes one request token and an
+# estimate of its prompt tokens; the estimate is corrected with the reported usage afterwards.
+# Failed requests with a retryable error (429, 500, 503) are retried with jittered exponential
+# backoff, waiting at least as long as the retry hint of the error. A 429 also empties the
+# request bucket of the model, so the other processes hold back as well.
+RETRYABLE_CODES = {429, 500, 503}
+RETRYABLE_STATUSES = {"RESOURCE_EXHAUSTED", "UNAVAILABLE", "INTERNAL"}
+BACKOFF_BASE = 1.0 # Seconds before the first retry
+BACKOFF_MAX = 60.0 # Longest wait between two retries
+MAX_WAIT = 5.0 # Longest sleep before checking the buckets again
+
+
+def _connect():
+    os.makedirs(os.path.dirname(RATE_LIMIT_DB), exist_ok=True)
+    connection = sqlite3.connect(RATE_LIMIT_DB, timeout=30, isolation_level=None)
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("CREATE TABLE IF NOT EXISTS buckets (model TEXT, quota TEXT, tokens REAL, updated REAL, PRIMARY KEY (model, quota))")
+    return connection
+
+
+def limits(model):
+    """
+    Requests and tokens per minute of a model, from RATE_LIMITS in config.py.
+    """
+    return RATE_LIMITS.get(model, RATE_LIMITS["default"])
+
+
+def _refill(connection, model, quota, capacity, now):
+    row = connection.execute("SELECT tokens, updated FROM buckets WHERE model = ? AND quota = ?", (model, quota)).fetchone()
+    if row is None:
+        return capacity
+    tokens, updated = row
+    return min(capacity, tokens + (now - updated) * capacity / 60)
+
+
+def _save(connection, model, quota, tokens, now):
+    connection.execute("INSERT OR REPLACE INTO buckets VALUES (?, ?, ?, ?)", (model, quota, tokens, now))
+
+
+def acquire(model, tokens=0):
+    """
+    Wait until the quotas of the model allow a request with this many tokens and take them.
+    Requests larger than the token quota wait for a full bucket.
+
+    Returns:
+        Seconds waited.
+    """
+    quotas = {quota: capacity for quota, capacity in limits(model).items() if capacity}
+    needed = {"rpm": 1, "tpm": tokens}
+    start = time.time()
+    connection = _connect()
+    try:
+        while True:
+            now = time.time()
+            connection.execute("BEGIN IMMEDIATE")
+            available = {quota: _refill(connection, model, quota, capacity, now) for quota, capacity in quotas.items()}
+            wait = max([(min(needed[q], quotas[q]) - available[q]) * 60 / quotas[q] for q in quotas] + [0])
+            if wait <= 0:
+                for quota in quotas:
+                    _save(connection, model, quota, available[quota] - needed[quota], now)
+                connection.execute("COMMIT")
+                return time.time() - start
+            connection.execute("ROLLBACK")
+            time.sleep(min(wait, MAX_WAIT))
+    finally:
+        connection.close()
+
+
+def settle(model, estimate, used):
+    """
+    Correct the token bucket of the model by the difference between the estimated and the
+    reported tokens of a request.
+    """
+    capacity = limits(model).get("tpm")
+    if not capacity or used == estimate:
+        return
+    connection = _connect()
+    try:
+        now = time.time()
+        connection.execute("BEGIN IMMEDIATE")
+        _save(connection, model, "tpm", _refill(connection, model, "tpm", capacity, now) - (used - estimate), now)
+        connection.execute("COMMIT")
+    finally:
+        connection.close()
+
+
+def hold_back(model, seconds):
+    """
+    Empty the request bucket of the model, so no process sends a request for the next seconds.
+    """
+    capacity = limits(model).get("rpm")
+    if not capacity:
+        return
+    connection = _connect()
+    try:
+        now = time.time()
+        connection.execute("BEGIN IMMEDIATE")
+        tokens = _refill(connection, model, "rpm", capacity, now)
+        _save(connection, model, "rpm", min(tokens, 1 - seconds * capacity / 60), now)
+        connection.execute("COMMIT")
+    finally:
+        connection.close()
+
+
+def is_retryable(error):
+    code = getattr(error, "code", None)
+    return code in RETRYABLE_CODES or getattr(error, "status", None) in RETRYABLE_STATUSES
+
+
+def retry_after(error):
+    """
+    The retry hint of an error in seconds, from its retry_after attribute or the retryDelay
+    in the details of an API error. None without a hint.
+    """
+    hint = getattr(error, "retry_after", None)
+    if hint is not None:
+        return float(hint)
+    match = re.search(r"retryDelay['\"]?\s*[:=]\s*['\"]?(\d+(?:\.\d+)?)s", str(error))
+    return float(match.group(1)) if match else None
+
+
+def backoff(attempt, hint=None):
+    # Full range jitter around the exponential delay, so retrying processes spread out
+    delay = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt) * random.uniform(0.5, 1.5)
+    return max(delay, hint or 0)
+
+
+def call(model, function, tokens=0, max_retries=LLM_MAX_RETRIES, limited=True):
+    """
+    Call function within the rate limits of the model and retry it on retryable errors.
+
+    Args:
+        model: Model the request goes to.
+        function: The request, without arguments.
+        tokens: Estimated prompt tokens of the request.
+        max_retries: Retries before the error is raised.
+        limited: Whether to wait for the rate limits, retries happen either way.
+    """
+    attempt = 0
+    while True:
+        if limited:
+            acquire(model, tokens)
+        try:
+            return function()
+        except Exception as e:
+            if not is_retryable(e) or attempt >= max_retries:
+                raise
+            hint = retry_after(e)
+            if limited and getattr(e, "code", None) == 429:
+                hold_back(model, hint or BACKOFF_BASE)
+            delay = backoff(attempt, hint)
+            print(f"⚠️ {model}: {e.__class__.__name__} ({getattr(e, 'code', None)}), retry {attempt + 1}/{max_retries} in {delay:.1f}s")
+            annotate(retries=1)
+            time.sleep(delay)
+            attempt += 1
+
+
+def estimate_tokens(contents):
+    """
+    Rough prompt size: four characters per token and 258 tokens per image.
+    """
+    parts = contents if isinstance(contents, list) else [contents]
+    return sum(258 if hasattr(part, "tobytes") else len(str(part)) // 4 for part in parts)
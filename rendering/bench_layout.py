@@ -0,0 +1,66 @@
+import bpy
+import bmesh
+import os
+import time
+import sys
+sys.path.append(os.path.abspath('.'))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+import render_layout
+
+# Measures how applying a layout scales with the number of objects:
+#   blender --background --python rendering/bench_layout.py
+# The assets are synthetic stand-ins for imported files (several mesh parts under an empty),
+# so only joining, normalizing, instancing and the bounds pass are timed, not the importers.
+COUNTS = [10, 50, 100, 250, 500]
+DISTINCT = 10 # Number of distinct assets, the other objects are instances
+PARTS = 4 # Mesh parts per asset
+
+
+def synthetic_import(uid):
+    root = bpy.data.objects.new(uid, None)
+    bpy.context.collection.objects.link(root)
+    parts = []
+    for i in range(PARTS):
+        mesh = bpy.data.meshes.new(f"{uid}_{i}")
+        bm = bmesh.new()
+        bmesh.ops.create_uvsphere(bm, u_segments=32, v_segments=16, radius=0.25)
+        bm.to_mesh(mesh)
+        bm.free()
+        part = bpy.data.objects.new(f"{uid}_{i}", mesh)
+        bpy.context.collection.objects.link(part)
+        part.parent = root
+        part.location = (i * 0.5, 0, 0)
+        parts.append(part)
+    bpy.context.view_layer.update()
+    loaded = render_layout.join_meshes(parts, uid)
+    for obj in parts + [root]:
+        bpy.data.objects.remove(obj, do_unlink=True)
+    return loaded
+
+
+def run(count, distinct):
+    render_layout.clear_scene()
+    bpy.data.orphans_purge(do_recursive=True)
+    layout = [{"uid": f"asset{i % distinct}", "position": [(i % 25) * 1.5, (i // 25) * 1.5, 0.5],
+               "rotation": [0, 0, (i * 37) % 360], "pre_rotation": [0, 0, 0]} for i in range(count)]
+    start = time.perf_counter()
+    render_layout.import_layout(layout, use_library=False)
+    layout_time = time.perf_counter() - start
+    start = time.perf_counter()
+    render_layout.scene_bounds()
+    bounds_time = time.perf_counter() - start
+    return layout_time, bounds_time
+
+
+def main():
+    # Replace the file lookup and the importer with the synthetic assets
+    render_layout.find_asset_file = lambda uid, lod=0: uid
+    render_layout.import_asset = synthetic_import
+    print(f"{'objects':>8} {'distinct':>9} {'layout [s]':>11} {'per object [ms]':>16} {'bounds [ms]':>12}")
+    for count in COUNTS:
+        for distinct in [min(DISTINCT, count), count]:
+            layout_time, bounds_time = run(count, distinct)
+            print(f"{count:>8} {distinct:>9} {layout_time:>11.3f} {layout_time / count * 1000:>16.2f} {bounds_time * 1000:>12.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from config import BLENDER_FILE, RESULTS
+
+# Compares the asset proxies from preprocessing/build_lods.py with the originals:
+#   python rendering/bench_lod.py --tiers preview,draft
+# Every level of detail is rendered in its own Blender process, so the peak memory is not
+# carried over from the previous level. The asset library is not used, so all levels import files.
+script_dir = os.path.dirname(os.path.abspath(__file__))
+LEVELS = [0, 1, 2]
+
+
+def bench_level(layout_path, lod, tiers, output_dir):
+    output = os.path.join(output_dir, f"lod{lod}", "final_render.png")
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    subprocess.run(["blender", "--background", "--python", os.path.join(script_dir, "render_layout.py"), "--",
+                    "--layout", layout_path, "--output", output, "--tiers", tiers, "--lod", str(lod), "--no-library"],
+                   check=True, stdout=subprocess.DEVNULL, cwd=os.path.dirname(script_dir))
+    with open(os.path.join(os.path.dirname(output), "render_timings.json"), 'r') as file:
+        return json.load(file)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark import time, peak memory and render time per level of detail.")
+    parser.add_argument("--layout", help="The converted layout file.", default=BLENDER_FILE)
+    parser.add_argument("--tiers", help="Comma separated render tiers to time.", default="preview,draft")
+    parser.add_argument("--output", help="The folder for the renders of every level and the report.", default=os.path.join(RESULTS, "lod_bench"))
+    args = parser.parse_args()
+    tiers = [t for t in args.tiers.split(",") if t]
+
+    report = {lod: bench_level(os.path.abspath(args.layout), lod, args.tiers, args.output) for lod in LEVELS}
+
+    print(f"{'LOD':>4} {'import [s]':>11} {'peak [MB]':>10}" + "".join(f" {t + ' [s]':>12}" for t in tiers))
+    for lod, timings in report.items():
+        peak = max(t["peak_memory_mb"] or 0 for t in timings.values())
+        print(f"{lod:>4} {timings['import']['seconds']:>11.3f} {peak:>10.1f}" + "".join(f" {timings[t]['seconds']:>12.3f}" for t in tiers if t in timings))
+    report_path = os.path.join(args.output, "lod_report.json")
+    with open(report_path, 'w') as file:
+        json.dump(report, file, indent=4)
+    print(f"Report saved to {report_path}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,293 @@
+import argparse
+import base64
+import copy
+import json
+import math
+import os
+import struct
+import numpy as np
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from config import ASSETS, RESULTS
+from rendering import scene_graph
+
+# Writes the placed scene as a glTF file without Blender. glTF assets are embedded once and every
+# instance gets its own copy of the asset's node tree sharing the meshes. Other formats are
+# referenced by an empty node whose extras name the source file.
+script_dir = os.path.dirname(os.path.abspath(__file__))
+EXTENSIONS = [".glb", ".gltf", ".fbx", ".obj", ".blend"]
+GLB_MAGIC, GLB_JSON, GLB_BIN = 0x46546C67, 0x4E4F534A, 0x004E4942
+# Basis change from glTF (Y up) to Blender (Z up), as done by Blender's glTF importer
+GLTF_TO_BLENDER = np.array([[1, 0, 0, 0], [0, 0, -1, 0], [0, 1, 0, 0], [0, 0, 0, 1]], dtype=float)
+
+
+def _rotation(axis, angle):
+    c, s = math.cos(angle), math.sin(angle)
+    i, j = [(1, 2), (2, 0), (0, 1)][axis]
+    matrix = np.eye(4)
+    matrix[i, i], matrix[i, j], matrix[j, i], matrix[j, j] = c, -s, s, c
+    return matrix
+
+
+def _translation(vector):
+    matrix = np.eye(4)
+    matrix[:3, 3] = vector
+    return matrix
+
+
+def instance_matrix(center, rotation, pre_rotation, bounds_center):
+    """
+    World matrix of an instance in glTF's right-handed Y-up frame.
+
+    Composes the same transforms as render_layout.py: the placer's left-handed Y-up center and
+    rotation are converted to Blender's Z-up frame (swap of Y and Z, negated angles, Euler YXZ),
+    the asset is pre-rotated and moved so its bounding box center is at the origin.
+
+    Args:
+        center: Center from the placer.
+        rotation: Rotation in degrees from the placer.
+        pre_rotation: Pre-rotation of the asset from rotation_data.json.
+        bounds_center: Negated bounding box center of the imported asset in Blender's frame (object_data.json).
+
+    Returns:
+        4x4 numpy matrix.
+    """
+    position = [center[0], center[2], center[1]]
+    euler = [math.radians(-rotation[0]), math.radians(-rotation[2]), math.radians(-rotation[1])]
+    # Euler YXZ applies Y first, then X, then Z
+    placement = _translation(position) @ _rotation(2, euler[2]) @ _rotation(0, euler[0]) @ _rotation(1, euler[1])
+    # Same angle as the pre-rotation in render_layout.normalize_asset
+    pre = _rotation(2, math.radians(math.radians(pre_rotation[1])))
+    blender_matrix = placement @ pre @ _translation(bounds_center)
+    return np.linalg.inv(GLTF_TO_BLENDER) @ blender_matrix @ GLTF_TO_BLENDER
+
+
+def load_gltf(path):
+    """
+    Load a .glb or .gltf file.
+
+    Returns:
+        Tuple of the glTF JSON and a list with the bytes of every buffer.
+    """
+    with open(path, 'rb') as file:
+        data = file.read()
+    if path.lower().endswith(".glb"):
+        magic, _, length = struct.unpack_from("<III", data, 0)
+        if magic != GLB_MAGIC:
+            raise ValueError(f"{path} is not a binary glTF file.")
+        offset, doc, chunks = 12, None, []
+        while offset < length:
+            chunk_length, chunk_type = struct.unpack_from("<II", data, offset)
+            chunk = data[offset + 8:offset + 8 + chunk_length]
+            if chunk_type == GLB_JSON:
+                doc = json.loads(chunk)
+            elif chunk_type == GLB_BIN:
+                chunks.append(chunk)
+            offset += 8 + chunk_length
+        buffers = [chunks.pop(0) if "uri" not in b and chunks else _read_uri(b["uri"], path) for b in doc.get("buffers", [])]
+    else:
+        doc = json.loads(data)
+        buffers = [_read_uri(b["uri"], path) for b in doc.get("buffers", [])]
+    return doc, buffers
+
+
+def _read_uri(uri, path):
+    if uri.startswith("data:"):
+        return base64.b64decode(uri.split(",", 1)[1])
+    with open(os.path.join(os.path.dirname(path), uri), 'rb') as file:
+        return file.read()
+
+
+class SceneWriter:
+    """
+    Collects the embedded assets and instance nodes of a scene in a single glTF document.
+    """
+    def __init__(self):
+        self.doc = {"asset": {"version": "2.0", "generator": "reason-3d export_gltf"}, "scenes": [{"nodes": []}], "scene": 0, "nodes": []}
+        self.blob = bytearray()
+        self.assets = {} # uid -> list of root node templates
+
+    def _append(self, key, items):
+        offset = len(self.doc.setdefault(key, []))
+        self.doc[key] += items
+        return offset
+
+    def _add_bytes(self, data):
+        # Every buffer view starts 4-byte aligned
+        self.blob += b"\0" * (-len(self.blob) % 4)
+        offset = len(self.blob)
+        self.blob += data
+        return offset
+
+    def add_asset(self, uid, path):
+        """
+        Embed a glTF asset and remember its node tree for instancing.
+        """
+        doc, buffers = load_gltf(path)
+        buffer_offsets = [self._add_bytes(b) for b in buffers]
+        views = copy.deepcopy(doc.get("bufferViews", []))
+        for view in views:
+            view["byteOffset"] = view.get("byteOffset", 0) + buffer_offsets[view["buffer"]]
+            view["buffer"] = 0
+        for image in doc.get("images", []):
+            if "uri" in image:
+                # Images are embedded, so the scene is a single self-contained file
+                data = _read_uri(image.pop("uri"), path)
+                views.append({"buffer": 0, "byteOffset": self._add_bytes(data), "byteLength": len(data)})
+                image["bufferView"] = len(views) - 1
+                image.setdefault("mimeType", "image/png" if data[:4] == b"\x89PNG" else "image/jpeg")
+        view_offset = self._append("bufferViews", views)
+        # Images that got a new view above already point into the local list of views
+        for image in doc.get("images", []):
+            image["bufferView"] += view_offset
+        accessor_offset = len(self.doc.get("accessors", []))
+        for accessor in doc.get("accessors", []):
+            if "bufferView" in accessor: accessor["bufferView"] += view_offset
+            for part in accessor.get("sparse", {}).values():
+                if isinstance(part, dict) and "bufferView" in part: part["bufferView"] += view_offset
+        sampler_offset = self._append("samplers", doc.get("samplers", []))
+        image_offset = self._append("images", doc.get("images", []))
+        texture_offset = len(self.doc.get("textures", []))
+        for texture in doc.get("textures", []):
+            if "source" in texture: texture["source"] += image_offset
+            if "sampler" in texture: texture["sampler"] += sampler_offset
+            for extension in texture.get("extensions", {}).values():
+                if "source" in extension: extension["source"] += image_offset
+        material_offset = len(self.doc.get("materials", []))
+        for material in doc.get("materials", []):
+            _shift_textures(material, texture_offset)
+        mesh_offset = len(self.doc.get("meshes", []))
+        for mesh in doc.get("meshes", []):
+            for primitive in mesh["primitives"]:
+                primitive["attributes"] = {k: v + accessor_offset for k, v in primitive["attributes"].items()}
+                if "indices" in primitive: primitive["indices"] += accessor_offset
+                if "material" in primitive: primitive["material"] += material_offset
+                primitive["targets"] = [{k: v + accessor_offset for k, v in t.items()} for t in primitive.get("targets", [])]
+                if not primitive["targets"]: del primitive["targets"]
+        self._append("accessors", doc.get("accessors", []))
+        self._append("textures", doc.get("textures", []))
+        self._append("materials", doc.get("materials", []))
+        self._append("meshes", doc.get("meshes", []))
+        for key in ["extensionsUsed", "extensionsRequired"]:
+            for extension in doc.get(key, []):
+                if extension not in self.doc.setdefault(key, []): self.doc[key].append(extension)
+
+        nodes = doc.get("nodes", [])
+        for node in nodes:
+            if "mesh" in node: node["mesh"] += mesh_offset
+            # Skins, cameras and animations are not part of a static scene
+            for key in ["skin", "camera"]: node.pop(key, None)
+        scene = doc.get("scenes", [{"nodes": list(range(len(nodes)))}])[doc.get("scene", 0)]
+        self.assets[uid] = (nodes, scene["nodes"])
+
+    def _copy_node(self, nodes, index):
+        node = {k: v for k, v in nodes[index].items() if k != "children"}
+        children = [self._copy_node(nodes, child) for child in nodes[index].get("children", [])]
+        if children: node["children"] = children
+        self.doc["nodes"].append(node)
+        return len(self.doc["nodes"]) - 1
+
+    def add_instance(self, name, uid, matrix, extras=None):
+        """
+        Add an instance node with the given world matrix to the scene.
+        """
+        node = {"name": name, "matrix": [float(a) for a in matrix.T.flatten()]}
+        if uid in self.assets:
+            nodes, roots = self.assets[uid]
+            node["children"] = [self._copy_node(nodes, root) for root in roots]
+        if extras:
+            node["extras"] = extras
+        self.doc["nodes"].append(node)
+        self.doc["scenes"][0]["nodes"].append(len(self.doc["nodes"]) - 1)
+
+    def write(self, output_path):
+        doc = copy.deepcopy(self.doc)
+        for key in [k for k, v in doc.items() if isinstance(v, list) and not v]:
+            del doc[key]
+        if self.blob:
+            doc["buffers"] = [{"byteLength": len(self.blob)}]
+        if output_path.lower().endswith(".glb"):
+            json_chunk = json.dumps(doc, separators=(",", ":")).encode()
+            json_chunk += b" " * (-len(json_chunk) % 4)
+            bin_chunk = bytes(self.blob) + b"\0" * (-len(self.blob) % 4)
+            length = 12 + 8 + len(json_chunk) + (8 + len(bin_chunk) if bin_chunk else 0)
+            with open(output_path, 'wb') as file:
+                file.write(struct.pack("<III", GLB_MAGIC, 2, length))
+                file.write(struct.pack("<II", len(json_chunk), GLB_JSON) + json_chunk)
+                if bin_chunk:
+                    file.write(struct.pack("<II", len(bin_chunk), GLB_BIN) + bin_chunk)
+        else:
+            if self.blob:
+                bin_path = os.path.splitext(output_path)[0] + ".bin"
+                with open(bin_path, 'wb') as file:
+                    file.write(self.blob)
+                doc["buffers"][0]["uri"] = os.path.basename(bin_path)
+            with open(output_path, 'w') as file:
+                json.dump(doc, file, indent=4)
+
+
+def _shift_textures(value, offset):
+    # Texture references of materials and their extensions are dicts stored under "*Texture" keys
+    if isinstance(value, dict):
+        for key, item in value.items():
+            if key.endswith("Texture") and isinstance(item, dict) and "index" in item:
+                item["index"] += offset
+            _shift_textures(item, offset)
+    elif isinstance(value, list):
+        for item in value:
+            _shift_textures(item, offset)
+
+
+def find_asset_file(uid):
+    for ext in EXTENSIONS:
+        candidate = os.path.join(ASSETS, f"{uid}{ext}")
+        if os.path.isfile(candidate):
+            return candidate
+    return None
+
+
+def export_scene(scene, output_path, embed=True):
+    """
+    Export a placed scene as a glTF scene.
+
+    Args:
+        scene: The placed scene, see scene_graph.py.
+        output_path: Path of the .glb or .gltf file.
+        embed: Embed glTF assets. Otherwise every asset is only referenced in the node extras.
+    """
+    writer = SceneWriter()
+    for obj in scene:
+        uid = str(obj["uid"])
+        path = find_asset_file(uid)
+        if path is None:
+            print(f"❌ No supported file found for UID: {uid}")
+            continue
+        if embed and uid not in writer.assets and path.lower().endswith((".glb", ".gltf")):
+            writer.add_asset(uid, path)
+        matrix = instance_matrix(obj["center"], obj["rotation"], obj["pre_rotation"], obj["bounds_center"])
+        extras = None if uid in writer.assets else {"uid": uid, "source": os.path.abspath(path)}
+        writer.add_instance(str(obj["name"]), uid, matrix, extras)
+    writer.write(output_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the placed objects as a glTF scene.")
+    parser.add_argument("--scene", help="The placed scene.", default=os.path.join(script_dir, "../build_scene", scene_graph.SCENE_FILE))
+    parser.add_argument("--placed", help="The placed objects, used if there is no scene file.", default=os.path.join(script_dir, "../build_scene/placed_objects.json"))
+    parser.add_argument("--placed-data", help="The data of the placed objects.", default=os.path.join(script_dir, "../build_scene/placed_objects_data.json"))
+    parser.add_argument("--output", help="The .glb or .gltf file.", default=os.path.join(RESULTS, "scene.glb"))
+    parser.add_argument("--reference", help="Only reference the assets instead of embedding them.", action="store_true")
+    args = parser.parse_args()
+    if os.path.isfile(args.scene):
+        scene = scene_graph.load(args.scene)
+    else:
+        with open(args.placed, 'r') as file:
+            placed_objects = json.load(file)
+        with open(args.placed_data, 'r') as file:
+            object_data = json.load(file)
+        scene = scene_graph.from_placement(placed_objects, object_data)
+    export_scene(scene, args.output, not args.reference)
+    print(f"✅ Scene exported to {args.output}")
+
+if __name__ == "__main__":
+    main()
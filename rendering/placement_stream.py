@@ -0,0 +1,77 @@
+import json
+import os
+import threading
+import time
+
+# Objects are streamed from the placement to its consumers (renderer, previews) through a JSONL
+# file, one event per line, so they can start while the placement is still running.
+# Every object gets a "placed" event, and a "refined" event for every later change of its
+# transform. Both hold the name, guid, center, rotation, size and size_after_rotation of the
+# object in Unity coordinates, the position of its pivot and its entry of the converted layout
+# ("blender"). The stream ends with a "done" event.
+EVENT_TYPES = ["placed", "refined", "done"]
+
+
+class PlacementStream:
+    def __init__(self, path):
+        self.path = path
+        self.start = time.time()
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        # Written to a new file, so a consumer never reads the end of an old stream
+        tmp_path = path + ".tmp"
+        open(tmp_path, 'w').close()
+        os.replace(tmp_path, path)
+
+    def emit(self, kind, **data):
+        event = {"type": kind, "time": round(time.time() - self.start, 3), **data}
+        with self._lock, open(self.path, 'a') as file:
+            # One write per line, so a consumer reading the file sees whole events
+            file.write(json.dumps(event) + "\n")
+        return event
+
+    def close(self, **data):
+        return self.emit("done", **data)
+
+
+def follow(path, timeout=None, poll_interval=0.05):
+    """
+    Yield the events of a stream as they are written, until the "done" event.
+
+    Args:
+        path: The stream file, which doesn't need to exist yet.
+        timeout: Seconds without a new event after which TimeoutError is raised.
+        poll_interval: Seconds between two checks for new events.
+    """
+    last_event = time.time()
+    while not os.path.isfile(path):
+        if timeout is not None and time.time() - last_event > timeout:
+            raise TimeoutError(f"No placement stream at {path} after {timeout} seconds.")
+        time.sleep(poll_interval)
+    with open(path, 'r') as file:
+        buffer = ""
+        while True:
+            chunk = file.readline()
+            if not chunk:
+                if timeout is not None and time.time() - last_event > timeout:
+                    raise TimeoutError(f"No placement event in {path} for {timeout} seconds.")
+                time.sleep(poll_interval)
+                continue
+            buffer += chunk
+            if not buffer.endswith("\n"): continue # Rest of the line not written yet
+            event, buffer = json.loads(buffer), ""
+            last_event = time.time()
+            yield event
+            if event["type"] == "done":
+                return
+
+
+def current_objects(events):
+    """
+    The latest state of every object of a list of events, in the order they were placed.
+    """
+    objects = {}
+    for event in events:
+        if event["type"] in ("placed", "refined"):
+            objects[event["name"]] = event
+    return list(objects.values())
@@ -1,11 +1,17 @@
 import bpy
+import bmesh
 import json
 import os
 import math
-from mathutils import Euler, Vector
+import argparse
+import time
+import numpy as np
+from mathutils import Euler, Matrix, Vector
 import sys
 sys.path.append(os.path.abspath('.'))
-from config import BLENDER_FILE, RENDERS, ASSETS
+from config import BLENDER_FILE, RENDERS, ASSETS, ASSET_LIBRARY, ASSET_LIBRARY_INDEX, LODS
+import tracing
+from rendering.placement_stream import follow
 
 # === CONFIG ===
 unity_layout_file = BLENDER_FILE
@@ -17,245 +23,282 @@ floor_path = floor_filepath
 wall_path = wall_blend_filepath
 material_name = os.path.basename(floor_path)[:-9]
 wall_material_name = os.path.basename(wall_path)[:-9]
+wall_height = 2.7  # Add some height margin
 
 
 output_folder = RENDERS
 
-with bpy.data.libraries.load(floor_path, link=False) as (data_from, data_to):
-    if material_name in data_from.materials:
-        data_to.materials.append(material_name)
-    else:
-        print(f"Error: Material '{material_name}' not found in '{floor_path}'")
-with bpy.data.libraries.load(wall_path, link=False) as (data_from, data_to):
-    if wall_material_name in data_from.materials:
-        data_to.materials.append(wall_material_name)
-    else:
-        print(f"Error: Material '{wall_material_name}' not found in '{wall_blend_filepath}'")
+def load_materials():
+    with bpy.data.libraries.load(floor_path, link=False) as (data_from, data_to):
+        if material_name in data_from.materials:
+            data_to.materials.append(material_name)
+        else:
+            print(f"Error: Material '{material_name}' not found in '{floor_path}'")
+    with bpy.data.libraries.load(wall_path, link=False) as (data_from, data_to):
+        if wall_material_name in data_from.materials:
+            data_to.materials.append(wall_material_name)
+        else:
+            print(f"Error: Material '{wall_material_name}' not found in '{wall_blend_filepath}'")
+    # Keep the materials when orphan data is purged between scenes
+    for name in [material_name, wall_material_name]:
+        if name in bpy.data.materials:
+            bpy.data.materials[name].use_fake_user = True
 
 # === CLEAR DEFAULT SCENE ===
-bpy.ops.object.select_all(action='SELECT')
-bpy.ops.object.delete(use_global=False)
+def clear_scene():
+    for obj in list(bpy.context.scene.objects):
+        bpy.data.objects.remove(obj, do_unlink=True)
 
-# === IMPORT LAYOUT ===
-with open(unity_layout_file, 'r') as f:
-    layout = json.load(f)
+def reset_scene():
+    # Remove the objects of the previous scene and all data only they used
+    for obj in list(bpy.data.objects):
+        bpy.data.objects.remove(obj, do_unlink=True)
+    bpy.data.orphans_purge(do_local_ids=True, do_linked_ids=True, do_recursive=True)
 
-for info in layout:
-    uid = info['uid']
-    position = info['position']
-    rotation_deg = info['rotation']
-    rotation_rad = [math.radians(r) for r in rotation_deg]
-    pre_rotation_deg = info['pre_rotation'][1]
-    pre_rot_rad = math.radians(pre_rotation_deg)
+def lod_file(uid, lod):
+    return os.path.join(LODS, f"{uid}_lod{lod}.glb")
+
+def find_asset_file(uid, lod=0):
+    # Decimated proxies from preprocessing/build_lods.py, falling back to the original
+    if lod > 0 and os.path.isfile(lod_file(uid, lod)):
+        return lod_file(uid, lod)
 
     # Supported extensions in priority order
     extensions = [".glb", ".fbx", ".obj", ".blend"]
-    file_path = None
 
     # Look for the first existing file with any supported extension
     for ext in extensions:
         candidate = os.path.join(asset_base_path, f"{uid}{ext}")
         if os.path.isfile(candidate):
-            file_path = candidate
-            break
+            return candidate
+    return None
 
-    if not file_path:
-        print(f"❌ No supported file found for UID: {uid}")
-        continue
-    else:
-        print(f"📦 Importing: {file_path}")
-
-        # Track objects before import
-        objects_before_import = set(bpy.context.scene.objects)
-
-        # Determine which importer to use
-        ext = os.path.splitext(file_path)[1].lower()
-        if ext == ".glb" or ext == ".gltf":
-            bpy.ops.import_scene.gltf(filepath=file_path)
-        elif ext == ".fbx":
-            bpy.ops.import_scene.fbx(filepath=file_path)
-        elif ext == ".obj":
-            bpy.ops.import_scene.obj(filepath=file_path)
-        elif ext == ".blend":
-            with bpy.data.libraries.load(file_path, link=False) as (data_from, data_to):
-                data_to.objects = [name for name in data_from.objects]
-            for obj in data_to.objects:
-                if obj:
-                    bpy.context.collection.objects.link(obj)
+# === IMPORT LAYOUT ===
+def import_asset(file_path):
+    print(f"📦 Importing: {file_path}")
+
+    # Track objects before import
+    objects_before_import = set(bpy.context.scene.objects)
+
+    # Determine which importer to use
+    ext = os.path.splitext(file_path)[1].lower()
+    if ext == ".glb" or ext == ".gltf":
+        bpy.ops.import_scene.gltf(filepath=file_path)
+    elif ext == ".fbx":
+        bpy.ops.import_scene.fbx(filepath=file_path)
+    elif ext == ".obj":
+        bpy.ops.import_scene.obj(filepath=file_path)
+    elif ext == ".blend":
+        with bpy.data.libraries.load(file_path, link=False) as (data_from, data_to):
+            data_to.objects = [name for name in data_from.objects]
+        for obj in data_to.objects:
+            if obj:
+                bpy.context.collection.objects.link(obj)
 
     objects_after_import = set(bpy.context.scene.objects)
     new_objects = objects_after_import - objects_before_import
-    # 1. Filter out non-mesh objects and identify the target objects for joining
-    mesh_objects_to_join = [obj for obj in new_objects if obj.type == 'MESH']
-
-    # if len(mesh_objects_to_join) < 2:
-    #     print("Not enough mesh objects to perform a join operation.")
-
-    # 2. Deselect everything
-    bpy.ops.object.select_all(action='DESELECT')
-
-    # 3. Choose the active object for the join operation
-    # It's often good practice to pick an object that is NOT parented,
-    # or clear its parent beforehand.
-    # Let's pick the first eligible mesh object as the active one.
-    active_join_obj = None
-    for obj in mesh_objects_to_join:
-        if obj.parent is None:  # Prioritize unparented objects
-            active_join_obj = obj
-            break
-    if active_join_obj is None:  # If all are parented, just pick the first one
-        active_join_obj = mesh_objects_to_join[0]
-
-    # Clear parent of the chosen active object if it has one (keeping its world transform)
-    if active_join_obj.parent:
-        print(f"Clearing parent of active object '{active_join_obj.name}' before join.")
-        # Ensure it's active and selected for the parent_clear operator
-        bpy.context.view_layer.objects.active = active_join_obj
-        active_join_obj.select_set(True)
-        bpy.ops.object.parent_clear(type='CLEAR_KEEP_TRANSFORM')
-        active_join_obj.select_set(False)  # Deselect it again for now
-
-    # Now select all objects to be joined, ensuring the chosen active object is last selected/set active
-    bpy.context.view_layer.objects.active = active_join_obj  # Make it active first
-    active_join_obj.select_set(True)  # Select it
-
-    for obj in mesh_objects_to_join:
-        if obj != active_join_obj:
-            # Clear parent of other objects to be joined (keeping their world transform)
-            if obj.parent:
-                print(f"Clearing parent of object '{obj.name}' before join.")
-                # To clear parent, obj must be active and selected
-                current_active = bpy.context.view_layer.objects.active  # Store current active
-                current_selected = [o for o in bpy.context.selected_objects]  # Store current selection
-
-                bpy.ops.object.select_all(action='DESELECT')
-                bpy.context.view_layer.objects.active = obj
-                obj.select_set(True)
-                bpy.ops.object.parent_clear(type='CLEAR_KEEP_TRANSFORM')
-
-                # Restore previous active and selection for the join op
-                bpy.ops.object.select_all(action='DESELECT')
-                for sel_obj in current_selected:
-                    sel_obj.select_set(True)
-                bpy.context.view_layer.objects.active = current_active
-
-            obj.select_set(True)  # Select the object for joining
-
-    try:
-        # Switch to Object Mode if not already to ensure join operation works
-        if bpy.context.mode != 'OBJECT':
-            bpy.ops.object.mode_set(mode='OBJECT')
-
-        bpy.ops.object.join()
-        print("Objects joined successfully.")
-        loaded = bpy.context.view_layer.objects.active
-    except Exception as e:
-        print(f"Error joining objects: {e}. Ignoring the join operation.")
-        loaded = None  # Set to None if join failed
-
-    # Might be unnecessary
-    bpy.ops.object.select_all(action='DESELECT')
-    loaded.select_set(True)
-    # 2. Calculate the world-space bounding box center of the object
-    # obj.bound_box gives local coordinates of the 8 corners
-    # obj.matrix_world transforms these local coordinates to world coordinates
-    bbox_corners_world = [loaded.matrix_world @ Vector(corner) for corner in loaded.bound_box]
-    bbox_center_world = sum(bbox_corners_world, Vector()) / 8
-
-    # 3. Set the 3D cursor to this calculated world-space center
-    bpy.context.scene.cursor.location = bbox_center_world
-
-    # 4. Set the object's origin to the 3D cursor
-    # This operation is generally less context-sensitive than view3d operators
-    bpy.ops.object.origin_set(type='ORIGIN_CURSOR')
-    #bpy.ops.object.origin_set(type='GEOMETRY_ORIGIN', center='BOUNDS')
-    bpy.ops.transform.rotate(value=-math.radians(pre_rot_rad), orient_axis='Z')
-    # Apply transform here.
-    bpy.ops.object.transform_apply(location=False, rotation=True, scale=False)
-    bpy.context.object.rotation_mode = "YXZ"
-    for i in range(3):
-        loaded.rotation_euler[i] += rotation_rad[i]
-
-    # Set position
-    loaded.location = position
-    print(loaded.location)
-    bpy.ops.object.transform_apply(location=True, rotation=True, scale=True)
+    mesh_objects = [obj for obj in new_objects if obj.type == 'MESH']
+    if not mesh_objects:
+        print(f"Error: No mesh found in {file_path}.")
+        return None
+
+    loaded = join_meshes(mesh_objects, os.path.splitext(os.path.basename(file_path))[0])
+    # The joined object replaces everything the importer created (meshes, empties, armatures)
+    for obj in new_objects:
+        bpy.data.objects.remove(obj, do_unlink=True)
+    return loaded
+
+def join_meshes(mesh_objects, name):
+    # Join the meshes in world space with bmesh, without selection or operators
+    bm = bmesh.new()
+    materials = []
+    for obj in mesh_objects:
+        mesh = obj.data.copy()
+        mesh.transform(obj.matrix_world)
+        # Remap the material indices onto the combined material list
+        slots = []
+        for material in mesh.materials:
+            if material not in materials:
+                materials.append(material)
+            slots.append(materials.index(material))
+        if slots and len(mesh.polygons):
+            indices = np.empty(len(mesh.polygons), dtype=np.int32)
+            mesh.polygons.foreach_get("material_index", indices)
+            mesh.polygons.foreach_set("material_index", np.array(slots, dtype=np.int32)[np.clip(indices, 0, len(slots) - 1)])
+        # bmesh merges UV layers by name
+        if mesh.uv_layers:
+            mesh.uv_layers[0].name = "UVMap"
+        bm.from_mesh(mesh)
+        bpy.data.meshes.remove(mesh)
+    joined = bpy.data.meshes.new(name)
+    bm.to_mesh(joined)
+    bm.free()
+    for material in materials:
+        joined.materials.append(material)
+    loaded = bpy.data.objects.new(name, joined)
+    bpy.context.collection.objects.link(loaded)
+    return loaded
+
+def normalize_asset(loaded, info):
+    # Centre the origin and apply the pre-rotation, this is the same for every instance of an asset
+    pre_rotation_deg = info['pre_rotation'][1]
+    pre_rot_rad = math.radians(pre_rotation_deg)
+    mesh = loaded.data
+    coords = np.empty(len(mesh.vertices) * 3)
+    mesh.vertices.foreach_get("co", coords)
+    coords = coords.reshape(-1, 3)
+    bbox_center = (coords.min(axis=0) + coords.max(axis=0)) / 2 if len(coords) else np.zeros(3)
+
+    # Move the geometry so the origin is at the bounding box center. transform.rotate turns
+    # clockwise for positive values, so this is the rotation the operator applied before.
+    mesh.transform(Matrix.Rotation(math.radians(pre_rot_rad), 4, 'Z') @ Matrix.Translation(-Vector(bbox_center)))
+    loaded.matrix_world = Matrix.Translation(loaded.matrix_world @ Vector(bbox_center))
+
+def place_instance(obj, info):
+    # Only the object transform is set, the mesh data may be shared with other instances
+    position = info['position']
+    rotation_deg = info['rotation']
+    rotation_rad = [math.radians(r) for r in rotation_deg]
+    obj.rotation_mode = "YXZ"
+    obj.matrix_world = Matrix.Translation(position) @ Euler(rotation_rad, 'YXZ').to_matrix().to_4x4()
+
+def load_library_assets(layout):
+    # Append the render-ready assets of the layout from the asset library in a single load
+    if not os.path.isfile(ASSET_LIBRARY_INDEX) or not os.path.isfile(ASSET_LIBRARY):
+        return {}
+    with open(ASSET_LIBRARY_INDEX, 'r') as f:
+        index = json.load(f)
+    # Assets whose pre-rotation changed since the library was built are imported from the source file
+    entries = {info['uid']: index[info['uid']] for info in layout
+               if info['uid'] in index and index[info['uid']]['pre_rotation'] == info['pre_rotation']}
+    if not entries:
+        return {}
+    with bpy.data.libraries.load(ASSET_LIBRARY, link=False) as (data_from, data_to):
+        data_to.objects = [entry['object'] for entry in entries.values() if entry['object'] in data_from.objects]
+    loaded = {obj.name: obj for obj in data_to.objects if obj}
+    prototypes = {}
+    for uid, entry in entries.items():
+        obj = loaded.get(entry['object'])
+        if obj is None: continue
+        print(f"📦 Appended from library: {uid}")
+        bpy.context.collection.objects.link(obj)
+        prototypes[uid] = obj
+    return prototypes
+
+def import_layout(layout, use_library=True, lod=0):
+    # Every distinct asset is imported once, further instances are linked duplicates sharing its mesh.
+    # The asset library only holds the full resolution meshes.
+    prototypes = load_library_assets(layout) if use_library and lod == 0 else {}
+    placed = set()
+    for info in layout:
+        import_instance(info, prototypes, placed, lod)
+
+def import_instance(info, prototypes, placed, lod=0):
+    # Place an instance of the asset, importing it if it has no prototype yet
+    uid = info['uid']
+    if uid in placed:
+        obj = prototypes[uid].copy()
+        bpy.context.collection.objects.link(obj)
+    elif uid in prototypes:
+        obj = prototypes[uid]
+    else:
+        file_path = find_asset_file(uid, lod)
+        if not file_path:
+            print(f"❌ No supported file found for UID: {uid}")
+            return None
+        obj = import_asset(file_path)
+        if obj is None: return None
+        normalize_asset(obj, info)
+        prototypes[uid] = obj
+    placed.add(uid)
+    place_instance(obj, info)
+    return obj
+
+def import_stream(stream_path, use_library=True, lod=0):
+    """
+    Import the objects of a placement stream while the placement is still running.
+    Refined objects are moved to their new transform.
+
+    Returns:
+        The final layout.
+    """
+    prototypes, placed, objects, layout = {}, set(), {}, {}
+    start = time.perf_counter()
+    for event in follow(stream_path):
+        if event["type"] == "done": break
+        info = event["blender"]
+        layout[event["name"]] = info
+        if event["name"] in objects:
+            if objects[event["name"]] is not None:
+                place_instance(objects[event["name"]], info)
+            continue
+        if use_library and lod == 0 and info['uid'] not in prototypes:
+            prototypes.update(load_library_assets([info]))
+        objects[event["name"]] = import_instance(info, prototypes, placed, lod)
+        if len(objects) == 1:
+            print(f"⏱ first object imported after {time.perf_counter() - start:.3f}s")
+    return list(layout.values())
 
 
 # === ADD DYNAMIC FLOOR PLANE ===
-# Compute bounds from all mesh objects
-all_objs = [obj for obj in bpy.context.scene.objects if obj.type == 'MESH']
-
-if not all_objs:
-    raise RuntimeError("No mesh objects found in scene.")
-
-# Let's refine the bound_box calculation for more accuracy.
-# This calculates the global min/max for all objects.
-bbox_min = Vector((float('inf'), float('inf'), float('inf')))
-bbox_max = Vector((float('-inf'), float('-inf'), float('-inf')))
-
-for obj in all_objs:
-    # Ensure object is in world space for bound_box calculation
-    bpy.context.view_layer.update() # Update scene data for correct bounds
-
-    # Iterate through object's bounding box corners and transform them to world space
-    for corner in obj.bound_box:
-        world_corner = obj.matrix_world @ Vector(corner)
-        for i in range(3):
-            bbox_min[i] = min(bbox_min[i], world_corner[i])
-            bbox_max[i] = max(bbox_max[i], world_corner[i])
-
-min_coord = bbox_min
-max_coord = bbox_max
-
-center = (max_coord-min_coord) / 2
-min_z = min_coord.z # This is the absolute lowest point of any object
-
-# Calculate the center of the bounding box for placing the floor
-floor_center_x = (min_coord.x + max_coord.x) / 2
-floor_center_y = (min_coord.y + max_coord.y) / 2
-
-# Calculate extents
-x_extent = max_coord.x - min_coord.x
-y_extent = max_coord.y - min_coord.y
-
-bpy.ops.mesh.primitive_plane_add(size=1, location=(floor_center_x, floor_center_y, 0))
-floor = bpy.context.active_object
-floor.name = "Floor"
-floor.scale = (x_extent, y_extent, 1)
-
-
-# Assign material to floor object
-floor = bpy.context.object  # Or explicitly: bpy.data.objects["Floor"]
-if floor.data.materials:
-    #floor.data.materials[0] = mat
-    floor.data.materials[0] = bpy.data.materials[material_name]
-else:
-    floor.data.materials.append(bpy.data.materials[material_name])
+def scene_bounds():
+    # Compute bounds from all mesh objects
+    all_objs = [obj for obj in bpy.context.scene.objects if obj.type == 'MESH']
+
+    if not all_objs:
+        raise RuntimeError("No mesh objects found in scene.")
+
+    # Evaluate the depsgraph once and transform all bounding box corners to world space together
+    depsgraph = bpy.context.evaluated_depsgraph_get()
+    corners = []
+    for obj in all_objs:
+        evaluated = obj.evaluated_get(depsgraph)
+        local = np.array([tuple(corner) for corner in evaluated.bound_box], dtype=float)
+        matrix = np.array(evaluated.matrix_world)
+        corners.append(local @ matrix[:3, :3].T + matrix[:3, 3])
+    corners = np.concatenate(corners)
+    return Vector(corners.min(axis=0)), Vector(corners.max(axis=0))
+
+def add_floor(min_coord, max_coord):
+    # Calculate the center of the bounding box for placing the floor
+    floor_center_x = (min_coord.x + max_coord.x) / 2
+    floor_center_y = (min_coord.y + max_coord.y) / 2
+
+    # Calculate extents
+    x_extent = max_coord.x - min_coord.x
+    y_extent = max_coord.y - min_coord.y
+
+    bpy.ops.mesh.primitive_plane_add(size=1, location=(floor_center_x, floor_center_y, 0))
+    floor = bpy.context.active_object
+    floor.name = "Floor"
+    floor.scale = (x_extent, y_extent, 1)
+
+
+    # Assign material to floor object
+    floor = bpy.context.object  # Or explicitly: bpy.data.objects["Floor"]
+    if floor.data.materials:
+        #floor.data.materials[0] = mat
+        floor.data.materials[0] = bpy.data.materials[material_name]
+    else:
+        floor.data.materials.append(bpy.data.materials[material_name])
+    return floor_center_x, floor_center_y
 
 
 
 # === ADD FOUR WALLS ===
+def create_wall(name, location, rotation, length_scale): # Add length_scale parameter
+    # The name of the existing Poly Haven material you want to use for the front faces.
+    # IMPORTANT: This material must already be present in your Blender file.
+    polyhaven_material_name = wall_material_name # <-- Make sure this matches the name in your file
 
-wall_height = 2.7  # Add some height margin
-scene_width = (max_coord.x - min_coord.x)
-scene_depth = (max_coord.y - min_coord.y)
-
-
-
-# The name of the existing Poly Haven material you want to use for the front faces.
-# IMPORTANT: This material must already be present in your Blender file.
-polyhaven_material_name = wall_material_name # <-- Make sure this matches the name in your file
-
-# --- Check for the existence of the Poly Haven material ---
-polyhaven_mat = bpy.data.materials.get(polyhaven_material_name)
+    # --- Check for the existence of the Poly Haven material ---
+    polyhaven_mat = bpy.data.materials.get(polyhaven_material_name)
 
-if not polyhaven_mat:
-    # If the source material doesn't exist, stop and raise an error.
-    raise NameError(f"Error: Material '{polyhaven_material_name}' not found. "
-                    "Please ensure it's loaded in the blend file before running the script.")
+    if not polyhaven_mat:
+        # If the source material doesn't exist, stop and raise an error.
+        raise NameError(f"Error: Material '{polyhaven_material_name}' not found. "
+                        "Please ensure it's loaded in the blend file before running the script.")
 
-def create_wall(name, location, rotation, length_scale): # Add length_scale parameter
     bpy.ops.mesh.primitive_plane_add(size=1, location=location, rotation=rotation)
     wall = bpy.context.active_object
     wall.name = name
@@ -283,80 +326,286 @@ def create_wall(name, location, rotation, length_scale): # Add length_scale para
 # ========================
 
 # === SET UP CAMERA ===
-# Add camera above all objects
-scene = bpy.context.scene
-cam_data = bpy.data.cameras.new("OverheadCamera")
-cam_obj = bpy.data.objects.new("OverheadCamera", cam_data)
-scene.collection.objects.link(cam_obj)
-scene.camera = cam_obj
-
-# Calculate scene bounds
-all_objs = [obj for obj in bpy.context.scene.objects if obj.type == 'MESH']
-if not all_objs:
-    raise RuntimeError("No mesh objects found in scene.")
-
-min_coord = Vector((min(o.location.x for o in all_objs),
-                    min(o.location.y for o in all_objs),
-                    min(o.location.z for o in all_objs)))
-max_coord = Vector((max(o.location.x for o in all_objs),
-                    max(o.location.y for o in all_objs),
-                    max(o.location.z for o in all_objs)))
-center = (min_coord + max_coord) / 2
-width = (max_coord - min_coord).length
-print(width, width)
-# === SET CAMERA: ANGLED SIDE VIEW ===
-cam_data.type = 'PERSP'
-cam_obj.location = (
-    floor_center_x - scene_width * 1.8,
-    floor_center_y - scene_width * 1.8,
-    scene_width * 1.8
-)
-
-# Point camera toward the center of the scene
-direction = Vector((floor_center_x, floor_center_y, 0)) - cam_obj.location
-cam_obj.rotation_euler = direction.to_track_quat('-Z', 'Y').to_euler()
-
-# === DELETE ALL EXISTING LIGHTS ===
-for obj in [o for o in bpy.data.objects if o.type == 'LIGHT']:
-    bpy.data.objects.remove(obj, do_unlink=True)
+def add_camera(floor_center_x, floor_center_y, scene_width):
+    # Add camera above all objects
+    scene = bpy.context.scene
+    cam_data = bpy.data.cameras.new("OverheadCamera")
+    cam_obj = bpy.data.objects.new("OverheadCamera", cam_data)
+    scene.collection.objects.link(cam_obj)
+    scene.camera = cam_obj
+
+    # === SET CAMERA: ANGLED SIDE VIEW ===
+    cam_data.type = 'PERSP'
+    cam_obj.location = (
+        floor_center_x - scene_width * 1.8,
+        floor_center_y - scene_width * 1.8,
+        scene_width * 1.8
+    )
+
+    # Point camera toward the center of the scene
+    direction = Vector((floor_center_x, floor_center_y, 0)) - cam_obj.location
+    cam_obj.rotation_euler = direction.to_track_quat('-Z', 'Y').to_euler()
+    return cam_obj
 
 # === SET UP LIGHT ===
+def add_light(floor_center_x, floor_center_y):
+    scene = bpy.context.scene
+    # === DELETE ALL EXISTING LIGHTS ===
+    for obj in [o for o in bpy.data.objects if o.type == 'LIGHT']:
+        bpy.data.objects.remove(obj, do_unlink=True)
+
+    scene.world.use_nodes = True
+    bg = scene.world.node_tree.nodes['Background']
+    bg.inputs[1].default_value = 0.1
+
+    # Create new Light data of type 'AREA'
+    area_light_name = "RoomAreaLight"
+    light_data = bpy.data.lights.new(name=area_light_name, type='AREA')
+
+    # Set the energy (intensity) of the area light
+    # Area lights usually need much higher energy than point lights for similar brightness
+    light_data.energy = 1000 # Adjust this value (e.g., from 1000 to 10000) as needed for brightness
+    # Larger size = softer shadows, Smaller size = sharper shadows
+    light_data.size = 10 # Example size in Blender Units (meters). Adjust as desired.
+
+    # Create a new object with the area light data
+    light = bpy.data.objects.new(name=area_light_name, object_data=light_data)
+
+
+    scene.collection.objects.link(light)
+
+    light.location = (floor_center_x, floor_center_y, 4)
+    return light
+
+def build_environment():
+    min_coord, max_coord = scene_bounds()
+    floor_center_x, floor_center_y = add_floor(min_coord, max_coord)
+    scene_width = (max_coord.x - min_coord.x)
+    add_camera(floor_center_x, floor_center_y, scene_width)
+    add_light(floor_center_x, floor_center_y)
+    return floor_center_x, floor_center_y, scene_width
+
+# === MULTIPLE VIEWS ===
+def turntable_cameras(count, floor_center_x, floor_center_y, scene_width):
+    # Cameras on the circle of the default camera, starting at its position
+    radius = scene_width * 1.8 * math.sqrt(2)
+    cameras = []
+    for i in range(count):
+        angle = math.radians(225 + 360 * i / count)
+        cameras.append({
+            "name": f"turntable_{i:02d}",
+            "location": [floor_center_x + radius * math.cos(angle), floor_center_y + radius * math.sin(angle), scene_width * 1.8],
+            "target": [floor_center_x, floor_center_y, 0],
+        })
+    return cameras
+
+def render_views(cameras, output_path, tier="final"):
+    """
+    Render the built scene from several cameras.
+
+    Args:
+        cameras: List of camera specs with name, location, target and optionally lens.
+        output_path: Path of the final render, the views are written next to it as view_<name>.png.
+        tier: The render tier used for every view.
+
+    Returns:
+        The manifest with the camera parameters and output path of every view.
+    """
+    scene = bpy.context.scene
+    cam_obj = scene.camera
+    # Keep the scene data and BVH between the renders, only the camera changes
+    scene.render.use_persistent_data = True
+    manifest = []
+    for spec in cameras:
+        cam_obj.location = spec["location"]
+        direction = Vector(spec["target"]) - cam_obj.location
+        cam_obj.rotation_euler = direction.to_track_quat('-Z', 'Y').to_euler()
+        cam_obj.data.lens = spec.get("lens", cam_obj.data.lens)
+        path = os.path.join(os.path.dirname(output_path), f"view_{spec['name']}.png")
+        start = time.perf_counter()
+        with tracing.span("blender.render.view", view=spec["name"]):
+            render(path, tier)
+        manifest.append({"name": spec["name"], "location": list(cam_obj.location), "rotation": list(cam_obj.rotation_euler),
+                         "target": list(spec["target"]), "lens": cam_obj.data.lens, "sensor_width": cam_obj.data.sensor_width,
+                         "resolution": [scene.render.resolution_x, scene.render.resolution_y], "output": path,
+                         "seconds": round(time.perf_counter() - start, 3)})
+        print(f"⏱ view {spec['name']}: {manifest[-1]['seconds']}s -> {path}")
+    scene.render.use_persistent_data = False
+    with open(os.path.join(os.path.dirname(output_path), "views_manifest.json"), 'w') as f:
+        json.dump(manifest, f, indent=4)
+    return manifest
 
-scene.world.use_nodes = True
-bg = scene.world.node_tree.nodes['Background']
-bg.inputs[1].default_value = 0.1
-
-# Create new Light data of type 'AREA'
-area_light_name = "RoomAreaLight"
-light_data = bpy.data.lights.new(name=area_light_name, type='AREA')
-
-# Set the energy (intensity) of the area light
-# Area lights usually need much higher energy than point lights for similar brightness
-light_data.energy = 1000 # Adjust this value (e.g., from 1000 to 10000) as needed for brightness
-# Larger size = softer shadows, Smaller size = sharper shadows
-light_data.size = 10 # Example size in Blender Units (meters). Adjust as desired.
-
-# Create a new object with the area light data
-light = bpy.data.objects.new(name=area_light_name, object_data=light_data)
-
-
-scene.collection.objects.link(light)
-
-light.location = (floor_center_x, floor_center_y, 4)
 # === RENDER SETTINGS ===
-scene.render.engine = 'CYCLES'  # Or 'BLENDER_EEVEE'
-bpy.context.scene.cycles.samples = 128
-bpy.context.view_layer.use_pass_ambient_occlusion = True
-# scene.render.filepath = output_path
-scene.render.image_settings.file_format = 'PNG'
-scene.render.image_settings.color_mode = 'RGBA'
-scene.render.resolution_x = 1024
-scene.render.resolution_y = 1024
-
-# === ENABLE TRANSPARENT BACKGROUND ===
-scene.render.film_transparent = True
-
-# === RENDER ===
-scene.render.filepath = os.path.join(output_folder, "final_render.png")
-bpy.ops.render.render(write_still=True)
-
+# Render tiers from a quick sanity check to the final image. Each tier writes its own file.
+# The level of detail is the asset proxy used when a scene is only rendered in that tier.
+RENDER_TIERS = {
+    "preview": {"engine": 'BLENDER_WORKBENCH', "resolution": 256, "lod": 1, "file": "preview_render.png"},
+    "draft": {"engine": 'CYCLES', "resolution": 512, "samples": 32, "adaptive_threshold": 0.05, "time_limit": 10, "denoise": True, "file": "draft_render.png"},
+    "final": {"engine": 'CYCLES', "resolution": 1024, "samples": 128, "ambient_occlusion": True, "file": "final_render.png"},
+}
+TIER_ORDER = ["preview", "draft", "final"]
+
+def scene_lod(tiers, stop_after=None):
+    # The scene is built once, so the most detailed of the rendered tiers decides
+    tiers = [t for t in TIER_ORDER if t in tiers]
+    if stop_after in tiers:
+        tiers = tiers[:tiers.index(stop_after) + 1]
+    return min([RENDER_TIERS[t].get("lod", 0) for t in tiers], default=0)
+
+def peak_memory_mb():
+    # Peak resident memory of the Blender process so far, not available on Windows
+    try:
+        import resource
+    except ImportError:
+        return None
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+def tier_output_path(output_path, tier):
+    # The final tier writes to the requested path, the others next to it
+    if tier == "final":
+        return output_path
+    return os.path.join(os.path.dirname(output_path), RENDER_TIERS[tier]["file"])
+
+def render(output_path, tier="final", cycles_defaults=None):
+    apply_render_settings(tier, cycles_defaults)
+
+    # === RENDER ===
+    bpy.context.scene.render.filepath = output_path
+    bpy.ops.render.render(write_still=True)
+
+def apply_render_settings(tier="final", cycles_defaults=None):
+    settings = RENDER_TIERS[tier]
+    scene = bpy.context.scene
+    scene.render.engine = settings["engine"]
+    if settings["engine"] == 'CYCLES':
+        # Start from the settings the scene had before any tier changed them
+        for key, value in (cycles_defaults or {}).items():
+            setattr(scene.cycles, key, value)
+        bpy.context.scene.cycles.samples = settings["samples"]
+        if "adaptive_threshold" in settings:
+            scene.cycles.use_adaptive_sampling = True
+            scene.cycles.adaptive_threshold = settings["adaptive_threshold"]
+        if "time_limit" in settings:
+            scene.cycles.time_limit = settings["time_limit"]
+        if settings.get("denoise"):
+            scene.cycles.use_denoising = True
+    else:
+        scene.display.shading.color_type = 'MATERIAL'
+    bpy.context.view_layer.use_pass_ambient_occlusion = settings.get("ambient_occlusion", False)
+    scene.render.image_settings.file_format = 'PNG'
+    scene.render.image_settings.color_mode = 'RGBA'
+    scene.render.resolution_x = settings["resolution"]
+    scene.render.resolution_y = settings["resolution"]
+
+    # === ENABLE TRANSPARENT BACKGROUND ===
+    scene.render.film_transparent = True
+
+def render_tiers(output_path, tiers=("final",), stop_after=None, timings=None):
+    """
+    Render the scene in the given tiers, from the cheapest to the most expensive.
+
+    Args:
+        timings: Optional timings of earlier steps, saved together with the tiers.
+
+    Returns:
+        Dictionary mapping each rendered tier to its output path, render time and peak memory.
+    """
+    cycles = bpy.context.scene.cycles
+    cycles_defaults = {key: getattr(cycles, key) for key in ["use_adaptive_sampling", "adaptive_threshold", "time_limit", "use_denoising"]}
+    timings = dict(timings or {})
+    if not tiers:
+        return timings
+    for tier in [t for t in TIER_ORDER if t in tiers]:
+        path = tier_output_path(output_path, tier)
+        start = time.perf_counter()
+        with tracing.span(f"blender.render.{tier}"):
+            render(path, tier, cycles_defaults)
+        timings[tier] = {"output": path, "seconds": round(time.perf_counter() - start, 3), "peak_memory_mb": peak_memory_mb()}
+        print(f"⏱ {tier} render: {timings[tier]['seconds']}s -> {path}")
+        if tier == stop_after:
+            break
+    with open(os.path.join(os.path.dirname(output_path), "render_timings.json"), 'w') as f:
+        json.dump(timings, f, indent=4)
+    return timings
+
+def save_scene(blend_path, tier="final"):
+    # Save the built scene with the render settings of a tier, e.g. for tiled rendering.
+    # A fixed seed keeps the noise identical between processes rendering parts of the frame.
+    apply_render_settings(tier)
+    bpy.context.scene.cycles.seed = 0
+    bpy.context.scene.cycles.use_animated_seed = False
+    bpy.ops.wm.save_as_mainfile(filepath=blend_path, copy=True)
+
+def render_layout(layout, output_path, use_library=True, tiers=("final",), stop_after=None, save_blend=None, views=None, lod=None, stream=None):
+    """
+    Build the scene of a layout and render it.
+
+    Args:
+        layout: The converted layout.
+        output_path: Path of the final render.
+        use_library: Append assets from the asset library where possible.
+        tiers: Render tiers to render.
+        stop_after: Stop after this tier.
+        save_blend: Optional path to save the built scene to.
+        views: Optional number of turntable views or list of camera specs, rendered with the
+               last requested tier instead of the tiers.
+        lod: Level of detail of the assets. By default proxies are only used if every rendered tier allows them.
+        stream: Optional placement stream to import the objects from while they are placed, instead of the layout.
+
+    Returns:
+        The timings of the import and the tiers, or the manifest of the views.
+    """
+    lod = scene_lod(tiers, stop_after) if lod is None else lod
+    start = time.perf_counter()
+    with tracing.span("blender.import_layout", lod=lod) as attributes:
+        if stream:
+            layout = import_stream(stream, use_library, lod)
+        else:
+            import_layout(layout, use_library, lod)
+        attributes["objects"] = len(layout)
+    timings = {"import": {"lod": lod, "seconds": round(time.perf_counter() - start, 3), "peak_memory_mb": peak_memory_mb()}}
+    print(f"⏱ import (LOD {lod}): {timings['import']['seconds']}s")
+    with tracing.span("blender.environment"):
+        floor_center_x, floor_center_y, scene_width = build_environment()
+    if save_blend:
+        save_scene(save_blend)
+    if views:
+        cameras = turntable_cameras(views, floor_center_x, floor_center_y, scene_width) if isinstance(views, int) else views
+        tier = [t for t in TIER_ORDER if t in tiers][-1] if tiers else "final"
+        return render_views(cameras, output_path, tier)
+    return render_tiers(output_path, tiers, stop_after, timings)
+
+def parse_args():
+    # Blender passes the script arguments after "--"
+    argv = sys.argv[sys.argv.index("--") + 1:] if "--" in sys.argv else []
+    parser = argparse.ArgumentParser(description="Render a layout.")
+    parser.add_argument("--layout", help="The converted layout file.", default=unity_layout_file)
+    parser.add_argument("--output", help="The path of the rendered image.", default=os.path.join(output_folder, "final_render.png"))
+    parser.add_argument("--no-library", help="Import every asset from its source file instead of the asset library.", action="store_true")
+    parser.add_argument("--tiers", help="Comma separated render tiers (preview, draft, final). Empty to only build the scene.", default="final")
+    parser.add_argument("--views", help="Render this many turntable views instead of the single camera.", type=int, default=None)
+    parser.add_argument("--cameras", help="JSON file with a list of cameras (name, location, target, lens) to render instead of the single camera.", default=None)
+    parser.add_argument("--save-blend", help="Save the built scene with the final render settings to this .blend file.", default=None)
+    parser.add_argument("--stop-after", help="Stop after this tier.", choices=TIER_ORDER, default=None)
+    parser.add_argument("--lod", help="Level of detail of the assets (0 = original). By default proxies are only used for preview renders.", type=int, default=None)
+    parser.add_argument("--stream", help="Import the objects from this placement stream while they are placed, instead of the layout file.", default=None)
+    return parser.parse_args(argv)
+
+def main():
+    args = parse_args()
+    load_materials()
+    clear_scene()
+    layout = None
+    if not args.stream:
+        with open(args.layout, 'r') as f:
+            layout = json.load(f)
+    tiers = [t for t in args.tiers.split(",") if t]
+    views = args.views
+    if args.cameras:
+        with open(args.cameras, 'r') as f:
+            views = json.load(f)
+    render_layout(layout, args.output, not args.no_library, tiers, args.stop_after, args.save_blend, views, args.lod, args.stream)
+    tracing.flush()
+
+if __name__ == "__main__":
+    main()
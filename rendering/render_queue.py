@@ -0,0 +1,103 @@
+import json
+import os
+import time
+import uuid
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from config import RENDER_QUEUE
+
+# A job moves from pending to working when a worker claims it and then to done or failed
+STATES = ["pending", "working", "done", "failed"]
+
+
+def _path(state, job_id, queue_dir=RENDER_QUEUE):
+    return os.path.join(queue_dir, state, f"{job_id}.json")
+
+
+def _write(path, data):
+    # Write to a temporary file first, so a reader never sees a partial job
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w') as file:
+        json.dump(data, file, indent=4)
+    os.replace(tmp_path, path)
+
+
+def init_queue(queue_dir=RENDER_QUEUE):
+    for state in STATES:
+        os.makedirs(os.path.join(queue_dir, state), exist_ok=True)
+
+
+def submit_job(layout, output_path, queue_dir=RENDER_QUEUE, **options):
+    """
+    Add a render job to the queue.
+
+    Args:
+        layout: The converted layout (list of objects with uid, position, rotation and pre_rotation).
+        output_path: Path of the rendered image.
+        queue_dir: Directory of the queue.
+        options: Additional options passed to the worker.
+
+    Returns:
+        The id of the job.
+    """
+    init_queue(queue_dir)
+    job_id = f"{time.time_ns()}-{uuid.uuid4().hex[:8]}"
+    _write(_path("pending", job_id, queue_dir), {"id": job_id, "layout": layout, "output": output_path, **options})
+    return job_id
+
+
+def stop_worker(queue_dir=RENDER_QUEUE):
+    """
+    Ask the worker to exit after finishing the jobs submitted so far.
+    """
+    return submit_job(None, None, queue_dir, stop=True)
+
+
+def claim_job(queue_dir=RENDER_QUEUE):
+    """
+    Claim the oldest pending job.
+
+    Returns:
+        The job, or None if the queue is empty.
+    """
+    for name in sorted(os.listdir(os.path.join(queue_dir, "pending"))):
+        if not name.endswith(".json"): continue
+        job_id = name[:-5]
+        try:
+            # Renaming is atomic, so only one worker can claim a job
+            os.replace(_path("pending", job_id, queue_dir), _path("working", job_id, queue_dir))
+        except FileNotFoundError:
+            continue
+        with open(_path("working", job_id, queue_dir), 'r') as file:
+            return json.load(file)
+    return None
+
+
+def finish_job(job, result, failed=False, queue_dir=RENDER_QUEUE):
+    _write(_path("failed" if failed else "done", job["id"], queue_dir), {**job, "layout": None, "result": result})
+    os.remove(_path("working", job["id"], queue_dir))
+
+
+def wait_for_job(job_id, timeout=None, poll_interval=0.2, queue_dir=RENDER_QUEUE):
+    """
+    Wait until a job is done.
+
+    Returns:
+        The finished job with its result.
+
+    Raises:
+        RuntimeError: If the job failed.
+        TimeoutError: If the job didn't finish in time.
+    """
+    start = time.time()
+    while timeout is None or time.time() - start < timeout:
+        for state in ["done", "failed"]:
+            path = _path(state, job_id, queue_dir)
+            if os.path.exists(path):
+                with open(path, 'r') as file:
+                    job = json.load(file)
+                if state == "failed":
+                    raise RuntimeError(f"Render job {job_id} failed: {job['result']}")
+                return job
+        time.sleep(poll_interval)
+    raise TimeoutError(f"Render job {job_id} didn't finish within {timeout} seconds.")
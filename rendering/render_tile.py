@@ -0,0 +1,33 @@
+import bpy
+import argparse
+import sys
+
+# Renders one region of a saved scene:
+#   blender --background scene.blend --python rendering/render_tile.py -- --region 0 1 0 0.5 --output tile.png
+# Without --region the whole frame is rendered.
+
+
+def parse_args():
+    argv = sys.argv[sys.argv.index("--") + 1:] if "--" in sys.argv else []
+    parser = argparse.ArgumentParser(description="Render a region of the scene.")
+    parser.add_argument("--region", help="Border as min_x max_x min_y max_y in [0, 1], y from the bottom.", type=float, nargs=4, default=None)
+    parser.add_argument("--output", help="The path of the rendered tile.", required=True)
+    parser.add_argument("--threads", help="Number of render threads, 0 for automatic.", type=int, default=0)
+    return parser.parse_args(argv)
+
+
+def main():
+    args = parse_args()
+    scene = bpy.context.scene
+    if args.region:
+        scene.render.use_border = True
+        scene.render.use_crop_to_border = True
+        scene.render.border_min_x, scene.render.border_max_x, scene.render.border_min_y, scene.render.border_max_y = args.region
+    if args.threads > 0:
+        scene.render.threads_mode = 'FIXED'
+        scene.render.threads = args.threads
+    scene.render.filepath = args.output
+    bpy.ops.render.render(write_still=True)
+
+if __name__ == "__main__":
+    main()
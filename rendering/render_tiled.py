@@ -0,0 +1,92 @@
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from config import BLENDER_FILE, RENDERS
+
+# Renders the final image of a layout with several Blender processes. The scene is built and
+# saved once, every worker renders a horizontal strip of the frame from the saved scene and
+# the strips are stitched into final_render.png.
+script_dir = os.path.dirname(os.path.abspath(__file__))
+RESOLUTION = 1024 # Resolution of the final render tier
+OVERLAP = 32 # Extra rows rendered around every strip, so the denoiser sees the same neighbourhood at the seams
+
+
+def strip_regions(workers, resolution=RESOLUTION, overlap=OVERLAP):
+    """
+    Split the frame into horizontal strips.
+
+    Returns:
+        List of (rendered_rows, kept_rows) pairs, both as (bottom, top) pixel rows counted from
+        the bottom. The rendered rows include the overlap, the kept rows tile the frame exactly.
+    """
+    bounds = [round(i * resolution / workers) for i in range(workers + 1)]
+    return [((max(b - overlap, 0), min(t + overlap, resolution)), (b, t)) for b, t in zip(bounds, bounds[1:])]
+
+
+def render_tile(blend_path, output_path, rows=None, threads=0, resolution=RESOLUTION):
+    command = ["blender", "--background", blend_path, "--python", os.path.join(script_dir, "render_tile.py"), "--", "--output", output_path, "--threads", str(threads)]
+    if rows:
+        command += ["--region", "0", "1", str(rows[0] / resolution), str(rows[1] / resolution)]
+    start = time.perf_counter()
+    subprocess.run(command, check=True, stdout=subprocess.DEVNULL)
+    return time.perf_counter() - start
+
+
+def stitch(tiles, output_path, resolution=RESOLUTION):
+    # Paste the kept rows of every strip, without blending, so the alpha channel stays untouched
+    image = Image.new("RGBA", (resolution, resolution))
+    for path, (rendered, kept) in tiles:
+        tile = Image.open(path).convert("RGBA")
+        # Image rows are counted from the top, Blender's border from the bottom
+        top = rendered[1] - kept[1]
+        image.paste(tile.crop((0, top, resolution, top + kept[1] - kept[0])), (0, resolution - kept[1]))
+    image.save(output_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Render a layout with several Blender processes.")
+    parser.add_argument("--layout", help="The converted layout file.", default=BLENDER_FILE)
+    parser.add_argument("--output", help="The path of the rendered image.", default=os.path.join(RENDERS, "final_render.png"))
+    parser.add_argument("--workers", help="Number of Blender processes.", type=int, default=4)
+    parser.add_argument("--baseline", help="Also render with a single process and report the speedup.", action="store_true")
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="tiled_render_")
+    try:
+        blend_path = os.path.join(work_dir, "scene.blend")
+        start = time.perf_counter()
+        subprocess.run(["blender", "--background", "--python", os.path.join(script_dir, "render_layout.py"), "--",
+                        "--layout", args.layout, "--tiers", "", "--save-blend", blend_path], check=True)
+        build_time = time.perf_counter() - start
+
+        # Split the cores between the workers
+        threads = max((os.cpu_count() or args.workers) // args.workers, 1)
+        regions = strip_regions(args.workers)
+        tiles = [(os.path.join(work_dir, f"tile_{i}.png"), region) for i, region in enumerate(regions)]
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.workers) as executor:
+            list(executor.map(lambda tile: render_tile(blend_path, tile[0], tile[1][0], threads), tiles))
+        stitch(tiles, args.output)
+        tiled_time = time.perf_counter() - start
+        report = {"workers": args.workers, "build_seconds": round(build_time, 3), "tiled_seconds": round(tiled_time, 3)}
+        print(f"Tiled render with {args.workers} processes: {tiled_time:.1f}s (scene build {build_time:.1f}s)")
+
+        if args.baseline:
+            baseline_time = render_tile(blend_path, os.path.join(work_dir, "baseline.png"))
+            report.update({"baseline_seconds": round(baseline_time, 3), "speedup": round(baseline_time / tiled_time, 2)})
+            print(f"Single process: {baseline_time:.1f}s, speedup {baseline_time / tiled_time:.2f}x")
+        with open(os.path.join(os.path.dirname(args.output), "tiled_render_report.json"), 'w') as file:
+            json.dump(report, file, indent=4)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
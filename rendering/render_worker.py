@@ -0,0 +1,46 @@
+import os
+import time
+import traceback
+import sys
+sys.path.append(os.path.abspath('.'))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+import render_layout
+from render_queue import init_queue, claim_job, finish_job
+import tracing
+
+# Long-running render worker. Start it once with
+#   blender --background --python rendering/render_worker.py
+# and submit layouts with render_queue.submit_job. Blender and the floor and wall materials
+# stay loaded between jobs, only the objects of the previous scene are removed.
+POLL_INTERVAL = 0.2
+
+
+def main():
+    init_queue()
+    render_layout.load_materials()
+    render_layout.clear_scene()
+    print("Render worker ready.")
+    while True:
+        job = claim_job()
+        if job is None:
+            time.sleep(POLL_INTERVAL)
+            continue
+        if job.get("stop"):
+            finish_job(job, "stopped")
+            break
+        start = time.time()
+        try:
+            with tracing.span("blender.reset_scene"):
+                render_layout.reset_scene()
+            timings = render_layout.render_layout(job["layout"], job["output"], tiers=job.get("tiers", ["final"]), stop_after=job.get("stop_after"), views=job.get("views"), lod=job.get("lod"))
+            finish_job(job, {"output": job["output"], "seconds": round(time.time() - start, 3), "tiers" if not job.get("views") else "views": timings})
+            print(f"✅ Rendered job {job['id']} in {time.time() - start:.1f}s")
+        except Exception:
+            finish_job(job, traceback.format_exc(), failed=True)
+            print(f"❌ Job {job['id']} failed")
+        finally:
+            tracing.flush(clear=True)
+    print("Render worker stopped.")
+
+if __name__ == "__main__":
+    main()
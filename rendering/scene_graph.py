@@ -0,0 +1,175 @@
+import json
+import os
+import sys
+import threading
+import numpy as np
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from config import DESCRIPTIONS, ROTATION_DATA
+
+# The placed scene as a structured NumPy array with one record per object, shared by the
+# placement, the conversion for Blender and the export. Vectors are in Unity coordinates (LHS):
+#   name, guid, uid: object name in the prompts, asset guid and asset file name
+#   size, size_after_rotation: bounding box of the asset and of the rotated asset
+#   center, rotation: placed transform (rotation as Euler angles in degrees)
+#   pre_rotation: rotation of the asset found by the preprocessing (rotation_data.json)
+#   bounds_center: offset from the pivot of the asset to its bounding box center
+#   pivot: where the pivot of the asset ends up
+# A scene is saved as a .npy file next to placed_objects.json.
+SCENE_DTYPE = np.dtype([
+    ("name", "U128"), ("guid", "U64"), ("uid", "U128"),
+    ("size", "f8", 3), ("size_after_rotation", "f8", 3), ("center", "f8", 3), ("rotation", "f8", 3),
+    ("pre_rotation", "f8", 3), ("bounds_center", "f8", 3), ("pivot", "f8", 3),
+])
+SCENE_FILE = "scene.npy"
+SWAP = [0, 2, 1] # Unity (Y up) to Blender (Z up) axis order
+INTERSECTION_MARGIN = 0.1 # Boxes overlapping less than this don't intersect, as in utils.boxes_intersect
+
+_assets = {}
+_assets_lock = threading.Lock()
+
+
+def asset_tables():
+    """
+    The asset file name and pre-rotation of every guid, read again only when the files change.
+
+    Returns:
+        Dictionaries guid -> uid and guid -> pre_rotation.
+    """
+    key = tuple(os.path.getmtime(path) if os.path.isfile(path) else None for path in (DESCRIPTIONS, ROTATION_DATA))
+    with _assets_lock:
+        if _assets.get("key") != key:
+            with open(DESCRIPTIONS, 'r') as file:
+                uids = {v["guid"]: k for k, v in json.load(file).items()}
+            pre_rotations = {}
+            if os.path.isfile(ROTATION_DATA):
+                with open(ROTATION_DATA, 'r') as file:
+                    pre_rotations = {a["guid"]: a["rotation"] for a in json.load(file)}
+            _assets.update(key=key, tables=(uids, pre_rotations))
+        return _assets["tables"]
+
+
+def new_scene(objs):
+    """
+    Records for the objects to place, with their asset data and without a transform yet.
+
+    Args:
+        objs: The objects with name, guid, size and boundsCenter.
+    """
+    uids, pre_rotations = asset_tables()
+    fields = {"name": [obj["name"] for obj in objs], "guid": [obj["guid"] for obj in objs], "uid": [uids.get(obj["guid"], "") for obj in objs]}
+    for field, values in fields.items():
+        # NumPy would cut longer strings silently
+        too_long = [value for value in values if len(value) > SCENE_DTYPE[field].itemsize // 4]
+        if too_long:
+            raise ValueError(f"The {field} of {too_long} is too long for a scene.")
+    scene = np.zeros(len(objs), dtype=SCENE_DTYPE)
+    for field, values in fields.items():
+        scene[field] = values
+    scene["size"] = [obj["size"] for obj in objs]
+    scene["pre_rotation"] = [pre_rotations.get(obj["guid"], [0, 0, 0]) for obj in objs]
+    scene["bounds_center"] = [obj["boundsCenter"] for obj in objs]
+    return scene
+
+
+def set_transform(scene, row, center, rotation, size_after_rotation=None):
+    """
+    Set the placed transform of an object and update its pivot, and its rotated size if not given.
+    """
+    record = scene[row:row + 1]
+    record["center"] = center
+    record["rotation"] = rotation
+    record["size_after_rotation"] = rotated_sizes(record) if size_after_rotation is None else size_after_rotation
+    record["pivot"] = pivots(record)
+
+
+def from_placement(placed_objects, object_data):
+    """
+    Scene of the contents of placed_objects.json and placed_objects_data.json, joined by name.
+    """
+    data = {obj["name"]: obj for obj in object_data}
+    scene = new_scene([{**data[placed["name"]], "size": placed["size"]} for placed in placed_objects])
+    scene["center"] = [placed["center"] for placed in placed_objects]
+    scene["rotation"] = [placed["rotation"] for placed in placed_objects]
+    scene["size_after_rotation"] = [placed["size_after_rotation"] for placed in placed_objects]
+    scene["pivot"] = pivots(scene)
+    return scene
+
+
+def rotation_matrices(rotation_degrees):
+    """
+    Rotation matrices (N, 3, 3) of Euler angles (N, 3) in degrees, applied in the order Z, X, Y
+    in a left-handed coordinate system, as in utils.get_rotated_bounding_box.
+    """
+    rx, ry, rz = np.radians(np.asarray(rotation_degrees, dtype=np.float64)).T
+    matrices = np.zeros((3, len(rx), 3, 3)) # X, Y and Z rotation of every object
+    cos, sin = np.cos([rx, ry, rz]), np.sin([rx, ry, rz])
+    matrices[0, :, 0, 0] = 1
+    matrices[0, :, 1, 1], matrices[0, :, 1, 2], matrices[0, :, 2, 1], matrices[0, :, 2, 2] = cos[0], -sin[0], sin[0], cos[0]
+    matrices[1, :, 1, 1] = 1
+    matrices[1, :, 0, 0], matrices[1, :, 0, 2], matrices[1, :, 2, 0], matrices[1, :, 2, 2] = cos[1], sin[1], -sin[1], cos[1]
+    matrices[2, :, 2, 2] = 1
+    matrices[2, :, 0, 0], matrices[2, :, 0, 1], matrices[2, :, 1, 0], matrices[2, :, 1, 1] = cos[2], -sin[2], sin[2], cos[2]
+    return matrices[1] @ matrices[0] @ matrices[2]
+
+
+def pivots(scene):
+    """
+    Pivot positions of all objects, so their bounding box centers end up at their centers.
+    Same as utils.calculate_pivot_placement with the pre-rotation added to the rotation.
+    """
+    offsets = rotation_matrices(scene["rotation"] + scene["pre_rotation"]) @ scene["bounds_center"][..., np.newaxis]
+    return np.round(scene["center"] - offsets[..., 0], 3)
+
+
+def rotated_sizes(scene):
+    """
+    Size of the axis-aligned bounding box of every rotated object.
+    """
+    # The extent of a rotated box along each axis is the sum of the absolute projections of its half sizes
+    return np.round(np.abs(rotation_matrices(scene["rotation"])) @ scene["size"][..., np.newaxis], 3)[..., 0]
+
+
+def intersections(scene, rows=None):
+    """
+    Which objects intersect which other objects, by their rotated bounding boxes.
+
+    Args:
+        scene: The scene.
+        rows: Indices of the objects to test against all others, all by default.
+
+    Returns:
+        Boolean matrix (len(rows), len(scene)), False for an object with itself.
+    """
+    rows = np.arange(len(scene)) if rows is None else np.atleast_1d(rows)
+    low = scene["center"] - scene["size_after_rotation"] / 2
+    high = scene["center"] + scene["size_after_rotation"] / 2
+    overlap = (high[rows, np.newaxis] >= low[np.newaxis] + INTERSECTION_MARGIN) & (high[np.newaxis] >= low[rows, np.newaxis] + INTERSECTION_MARGIN)
+    result = overlap.all(axis=-1)
+    result[np.arange(len(rows)), rows] = False
+    return result
+
+
+def to_blender(scene):
+    """
+    The layout read by the Blender scripts: positions and rotations converted from Unity
+    coordinates (Y up, left-handed) to Blender (Z up) by swapping Y and Z and negating the rotation.
+    """
+    positions = scene["center"][:, SWAP]
+    rotations = 0.0 - scene["rotation"][:, SWAP] # Not np.negative, which turns 0 into -0.0
+    return [{"position": position, "pre_rotation": pre_rotation, "rotation": rotation, "uid": uid}
+            for position, pre_rotation, rotation, uid in zip(positions.tolist(), scene["pre_rotation"].tolist(), rotations.tolist(), scene["uid"].tolist())]
+
+
+def save(scene, path):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    # Written to a temporary file first, so a reader never sees a partial scene
+    tmp_path = f"{path}.{os.getpid()}.tmp.npy"
+    np.save(tmp_path, scene, allow_pickle=False)
+    os.replace(tmp_path, path)
+
+
+def load(path):
+    scene = np.load(path, allow_pickle=False)
+    if scene.dtype != SCENE_DTYPE:
+        raise ValueError(f"{path} is not a scene, its fields are {scene.dtype.names}.")
+    return scene
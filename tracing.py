@@ -0,0 +1,163 @@
+import atexit
+import contextlib
+import functools
+import glob
+import json
+import os
+import threading
+import time
+
+# Lightweight span tracing for the whole pipeline. Spans record their duration and numeric
+# attributes such as token counts, retries and cache hits. Traces are written in the Chrome
+# trace event format (open them in chrome://tracing or https://ui.perfetto.dev).
+# If REASON3D_TRACE_DIR is set, every process, including subprocesses and Blender scripts,
+# writes its spans to that folder when it exits, and merge_traces combines them into one trace.
+TRACE_DIR_ENV = "REASON3D_TRACE_DIR"
+
+_events = []
+_chunk = 0 # Number of times the spans were written and cleared, see flush
+_lock = threading.Lock()
+_local = threading.local()
+
+
+def _now_us():
+    # Wall clock time, so the spans of different processes line up
+    return time.time_ns() // 1000
+
+
+@contextlib.contextmanager
+def span(name, **attributes):
+    """
+    Record the enclosed block as a span.
+
+    Args:
+        name: Name of the span, spans with the same name are summarized together.
+        attributes: Attributes of the span, numeric ones are summed up in the summary.
+    """
+    stack = getattr(_local, "stack", None)
+    if stack is None:
+        stack = _local.stack = []
+    event = {"name": name, "ph": "X", "ts": _now_us(), "pid": os.getpid(), "tid": threading.get_ident(), "args": dict(attributes)}
+    stack.append(event)
+    try:
+        yield event["args"]
+    finally:
+        stack.pop()
+        event["dur"] = _now_us() - event["ts"]
+        with _lock:
+            _events.append(event)
+
+
+def annotate(**attributes):
+    """
+    Add to the numeric attributes of the innermost open span of this thread, e.g. annotate(retries=1).
+    Other attributes are set.
+    """
+    stack = getattr(_local, "stack", None)
+    if not stack:
+        return
+    args = stack[-1]["args"]
+    for key, value in attributes.items():
+        if isinstance(value, (int, float)) and not isinstance(value, bool) and isinstance(args.get(key), (int, float)):
+            args[key] += value
+        else:
+            args[key] = value
+
+
+def traced(name=None):
+    """
+    Decorator recording every call of a function as a span.
+    """
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with span(name or function.__name__):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def events():
+    with _lock:
+        return list(_events)
+
+
+def write_trace(path, trace_events=None):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w') as file:
+        json.dump({"traceEvents": events() if trace_events is None else trace_events, "displayTimeUnit": "ms"}, file)
+    return path
+
+
+def merge_traces(trace_dir, output_path=None):
+    """
+    Combine the traces written by all processes into a single trace.
+
+    Returns:
+        The merged events.
+    """
+    merged = []
+    for path in sorted(glob.glob(os.path.join(trace_dir, "trace_*.json"))):
+        with open(path, 'r') as file:
+            merged += json.load(file)["traceEvents"]
+    merged.sort(key=lambda e: e["ts"])
+    if output_path:
+        write_trace(output_path, merged)
+    return merged
+
+
+def summary(trace_events=None):
+    """
+    Aggregate the spans by name.
+
+    Returns:
+        List of rows with name, count, total, mean and max seconds and the sums of the numeric
+        attributes, sorted by total time.
+    """
+    rows = {}
+    for event in events() if trace_events is None else trace_events:
+        row = rows.setdefault(event["name"], {"name": event["name"], "count": 0, "total": 0.0, "max": 0.0, "attributes": {}})
+        seconds = event["dur"] / 1e6
+        row["count"] += 1
+        row["total"] += seconds
+        row["max"] = max(row["max"], seconds)
+        for key, value in event.get("args", {}).items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                row["attributes"][key] = row["attributes"].get(key, 0) + value
+    for row in rows.values():
+        row["mean"] = row["total"] / row["count"]
+    return sorted(rows.values(), key=lambda r: -r["total"])
+
+
+def print_summary(trace_events=None):
+    rows = summary(trace_events)
+    if not rows:
+        return
+    width = max(len(row["name"]) for row in rows)
+    print(f"{'span':<{width}} {'count':>6} {'total [s]':>10} {'mean [s]':>9} {'max [s]':>8}  attributes")
+    for row in rows:
+        attributes = ", ".join(f"{k}={round(v, 3)}" for k, v in row["attributes"].items())
+        print(f"{row['name']:<{width}} {row['count']:>6} {row['total']:>10.3f} {row['mean']:>9.3f} {row['max']:>8.3f}  {attributes}")
+
+
+def flush(clear=False):
+    """
+    Write the spans of this process to REASON3D_TRACE_DIR, if it is set. Also done at exit,
+    Blender scripts call it explicitly.
+
+    Args:
+        clear: Drop the written spans from memory, also if they aren't written. Long-running
+            processes do this after every job, so the spans don't pile up.
+    """
+    global _chunk
+    trace_dir = os.environ.get(TRACE_DIR_ENV)
+    with _lock:
+        pending, chunk = list(_events), _chunk
+        if clear:
+            _events.clear()
+            _chunk += 1
+    # Every cleared part gets its own file, merge_traces combines them
+    if trace_dir and pending:
+        write_trace(os.path.join(trace_dir, f"trace_{os.getpid()}_{chunk}.json"), pending)
+
+atexit.register(flush)